@@ -1,100 +1,146 @@
-import os
-
-from telegram import Update
-from telegram.ext import Application, CallbackQueryHandler, CommandHandler, InlineQueryHandler, MessageHandler, filters, \
-    ConversationHandler
-
-from src.bot import message
-from src.bot.callback.inline import inline_query
-from src.bot.callback.review import vote_post, choose_reason, vote_revoke, vote_query, private_vote, \
-    private_choose_reason
-from src.bot.callback.submit import confirm_submission
-from src.bot.callback.users import cancel
-from src.bot.command.admin import append_comment, become_reviewer, remove_comment, reply_submitter, ban, unban, \
-    private_review_start, private_review, custom_reason, update
-from src.bot.command.user import help_info
-from src.config import BotConfig, Config, ReviewConfig, Config_verify
-from src.logger import bot_logger
-
-if Config.PROXY and Config.PROXY != "":
-    os.environ['https_proxy'] = Config.PROXY
-    os.environ['http_proxy'] = Config.PROXY
-
-
-def run_bot():
-    application = (Application.builder()
-                   .token(BotConfig.BOT_TOKEN)
-                   .concurrent_updates(True)
-                   .connect_timeout(BotConfig.TIMEOUT)
-                   .get_updates_connect_timeout(BotConfig.TIMEOUT)
-                   .get_updates_read_timeout(BotConfig.TIMEOUT)
-                   .get_updates_write_timeout(BotConfig.TIMEOUT)
-                   .read_timeout(BotConfig.TIMEOUT)
-                   .write_timeout(BotConfig.TIMEOUT)
-                   .base_url(BotConfig.BASE_URL)
-                   .build())
-
-    # 投稿-私聊
-    application.add_handler(MessageHandler(filters.ChatType.PRIVATE & ~filters.COMMAND, message.submit_msg))
-
-    ## 按钮回调
-    application.add_handler(CallbackQueryHandler(cancel, pattern="v3.0.cancel"))
-    # 确认投稿
-    application.add_handler(CallbackQueryHandler(confirm_submission, pattern="^v3.0.submitConfirm"))
-    # 审核部分回调
-    application.add_handler(CallbackQueryHandler(vote_post, pattern="^v3.0.approve_"))
-    application.add_handler(CallbackQueryHandler(vote_post, pattern="^v3.0.reject_"))
-    application.add_handler(CallbackQueryHandler(vote_post, pattern="^v3.0.rejectDuplicate_"))
-    application.add_handler(CallbackQueryHandler(vote_query, pattern="^v3.0.voteQuery_"))
-    application.add_handler(CallbackQueryHandler(vote_revoke, pattern="^v3.0.voteRevoke_"))
-
-    # 选择拒绝原因
-    application.add_handler(CallbackQueryHandler(choose_reason, pattern="^reason_"))
-
-    # 私聊审核
-    application.add_handler(CallbackQueryHandler(private_vote, pattern="^private#"))
-    application.add_handler(CallbackQueryHandler(private_choose_reason, pattern="^pri#reason_"))
-
-    # 命令回调
-    application.add_handler(CommandHandler("help", help_info))
-    application.add_handler(CommandHandler("start", help_info))
-    application.add_handler(CommandHandler("append", append_comment))
-    application.add_handler(CommandHandler("removeAppend", remove_comment))
-    application.add_handler(CommandHandler("reviewer", become_reviewer, filters=filters.Chat(
-        chat_id=ReviewConfig.REVIEWER_GROUP)))
-    application.add_handler(CommandHandler("reply", reply_submitter))
-    application.add_handler(CommandHandler("customReason", custom_reason))
-    application.add_handler(CommandHandler("ban", ban))
-    application.add_handler(CommandHandler("unban", unban))
-
-    application.add_handler(CommandHandler("update", update))
-
-    conv_handler = ConversationHandler(
-        entry_points=[
-            CommandHandler("review", private_review_start, filters=filters.ChatType.PRIVATE)
-        ],
-        states={
-            1: [CallbackQueryHandler(callback=private_review, pattern="next_post")],
-        },
-        fallbacks=[CommandHandler("cancel", cancel)],
-    )
-    application.add_handler(conv_handler)
-
-    # 内联查询
-    application.add_handler(InlineQueryHandler(inline_query))
-
-    bot_logger.info("Bot started")
-    application.run_polling(allowed_updates=Update.ALL_TYPES)
-
-
-if __name__ == "__main__":
-    bot_logger.info("Bot loading...")
-    bot_logger.info("Running on "+ os.name + ", CPU " + os.uname().machine + ", Path " + os.getcwd())
-    Config_verify_result, Config_verify_msg = Config_verify().verify()
-    if Config_verify_result == "fail" :
-        bot_logger.error(Config_verify_msg)
-    elif Config_verify_result == "warning":
-        bot_logger.warning(Config_verify_msg)
-        run_bot()
-    else:
-        run_bot()
+import os
+
+from telegram import Update
+from telegram.ext import Application, CallbackQueryHandler, CommandHandler, InlineQueryHandler, MessageHandler, filters, \
+    ConversationHandler
+
+from src.bot import message
+from src.bot.application import ReviewApplication
+from src.bot.callback.inline import inline_query
+from src.bot.callback.router import CALLBACK_ROUTER, CallbackAction
+from src.bot.callback.review import vote_post, choose_reason, vote_revoke, vote_query, private_vote, \
+    private_choose_reason
+from src.bot.callback.submit import confirm_submission
+from src.bot.callback.users import cancel
+from src.bot.command.admin import append_comment, become_reviewer, remove_comment, reply_submitter, ban, unban, \
+    private_review_start, private_review, custom_reason, update, metrics, backup
+from src.bot.command.user import help_info
+from src.bot.outbox import OUTBOX_WORKER
+from src.bot.persistence import PERSISTENCE
+from src.bot.ratelimit import PriorityRateLimiter
+from src.bot.userdata import USER_DATA_STORE
+from src.config import BotConfig, Config, ReviewConfig, Config_verify
+from src.database.posts import POSTS_WRITER
+from src.database.users import REVIEWER_REGISTRY, BAN_LIST, SUBMITTER_PROFILES, USERS_WRITER
+from src.logger import bot_logger
+from src.scheduler import SCHEDULER
+from src.utils import STATUS_EDITS
+
+if Config.PROXY and Config.PROXY != "":
+    os.environ['https_proxy'] = Config.PROXY
+    os.environ['http_proxy'] = Config.PROXY
+
+
+async def post_init(application: Application):
+    # 预加载缓存
+    await REVIEWER_REGISTRY.load()
+    await BAN_LIST.load()
+    USER_DATA_STORE.bind(application)
+    SUBMITTER_PROFILES.start(Config.PROFILE_FLUSH_INTERVAL)
+    OUTBOX_WORKER.start(application.bot)
+    SCHEDULER.start()
+
+
+async def post_stop(application: Application):
+    # bot 仍可用，发送尚未完成的状态消息编辑与相册确认
+    await STATUS_EDITS.stop()
+    await message.MEDIA_GROUP_DEBOUNCER.stop()
+
+
+async def post_shutdown(application: Application):
+    SCHEDULER.stop()
+    # 写回尚未落盘的数据
+    await OUTBOX_WORKER.stop()
+    await SUBMITTER_PROFILES.stop()
+    await POSTS_WRITER.stop()
+    await USERS_WRITER.stop()
+
+
+def run_bot():
+    application = (Application.builder()
+                   .application_class(ReviewApplication)
+                   .token(BotConfig.BOT_TOKEN)
+                   .persistence(PERSISTENCE)
+                   .post_init(post_init)
+                   .post_stop(post_stop)
+                   .post_shutdown(post_shutdown)
+                   .concurrent_updates(True)
+                   .connect_timeout(BotConfig.TIMEOUT)
+                   .get_updates_connect_timeout(BotConfig.TIMEOUT)
+                   .get_updates_read_timeout(BotConfig.TIMEOUT)
+                   .get_updates_write_timeout(BotConfig.TIMEOUT)
+                   .read_timeout(BotConfig.TIMEOUT)
+                   .write_timeout(BotConfig.TIMEOUT)
+                   .base_url(BotConfig.BASE_URL)
+                   .rate_limiter(PriorityRateLimiter(global_rate=BotConfig.RATE_LIMIT_GLOBAL,
+                                                     private_rate=BotConfig.RATE_LIMIT_PRIVATE,
+                                                     group_rate=BotConfig.RATE_LIMIT_GROUP / 60,
+                                                     max_retries=BotConfig.RATE_LIMIT_MAX_RETRIES))
+                   .build())
+
+    # 投稿-私聊
+    application.add_handler(MessageHandler(filters.ChatType.PRIVATE & ~filters.COMMAND, message.submit_msg))
+
+    ## 按钮回调，callback_data 的格式见 src/bot/callback/router.py
+    CALLBACK_ROUTER.add(CallbackAction.CANCEL, cancel)
+    # 确认投稿
+    CALLBACK_ROUTER.add(CallbackAction.SUBMIT, confirm_submission)
+    # 审核部分回调
+    CALLBACK_ROUTER.add(CallbackAction.VOTE, vote_post)
+    CALLBACK_ROUTER.add(CallbackAction.VOTE_QUERY, vote_query)
+    CALLBACK_ROUTER.add(CallbackAction.VOTE_REVOKE, vote_revoke)
+    # 选择拒绝原因
+    CALLBACK_ROUTER.add(CallbackAction.REASON, choose_reason)
+    # 私聊审核
+    CALLBACK_ROUTER.add(CallbackAction.PRIVATE_VOTE, private_vote)
+    CALLBACK_ROUTER.add(CallbackAction.PRIVATE_REASON, private_choose_reason)
+    application.add_handler(CALLBACK_ROUTER)
+
+    # 命令回调
+    application.add_handler(CommandHandler("help", help_info))
+    application.add_handler(CommandHandler("start", help_info))
+    application.add_handler(CommandHandler("append", append_comment))
+    application.add_handler(CommandHandler("removeAppend", remove_comment))
+    application.add_handler(CommandHandler("reviewer", become_reviewer, filters=filters.Chat(
+        chat_id=ReviewConfig.REVIEWER_GROUP)))
+    application.add_handler(CommandHandler("reply", reply_submitter))
+    application.add_handler(CommandHandler("customReason", custom_reason))
+    application.add_handler(CommandHandler("ban", ban))
+    application.add_handler(CommandHandler("unban", unban))
+
+    application.add_handler(CommandHandler("update", update))
+    application.add_handler(CommandHandler("metrics", metrics))
+    application.add_handler(CommandHandler("backup", backup))
+
+    conv_handler = ConversationHandler(
+        entry_points=[
+            CommandHandler("review", private_review_start, filters=filters.ChatType.PRIVATE)
+        ],
+        states={
+            1: [CallbackQueryHandler(callback=private_review, pattern="^next_post$")],
+        },
+        fallbacks=[CommandHandler("cancel", cancel), CallbackQueryHandler(cancel, pattern="^cancel$")],
+        # 会话状态保存在 users.db 中，重启后可以继续私聊审核
+        name="private_review",
+        persistent=True,
+    )
+    application.add_handler(conv_handler)
+
+    # 内联查询
+    application.add_handler(InlineQueryHandler(inline_query))
+
+    bot_logger.info("Bot started")
+    application.run_polling(allowed_updates=Update.ALL_TYPES)
+
+
+if __name__ == "__main__":
+    bot_logger.info("Bot loading...")
+    bot_logger.info("Running on "+ os.name + ", CPU " + os.uname().machine + ", Path " + os.getcwd())
+    Config_verify_result, Config_verify_msg = Config_verify().verify()
+    if Config_verify_result == "fail" :
+        bot_logger.error(Config_verify_msg)
+    elif Config_verify_result == "warning":
+        bot_logger.warning(Config_verify_msg)
+        run_bot()
+    else:
+        run_bot()
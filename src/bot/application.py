@@ -0,0 +1,25 @@
+from telegram import Update
+from telegram.ext import Application
+
+from src.bot.userdata import USER_DATA_STORE
+from src.database.unit_of_work import UnitOfWork, UNIT_OF_WORK_STATS
+from src.logger import bot_logger
+
+
+class ReviewApplication(Application):
+    """
+    每个更新在自己的 UnitOfWork 中处理，装饰器、处理器与 src.utils 中的函数共享只读会话；
+    处理之前记录用户的访问，由 USER_DATA_STORE 淘汰长时间没有操作的用户的 user_data
+    通过 ApplicationBuilder.application_class 使用
+    """
+
+    async def process_update(self, update: object) -> None:
+        if isinstance(update, Update) and update.effective_user:
+            USER_DATA_STORE.touch(update.effective_user.id)
+        async with UnitOfWork() as unit:
+            await super().process_update(update)
+        UNIT_OF_WORK_STATS.record(unit)
+        if unit.queries:
+            update_id = update.update_id if isinstance(update, Update) else None
+            bot_logger.debug(f"Update {update_id}: {unit.queries} queries, {unit.commits} commits, "
+                             f"{unit.sessions} sessions in {unit.elapsed_ms:.1f} ms")
@@ -0,0 +1,102 @@
+"""
+python -m src.bot.callback [--rounds N]    测量每个按钮回调的路由耗时
+对比 3.0 中逐个检查的正则 CallbackQueryHandler 加 split("_") 解析与 CALLBACK_ROUTER 的前缀树解码
+"""
+import argparse
+import random
+import statistics
+import time
+
+from telegram import CallbackQuery, Update, User
+from telegram.ext import CallbackQueryHandler
+
+from src.bot.callback.router import CALLBACK_ROUTER, CallbackAction, VoteOption, encode_callback
+
+# 3.0 的 main.py 中按注册顺序排列的回调正则
+LEGACY_PATTERNS = ("v3.0.cancel", "^v3.0.submitConfirm", "^v3.0.approve_", "^v3.0.reject_", "^v3.0.rejectDuplicate_",
+                   "^v3.0.voteQuery_", "^v3.0.voteRevoke_", "^reason_", "^private#", "^pri#reason_")
+
+
+async def noop(*args, **kwargs) -> None:
+    pass
+
+
+LEGACY_HANDLERS = [CallbackQueryHandler(noop, pattern=pattern) for pattern in LEGACY_PATTERNS]
+
+
+def legacy_route(update: Update) -> list[str] | None:
+    # Application 按注册顺序调用 check_update，处理函数中再解析一次
+    for handler in LEGACY_HANDLERS:
+        if handler.check_update(update):
+            return update.callback_query.data.split("_")
+    return None
+
+
+def as_updates(data: list[str]) -> list[Update]:
+    user = User(1, "reviewer", False)
+    return [Update(index, callback_query=CallbackQuery(str(index), user, "bench", data=item))
+            for index, item in enumerate(data)]
+
+
+def sample_data(rng: random.Random) -> tuple[list[str], list[str]]:
+    """
+    按审核群中的实际比例生成按钮数据，大部分是投票
+    """
+    new, legacy = [], []
+    for _ in range(1000):
+        post_id = rng.randint(1, 500000)
+        kind = rng.choices(["vote", "revoke", "reason", "submit", "private"], [70, 10, 8, 10, 2])[0]
+        if kind == "vote":
+            option = rng.choice(list(VoteOption))
+            new.append(encode_callback(CallbackAction.VOTE, post_id, option))
+            legacy.append({VoteOption.APPROVE: f"v3.0.approve_{post_id}",
+                           VoteOption.APPROVE_NSFW: f"v3.0.approve_{post_id}_NSFW",
+                           VoteOption.REJECT: f"v3.0.reject_{post_id}",
+                           VoteOption.REJECT_DUPLICATE: f"v3.0.rejectDuplicate_{post_id}"}[option])
+        elif kind == "revoke":
+            new.append(encode_callback(CallbackAction.VOTE_REVOKE, post_id))
+            legacy.append(f"v3.0.voteRevoke_{post_id}")
+        elif kind == "reason":
+            new.append(encode_callback(CallbackAction.REASON, post_id, rng.randint(0, 5)))
+            legacy.append(f"reason_{post_id}_{new[-1][-1]}")
+        elif kind == "submit":
+            new.append(encode_callback(CallbackAction.SUBMIT, True))
+            legacy.append("v3.0.submitConfirm_real_name")
+        else:
+            new.append(encode_callback(CallbackAction.PRIVATE_REASON, post_id, 1))
+            legacy.append(f"pri#reason_{post_id}_1")
+    return new, legacy
+
+
+def measure(route, data: list[Update], rounds: int) -> list[float]:
+    """
+    返回每轮的平均耗时(微秒/次)，第一轮用于预热
+    """
+    results = []
+    for _ in range(rounds + 1):
+        started = time.perf_counter_ns()
+        for item in data:
+            route(item)
+        results.append((time.perf_counter_ns() - started) / len(data) / 1000)
+    return results[1:]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(prog="python -m src.bot.callback", description="按钮回调路由耗时")
+    parser.add_argument("--rounds", type=int, default=50)
+    args = parser.parse_args()
+    new, legacy = sample_data(random.Random(0))
+    for action in CallbackAction:
+        CALLBACK_ROUTER.add(action, noop)
+    new, legacy = as_updates(new), as_updates(legacy)
+    assert all(CALLBACK_ROUTER.check_update(update) for update in new + legacy)
+    print(f"{'router':<28} {'median':>10} {'min':>10}")
+    for name, route, updates in (("regex handlers + split (3.0)", legacy_route, legacy),
+                                 ("prefix tree, 3.0 data", CALLBACK_ROUTER.check_update, legacy),
+                                 ("prefix tree, v4 data", CALLBACK_ROUTER.check_update, new)):
+        results = measure(route, updates, args.rounds)
+        print(f"{name:<28} {statistics.median(results):>8.2f}us {min(results):>8.2f}us")
+
+
+if __name__ == "__main__":
+    main()
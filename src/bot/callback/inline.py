@@ -1,97 +1,167 @@
-from uuid import uuid4
-
-from telegram import Update, InlineQueryResultArticle, InputTextMessageContent
-from telegram.ext import ContextTypes
-
-from src.bot import check_banned
-
-
-@check_banned
-async def inline_query(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    query = update.inline_query.query
-    if not query or query == "help":
-        results = [InlineQueryResultArticle(
-            id=str(uuid4()),
-            title="inline模式仅限于审核用于处理稿件信息哦~",
-            input_message_content=InputTextMessageContent("输入help获取帮助")
-        )
-        ]
-        await update.inline_query.answer(results)
-        return None
-
-    if query.startswith("append_"):
-        # 添加备注
-        data = query.split("#", 1)
-        id_data = data[0].replace("append_", "")
-        id_data = int(id_data.strip())
-        reply_text = data[1].strip() if len(data) > 1 else None
-        if not reply_text:
-            await update.inline_query.answer(
-                [InlineQueryResultArticle(
-                    id=str(uuid4()),
-                    title="请在输入框内输入要添加的备注内容",
-                    input_message_content=InputTextMessageContent("请输入要添加的备注内容")
-                )]
-            )
-            return None
-        await update.inline_query.answer(
-            [InlineQueryResultArticle(
-                id=str(uuid4()),
-                title=f"点此确认添加备注：{reply_text}",
-                input_message_content=InputTextMessageContent(f"/append {id_data} {reply_text}")
-            )]
-        )
-    elif query.startswith("removeAppend_"):
-        # 删除备注
-        id_data = query.replace("removeAppend_", "")
-        id_data = int(id_data.strip())
-        await update.inline_query.answer(
-            [InlineQueryResultArticle(
-                id=str(uuid4()),
-                title=f"点此确认移除你添加的备注",
-                input_message_content=InputTextMessageContent(f"/removeAppend {id_data}")
-            )]
-        )
-    elif query.startswith("reply_"):
-        # 删除备注
-        data = query.split("#", 1)
-        id_data = data[0].replace("reply_", "")
-        id_data = int(id_data.strip())
-        reply_text = data[1].strip() if len(data) > 1 else None
-        if not reply_text:
-            await update.inline_query.answer(
-                [InlineQueryResultArticle(
-                    id=str(uuid4()),
-                    title="请在输入框内输入回复内容",
-                    input_message_content=InputTextMessageContent("请在输入框内输入回复内容")
-                )]
-            )
-            return None
-        await update.inline_query.answer(
-            [InlineQueryResultArticle(
-                id=str(uuid4()),
-                title=f"点此回复内容：{reply_text}",
-                input_message_content=InputTextMessageContent(f"/reply {id_data} {reply_text}")
-            )]
-        )
-    elif query.startswith("customReason_"):
-        data = query.split("#", 1)
-        id_data = data[0].replace("customReason_", "")
-        id_data = int(id_data.strip())
-        reason = data[1].strip() if len(data) > 1 else None
-        if not reason:
-            await update.inline_query.answer(
-                [InlineQueryResultArticle(
-                    id=str(uuid4()),
-                    title="请在输入框内输入拒绝理由",
-                    input_message_content=InputTextMessageContent("请在输入框内输入拒绝理由")
-                )]
-            )
-            return None
-        await update.inline_query.answer(
-            [InlineQueryResultArticle(
-                id=str(uuid4()),
-                title=f"点此回复内容：{reason}",
-                input_message_content=InputTextMessageContent(f"/customReason {id_data} {reason}")
-            )]
+import html
+import time
+from uuid import uuid4
+
+from telegram import Update, InlineQueryResultArticle, InputTextMessageContent
+from telegram.ext import ContextTypes
+
+from src.bot import check_banned
+from src.config import ReviewConfig
+from src.database.archive import POST_ARCHIVE
+from src.database.fingerprint import TAG_PATTERN
+from src.database.posts import PostOperation
+from src.database.users import REVIEWER_REGISTRY
+from src.logger import bot_logger
+from src.utils import POST_STATUS_TEXT
+
+SEARCH_PAGE_SIZE = 20
+
+
+async def search_posts(update: Update, keywords: str) -> None:
+    """
+    search 关键词：全文搜索历史稿件，按相关度排序，向下滚动时按 offset 翻页
+    """
+    inline_query = update.inline_query
+    if not await REVIEWER_REGISTRY.is_reviewer(update.effective_user.id):
+        await inline_query.answer([InlineQueryResultArticle(
+            id=str(uuid4()),
+            title="❗️仅审核员可以搜索稿件",
+            input_message_content=InputTextMessageContent("仅审核员可以搜索稿件")
+        )], is_personal=True)
+        return
+    offset = int(inline_query.offset) if inline_query.offset.isdigit() else 0
+    started = time.perf_counter()
+    rows = await PostOperation.search(keywords, offset, SEARCH_PAGE_SIZE)
+    bot_logger.debug(f"Search {keywords!r} offset {offset}: {len(rows)} results in "
+                     f"{(time.perf_counter() - started) * 1000:.1f} ms")
+    if not rows:
+        if offset == 0:
+            await inline_query.answer([InlineQueryResultArticle(
+                id=str(uuid4()),
+                title="没有找到相关稿件" if keywords.strip() else "请输入要搜索的内容",
+                description="每个关键词至少 3 个字，多个关键词用空格分隔",
+                input_message_content=InputTextMessageContent("没有找到相关稿件")
+            )], is_personal=True)
+        else:
+            await inline_query.answer([], is_personal=True)
+        return
+    # 已归档的稿件从归档库中查找状态
+    archived = await POST_ARCHIVE.get_posts([post_id for post_id, status, _, _ in rows if status is None])
+    group_id = str(ReviewConfig.REVIEWER_GROUP)
+    results = []
+    for post_id, status, review_msg_id, snippet in rows:
+        if status is None and post_id in archived:
+            status = archived[post_id].status
+            review_msg_id = archived[post_id].review_msg_id
+        status_text = POST_STATUS_TEXT.get(status, "未知")
+        snippet = html.unescape(TAG_PATTERN.sub("", snippet or "")).strip()
+        message = f"🔎 稿件 <code>{post_id}</code>（{status_text}）\n{html.escape(snippet)}"
+        if review_msg_id and group_id.startswith("-100"):
+            message += f"\n<a href='https://t.me/c/{group_id[4:]}/{review_msg_id}'>跳转到审核消息</a>"
+        results.append(InlineQueryResultArticle(
+            id=str(post_id),
+            title=f"{post_id}（{status_text}）",
+            description=snippet,
+            input_message_content=InputTextMessageContent(message, parse_mode="HTML")
+        ))
+    next_offset = str(offset + SEARCH_PAGE_SIZE) if len(rows) == SEARCH_PAGE_SIZE else ""
+    await inline_query.answer(results, next_offset=next_offset, is_personal=True, cache_time=10)
+
+
+@check_banned
+async def inline_query(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    query = update.inline_query.query
+    if not query or query == "help":
+        results = [InlineQueryResultArticle(
+            id=str(uuid4()),
+            title="inline模式仅限于审核用于处理稿件信息哦~",
+            input_message_content=InputTextMessageContent("输入help获取帮助")
+        ), InlineQueryResultArticle(
+            id=str(uuid4()),
+            title="search 关键词",
+            description="搜索历史稿件的内容与审核注（仅限审核）",
+            input_message_content=InputTextMessageContent("输入 search 关键词 搜索历史稿件")
+        )
+        ]
+        await update.inline_query.answer(results)
+        return None
+
+    if query.startswith("search ") or query == "search":
+        # 搜索历史稿件
+        await search_posts(update, query[len("search"):])
+    elif query.startswith("append_"):
+        # 添加备注
+        data = query.split("#", 1)
+        id_data = data[0].replace("append_", "")
+        id_data = int(id_data.strip())
+        reply_text = data[1].strip() if len(data) > 1 else None
+        if not reply_text:
+            await update.inline_query.answer(
+                [InlineQueryResultArticle(
+                    id=str(uuid4()),
+                    title="请在输入框内输入要添加的备注内容",
+                    input_message_content=InputTextMessageContent("请输入要添加的备注内容")
+                )]
+            )
+            return None
+        await update.inline_query.answer(
+            [InlineQueryResultArticle(
+                id=str(uuid4()),
+                title=f"点此确认添加备注：{reply_text}",
+                input_message_content=InputTextMessageContent(f"/append {id_data} {reply_text}")
+            )]
+        )
+    elif query.startswith("removeAppend_"):
+        # 删除备注
+        id_data = query.replace("removeAppend_", "")
+        id_data = int(id_data.strip())
+        await update.inline_query.answer(
+            [InlineQueryResultArticle(
+                id=str(uuid4()),
+                title=f"点此确认移除你添加的备注",
+                input_message_content=InputTextMessageContent(f"/removeAppend {id_data}")
+            )]
+        )
+    elif query.startswith("reply_"):
+        # 删除备注
+        data = query.split("#", 1)
+        id_data = data[0].replace("reply_", "")
+        id_data = int(id_data.strip())
+        reply_text = data[1].strip() if len(data) > 1 else None
+        if not reply_text:
+            await update.inline_query.answer(
+                [InlineQueryResultArticle(
+                    id=str(uuid4()),
+                    title="请在输入框内输入回复内容",
+                    input_message_content=InputTextMessageContent("请在输入框内输入回复内容")
+                )]
+            )
+            return None
+        await update.inline_query.answer(
+            [InlineQueryResultArticle(
+                id=str(uuid4()),
+                title=f"点此回复内容：{reply_text}",
+                input_message_content=InputTextMessageContent(f"/reply {id_data} {reply_text}")
+            )]
+        )
+    elif query.startswith("customReason_"):
+        data = query.split("#", 1)
+        id_data = data[0].replace("customReason_", "")
+        id_data = int(id_data.strip())
+        reason = data[1].strip() if len(data) > 1 else None
+        if not reason:
+            await update.inline_query.answer(
+                [InlineQueryResultArticle(
+                    id=str(uuid4()),
+                    title="请在输入框内输入拒绝理由",
+                    input_message_content=InputTextMessageContent("请在输入框内输入拒绝理由")
+                )]
+            )
+            return None
+        await update.inline_query.answer(
+            [InlineQueryResultArticle(
+                id=str(uuid4()),
+                title=f"点此回复内容：{reason}",
+                input_message_content=InputTextMessageContent(f"/customReason {id_data} {reason}")
+            )]
         )
\ No newline at end of file
@@ -0,0 +1,295 @@
+"""
+按钮回调路由
+callback_data 格式为 "4<动作>:<参数>:<参数>..."，动作与参数见 CallbackAction 与 ARGUMENTS
+3.0 发出的按钮仍留在审核群的历史消息中，旧格式同样可以解码为相同的动作与参数
+所有前缀存放在一棵字典树中，按 callback_data 逐字查找最长的前缀，耗时只与 callback_data 的长度有关
+"""
+from enum import Enum
+from typing import Any, Awaitable, Callable
+
+from telegram import Update
+from telegram.ext import BaseHandler, ContextTypes
+
+VERSION = "4"
+SEPARATOR = ":"
+# Telegram 限制 callback_data 最多 64 字节
+MAX_LENGTH = 64
+# 字典树节点中存放解码函数的键，单个字符不会与之冲突
+_END = ""
+
+
+class CallbackAction(Enum):
+    SUBMIT = "s"  # 确认投稿
+    CANCEL = "x"  # 取消投稿
+    VOTE = "v"  # 审核群投票
+    VOTE_QUERY = "q"  # 查询我的投票
+    VOTE_REVOKE = "u"  # 撤回我的投票
+    REASON = "r"  # 选择拒绝理由
+    PRIVATE_VOTE = "pv"  # 私聊审核投票
+    PRIVATE_REASON = "pr"  # 私聊审核选择拒绝理由
+
+
+class VoteOption(Enum):
+    APPROVE = "a"
+    APPROVE_NSFW = "n"
+    REJECT = "r"
+    REJECT_DUPLICATE = "d"
+
+
+# 各动作的参数名与类型，处理函数以同名关键字参数接收；reason_index 为 None 表示忽略此投稿
+ARGUMENTS: dict[CallbackAction, tuple[tuple[str, Any], ...]] = {
+    CallbackAction.SUBMIT: (("real_name", bool),),
+    CallbackAction.CANCEL: (),
+    CallbackAction.VOTE: (("post_id", int), ("option", VoteOption)),
+    CallbackAction.VOTE_QUERY: (("post_id", int),),
+    CallbackAction.VOTE_REVOKE: (("post_id", int),),
+    CallbackAction.REASON: (("post_id", int), ("reason_index", int | None)),
+    CallbackAction.PRIVATE_VOTE: (("post_id", int), ("option", VoteOption)),
+    CallbackAction.PRIVATE_REASON: (("post_id", int), ("reason_index", int | None)),
+}
+
+Decoded = tuple[CallbackAction, dict[str, Any]]
+
+
+def _parse_int(raw: str) -> int:
+    # int() 还接受空白、正负号与全角数字
+    if not (raw.isascii() and raw.isdigit()):
+        raise ValueError(f"Invalid integer {raw!r}")
+    return int(raw)
+
+
+def _parse_optional_int(raw: str) -> int | None:
+    return None if raw == "-" else _parse_int(raw)
+
+
+def _parse_bool(raw: str) -> bool:
+    if raw not in ("0", "1"):
+        raise ValueError(f"Invalid boolean {raw!r}")
+    return raw == "1"
+
+
+def _parser(kind: Any) -> Callable[[str], Any]:
+    """
+    参数类型对应的解析函数，解码时不再逐个判断类型
+    """
+    if kind is bool:
+        return _parse_bool
+    if isinstance(kind, type) and issubclass(kind, Enum):
+        # 按值查找成员，不存在时抛出 KeyError
+        return kind._value2member_map_.__getitem__
+    if kind == int | None:
+        return _parse_optional_int
+    return _parse_int
+
+
+def _encode_value(value: Any) -> str:
+    if value is None:
+        return "-"
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    if isinstance(value, Enum):
+        return value.value
+    return str(value)
+
+
+def _named(action: CallbackAction, values: tuple) -> Decoded:
+    return action, {name: value for (name, _), value in zip(ARGUMENTS[action], values, strict=True)}
+
+
+def encode_callback(action: CallbackAction, *args: Any) -> str:
+    """
+    编码按钮的 callback_data，参数按 ARGUMENTS 中的顺序传入
+    """
+    if len(args) != len(ARGUMENTS[action]):
+        raise ValueError(f"{action.name} takes {len(ARGUMENTS[action])} arguments, got {len(args)}")
+    data = VERSION + action.value + "".join(SEPARATOR + _encode_value(arg) for arg in args)
+    if len(data.encode()) > MAX_LENGTH:
+        raise ValueError(f"Callback data too long: {data!r}")
+    return data
+
+
+def _compact_decoder(action: CallbackAction) -> Callable[[str], Decoded]:
+    names = [name for name, _ in ARGUMENTS[action]]
+    parsers = [_parser(kind) for _, kind in ARGUMENTS[action]]
+
+    def decode(rest: str) -> Decoded:
+        # 前缀已包含第一个分隔符
+        values = rest.split(SEPARATOR) if parsers else ([] if rest == "" else [rest])
+        if len(values) != len(parsers):
+            raise ValueError(f"Invalid arguments {rest!r} for {action.name}")
+        return action, {name: parse(raw) for name, parse, raw in zip(names, parsers, values)}
+
+    return decode
+
+
+def _legacy_post(action: CallbackAction, option: VoteOption | None = None) -> Callable[[str], Decoded]:
+    # {post_id}
+    def decode(rest: str) -> Decoded:
+        post_id = _parse_int(rest)
+        return _named(action, (post_id,) if option is None else (post_id, option))
+
+    return decode
+
+
+def _legacy_approve(rest: str) -> Decoded:
+    # v3.0.approve_{post_id} / v3.0.approve_{post_id}_NSFW
+    post_id, nsfw, suffix = rest.partition("_")
+    if nsfw and suffix != "NSFW":
+        raise ValueError(f"Invalid approve suffix {rest!r}")
+    return _named(CallbackAction.VOTE, (_parse_int(post_id), VoteOption.APPROVE_NSFW if nsfw else VoteOption.APPROVE))
+
+
+def _legacy_reason(action: CallbackAction) -> Callable[[str], Decoded]:
+    # {post_id}_{reason_index} / {post_id}_skip
+    def decode(rest: str) -> Decoded:
+        post_id, _, index = rest.partition("_")
+        return _named(action, (_parse_int(post_id), None if index == "skip" else _parse_int(index)))
+
+    return decode
+
+
+def _legacy_exact(action: CallbackAction, values: dict[str, tuple]) -> Callable[[str], Decoded]:
+    def decode(rest: str) -> Decoded:
+        return _named(action, values[rest])
+
+    return decode
+
+
+LEGACY_PREFIXES: dict[str, Callable[[str], Decoded]] = {
+    "v3.0.submitConfirm": _legacy_exact(CallbackAction.SUBMIT, {"": (False,), "_real_name": (True,)}),
+    "v3.0.cancel": _legacy_exact(CallbackAction.CANCEL, {"": ()}),
+    "v3.0.approve_": _legacy_approve,
+    "v3.0.reject_": _legacy_post(CallbackAction.VOTE, VoteOption.REJECT),
+    "v3.0.rejectDuplicate_": _legacy_post(CallbackAction.VOTE, VoteOption.REJECT_DUPLICATE),
+    "v3.0.voteQuery_": _legacy_post(CallbackAction.VOTE_QUERY),
+    "v3.0.voteRevoke_": _legacy_post(CallbackAction.VOTE_REVOKE),
+    "reason_": _legacy_reason(CallbackAction.REASON),
+    "private#approve_": _legacy_post(CallbackAction.PRIVATE_VOTE, VoteOption.APPROVE),
+    "private#approve_NSFW_": _legacy_post(CallbackAction.PRIVATE_VOTE, VoteOption.APPROVE_NSFW),
+    "private#reject_": _legacy_post(CallbackAction.PRIVATE_VOTE, VoteOption.REJECT),
+    "private#rejectDuplicate_": _legacy_post(CallbackAction.PRIVATE_VOTE, VoteOption.REJECT_DUPLICATE),
+    "pri#reason_": _legacy_reason(CallbackAction.PRIVATE_REASON),
+}
+
+
+class CallbackCodec:
+    """
+    callback_data 前缀字典树，节点为 {字符: 子节点}，_END 键存放在此结束的前缀的解码函数
+    """
+
+    def __init__(self):
+        self._root: dict = {}
+        for action, arguments in ARGUMENTS.items():
+            prefix = VERSION + action.value + (SEPARATOR if arguments else "")
+            self.add_prefix(prefix, _compact_decoder(action))
+        for prefix, decoder in LEGACY_PREFIXES.items():
+            self.add_prefix(prefix, decoder)
+
+    def add_prefix(self, prefix: str, decoder: Callable[[str], Decoded]) -> None:
+        node = self._root
+        for char in prefix:
+            node = node.setdefault(char, {})
+        if _END in node:
+            raise ValueError(f"Duplicate callback prefix {prefix!r}")
+        node[_END] = decoder
+
+    def _match(self, data: str) -> tuple[Callable[[str], Decoded] | None, int]:
+        """
+        返回 (最长前缀的解码函数, 前缀长度)，没有匹配的前缀时解码函数为 None
+        """
+        node, decoder, end = self._root, None, 0
+        for index, char in enumerate(data):
+            node = node.get(char)
+            if node is None:
+                break
+            if _END in node:
+                decoder, end = node[_END], index + 1
+                # 叶子节点，不会再有更长的前缀
+                if len(node) == 1:
+                    break
+        return decoder, end
+
+    def owns(self, data: str) -> bool:
+        """
+        是否是本路由格式的数据(当前版本或旧格式前缀)，不检查参数
+        """
+        return data.startswith(VERSION) or self._match(data)[0] is not None
+
+    def decode(self, data: str) -> Decoded | None:
+        """
+        按最长前缀解码，没有匹配的前缀或参数不合法时返回 None
+        """
+        decoder, end = self._match(data)
+        if decoder is None:
+            return None
+        try:
+            return decoder(data[end:])
+        except (ValueError, KeyError):
+            return None
+
+
+CALLBACK_CODEC = CallbackCodec()
+
+
+def decode_callback(data: str) -> Decoded | None:
+    return CALLBACK_CODEC.decode(data)
+
+
+class CallbackRouter(BaseHandler[Update, ContextTypes.DEFAULT_TYPE, Any]):
+    """
+    代替逐个匹配正则的 CallbackQueryHandler，解码 callback_data 后按动作调用处理函数，参数以关键字传入
+    没有注册的动作与无法解码的数据不处理，留给之后的 handler(例如 ConversationHandler 中的 next_post / cancel)
+    """
+
+    def __init__(self):
+        super().__init__(self.dispatch)
+        self._routes: dict[CallbackAction, Callable[..., Awaitable[Any]]] = {}
+        self.routed: dict[str, int] = {}
+        # 看起来是本路由的数据却无法解码或没有注册处理函数的次数，其他 handler 的按钮不计入
+        self.unmatched = 0
+
+    def add(self, action: CallbackAction, callback: Callable[..., Awaitable[Any]]) -> None:
+        if action in self._routes:
+            raise ValueError(f"Callback action {action.name} already routed")
+        self._routes[action] = callback
+        self.routed[action.name] = 0
+
+    def resolve(self, data: str) -> Decoded | None:
+        decoded = CALLBACK_CODEC.decode(data)
+        if decoded is None or decoded[0] not in self._routes:
+            if CALLBACK_CODEC.owns(data):
+                self.unmatched += 1
+            return None
+        return decoded
+
+    def check_update(self, update: object) -> Decoded | None:
+        if not isinstance(update, Update) or update.callback_query is None:
+            return None
+        data = update.callback_query.data
+        if not isinstance(data, str):
+            return None
+        return self.resolve(data)
+
+    async def handle_update(self, update: Update, application: Any, check_result: Decoded,
+                            context: ContextTypes.DEFAULT_TYPE) -> Any:
+        self.collect_additional_context(context, update, application, check_result)
+        action, kwargs = check_result
+        self.routed[action.name] += 1
+        return await self._routes[action](update, context, **kwargs)
+
+    async def dispatch(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> Any:
+        """
+        不经过 Application 直接分发一个更新
+        """
+        decoded = self.check_update(update)
+        if decoded is None:
+            return None
+        action, kwargs = decoded
+        self.routed[action.name] += 1
+        return await self._routes[action](update, context, **kwargs)
+
+    def stats(self) -> dict:
+        return {**self.routed, "unmatched": self.unmatched}
+
+
+CALLBACK_ROUTER = CallbackRouter()
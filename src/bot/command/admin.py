@@ -1,312 +1,330 @@
-import json
-import os
-import subprocess
-import sys
-import time
-from typing import Any
-
-from sqlalchemy import select
-from telegram import Update, InlineKeyboardMarkup, InlineKeyboardButton
-from telegram.ext import ContextTypes, ConversationHandler
-
-from src.bot import check_reviewer
-from src.config import BotConfig
-from src.database.posts import get_post_db, PostModel, PostStatus, PostLogModel
-from src.database.users import get_users_db, ReviewerModel, BannedUserModel, SubmitterModel
-from src.logger import bot_logger
-from src.utils import notify_submitter, MEDIA_GROUP_TYPES, check_post_status
-
-
-async def update(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    if update.effective_user.id not in BotConfig.ADMIN:
-        await update.message.reply_text("您没有权限执行此操作。")
-        return
-    try:
-        subprocess.run(['git', 'pull'], check=True)
-        await update.message.reply_text("Git 同步完成，正在重启")
-        python = sys.executable
-        os.execl(python, python, *sys.argv)
-    except subprocess.CalledProcessError:
-        await update.message.reply_text("更新失败，请检查日志")
-
-@check_reviewer
-async def append_comment(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    arg = context.args
-    if len(arg) != 2:
-        await update.message.reply_text("请提供投稿 ID 和备注内容。格式：/append <post_id> <comment>")
-        return
-    post_id, comment = arg
-    post_id = int(post_id)
-    comment = comment.strip()
-    eff_user = update.effective_user
-    if not comment:
-        await update.message.reply_text("请提供要添加的备注内容。")
-        return
-    async with get_post_db() as session:
-        async with session.begin():
-            post_info = await session.execute(select(PostModel).filter_by(id=post_id))
-            post_info = post_info.scalar_one_or_none()
-            if not post_info:
-                await update.message.reply_text(f"投稿 ID {post_id} 不存在。")
-                return
-            post_info.other = post_info.other or "{}"
-            other_data = json.loads(post_info.other) or {}
-            other_data.setdefault('comment', []).append({
-                "comment": comment,
-                "user_id": eff_user.id,
-                "timestamp": int(time.time()),
-            })
-            post_info.other = json.dumps(other_data)
-            await session.merge(post_info)
-    await update.message.reply_text(
-        f"已添加备注：{comment} 到投稿 ID {post_id}。\n")
-
-
-@check_reviewer
-async def remove_comment(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    arg = context.args
-    if len(arg) != 1:
-        await update.message.reply_text("格式错误")
-        return
-    post_id = int(arg[0])
-    async with get_post_db() as session:
-        async with session.begin():
-            post_info = await session.execute(select(PostModel).filter_by(id=post_id))
-            post_info = post_info.scalar_one_or_none()
-            if not post_info:
-                await update.message.reply_text(f"投稿 ID {post_id} 不存在。")
-                return
-            post_info.other = post_info.other or "{}"
-            other_data = json.loads(post_info.other) or {}
-            comments = other_data.setdefault('comment', [])
-            other_data['comment'] = [c for c in comments if c.get('user_id') != update.effective_user.id]
-            post_info.other = json.dumps(other_data)
-            await session.merge(post_info)
-    await update.message.reply_text(f"已删除您的备注。")
-
-
-async def become_reviewer(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    eff_user = update.effective_user
-    async with get_users_db() as session:
-        async with session.begin():
-            reviewer_info = await session.execute(
-                select(ReviewerModel).filter_by(user_id=eff_user.id)
-            )
-            reviewer_info = reviewer_info.scalar_one_or_none()
-            if not reviewer_info:
-                reviewer_info = ReviewerModel(
-                    user_id=eff_user.id,
-                    username=eff_user.username,
-                    fullname=eff_user.full_name,
-                )
-                session.add(reviewer_info)
-                await update.message.reply_text("您已成为审核员。")
-            else:
-                await update.message.reply_text("您已经是审核员了，无需再次申请。")
-
-
-@check_reviewer
-async def reply_submitter(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    arg = context.args
-    if len(arg) != 2:
-        await update.message.reply_text("格式错误")
-        return
-    post_id, comment = context.args
-    post_id = int(post_id)
-    if not comment:
-        await update.message.reply_text("请提供要添加的评论内容。")
-        return
-    async with get_post_db() as session:
-        post_info = await session.execute(select(PostModel).filter_by(id=post_id))
-        post_info = post_info.scalar_one_or_none()
-        if not post_info:
-            await update.message.reply_text(f"投稿 ID {post_id} 不存在。")
-            return
-        await notify_submitter(post_info, context, comment)
-    await update.message.reply_text("已向投稿者发送评论。")
-
-
-async def custom_reason(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    arg = context.args
-    if len(arg) != 2:
-        await update.message.reply_text("格式错误")
-        return
-    post_id, reason_msg = context.args
-    post_id = int(post_id)
-    eff_user = update.effective_user
-    async with get_post_db() as session:
-        async with session.begin():
-            result = await session.execute(select(PostModel).filter_by(id=post_id))
-            post_data = result.scalar_one_or_none()
-            if not post_data:
-                await update.effective_message.reply_text("❗️投稿不存在或已被处理，请稍后再试。")
-                return
-            if post_data.status != PostStatus.NEED_REASON.value:
-                await update.effective_message.reply_text("❗️投稿状态不正确，请稍后再试。")
-                return
-            session.add(PostLogModel(post_id=post_id, reviewer_id=eff_user.id, operate_type="system",
-                                     operate_time=int(time.time()), msg=reason_msg))
-    rev_ret = await check_post_status(post_data, context)
-    if rev_ret == 2:
-        await update.effective_message.reply_text("❎拒绝理由已选择，此条投稿已被拒绝。")
-    else:
-        await update.effective_message.reply_text("❌似乎存在错误，请联系开发者。")
-
-
-@check_reviewer
-async def ban(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    arg = context.args
-    if len(arg) != 2:
-        await update.message.reply_text("请提供用户ID和封禁原因。")
-        return
-    user_id, reason = arg
-    if not user_id.isdigit():
-        await update.message.reply_text("用户ID必须是数字。")
-        return
-    user_id = int(user_id)
-    reason = reason.strip()
-    async with get_users_db() as session:
-        async with session.begin():
-            submitter = await session.execute(select(SubmitterModel).filter_by(user_id=user_id))
-            submitter = submitter.scalar_one_or_none()
-            ban_user = BannedUserModel(user_id=user_id, banned_reason=reason, banned_date=int(time.time()),
-                                       banned_by=update.effective_user.id)
-            if submitter:
-                ban_user.username = submitter.username
-                ban_user.fullname = submitter.fullname
-            session.add(ban_user)
-    await update.message.reply_text(f"已将用户 ID {user_id} 封禁，原因：{reason}.")
-
-
-@check_reviewer
-async def unban(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    arg = context.args
-    if len(arg) != 1:
-        await update.message.reply_text("请提供用户ID和封禁原因。")
-        return
-    if not arg[0].isdigit():
-        await update.message.reply_text("用户ID必须是数字。")
-        return
-    user_id = int(arg[0])
-    async with get_users_db() as session:
-        async with session.begin():
-            banned_user = await session.execute(select(BannedUserModel).filter_by(user_id=user_id))
-            banned_user = banned_user.scalar_one_or_none()
-            if not banned_user:
-                await update.message.reply_text(f"用户 ID {user_id} 未被封禁。")
-                return
-            await session.delete(banned_user)
-    await update.message.reply_text(f"已解除用户 ID {user_id} 的封禁.")
-
-
-async def get_post_list(u_id: int, page: int = 0) -> bool | list[Any]:
-    posts_list = []
-    async with get_post_db() as session:
-        posts = await session.execute(
-            select(PostModel)
-            .filter_by(status=PostStatus.PENDING.value)
-            .offset(page * 100)
-            .limit(100)
-        )
-        posts = posts.scalars().all()
-        if not posts:
-            return False
-        for post in posts:
-            result = await session.execute(
-                select(PostLogModel).filter_by(post_id=post.id, reviewer_id=u_id))
-            logs = result.scalars().all()
-            if not logs:
-                posts_list.append(post.id)
-    return posts_list
-
-
-@check_reviewer
-async def private_review_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    bot_logger.info("Starting private review process")
-    context.user_data["review_posts"] = []
-    context.user_data["review_page"] = 0
-    while True:
-        ret = await get_new_post(update, context)
-        if ret == ConversationHandler.END:
-            bot_logger.info("No more posts to review.")
-            return ConversationHandler.END
-        else:
-            await private_review(update, context)
-            return 1
-
-
-async def get_new_post(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    # 私聊审核
-    eff_user = update.effective_user
-    old_post = context.user_data["review_posts"]
-    if old_post and len(old_post) > 0:
-        return
-    posts_list = []
-    while not posts_list:
-        posts_new_list = await get_post_list(eff_user.id, context.user_data["review_page"])
-        if type(posts_new_list) == bool:
-            await eff_user.send_message("没有待审核的稿件。")
-            return ConversationHandler.END
-        context.user_data["review_page"] += 1
-        posts_list.extend(posts_new_list)
-    context.user_data["review_posts"] = posts_list
-    return 2
-
-
-async def private_review(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    posts_list = context.user_data.get("review_posts", [])
-    eff_user = update.effective_user
-    if update.callback_query:
-        await update.callback_query.answer("正在尝试获取新的稿件")
-    if update.effective_message.message_id:
-        try:
-            await update.effective_message.delete()
-        except Exception as e:
-            bot_logger.error(f"Failed to delete message: {e}")
-    if not posts_list:
-        if await get_new_post(update, context) == ConversationHandler.END:
-            return ConversationHandler.END
-        posts_list = context.user_data.get("review_posts", [])
-    cur_post_id = posts_list.pop(0)
-    context.user_data["review_posts"] = posts_list
-    async with get_post_db() as session:
-        post_info = await session.execute(select(PostModel).filter_by(id=cur_post_id))
-        post_info = post_info.scalar_one_or_none()
-        if not post_info:
-            await eff_user.send_message(f"稿件 ID {cur_post_id} 不存在。")
-            return
-        # 发送稿件信息
-        cur_id = str(cur_post_id)
-        reply_kb = InlineKeyboardMarkup([
-            [InlineKeyboardButton("✅SFW通过", callback_data=f"private#approve_{cur_id}"),
-             InlineKeyboardButton("❌拒绝", callback_data=f"private#reject_{cur_id}")],
-            [InlineKeyboardButton("✅NSFW通过", callback_data=f"private#approve_NSFW_{cur_id}"),
-             InlineKeyboardButton("❌重复投稿拒绝", callback_data=f"private#rejectDuplicate_{cur_id}")],
-            [InlineKeyboardButton("➡️下一条", callback_data="next_post"),
-             InlineKeyboardButton("取消操作", callback_data="cancel")]
-        ])
-        send_text = post_info.text
-        async with get_users_db() as udb_session:
-            submitter = await udb_session.execute(
-                select(SubmitterModel).filter_by(user_id=post_info.submitter_id))
-            submitter = submitter.scalar_one_or_none()
-        # 审核评论处理
-        media_list = json.loads(post_info.attachment)
-        if media_list:
-            media = []
-            for media_item in media_list:
-                media.append(MEDIA_GROUP_TYPES[media_item["media_type"]](media=media_item["media_id"]))
-            msg = await context.bot.send_media_group(chat_id=eff_user.id, media=media, caption=send_text,
-                                                     parse_mode="HTML")
-            msg_id = msg[0].id
-            msg = msg[0]
-        else:
-            msg = await context.bot.send_message(chat_id=eff_user.id, text=send_text, parse_mode="HTML")
-            msg_id = msg.id
-        send_msg = "\n\n <b>稿件ID：</b>" + str(post_info.id)
-        send_msg += "\n <b>投稿者：</b> @" + submitter.username + f" {submitter.fullname}"
-        op_msg = await msg.reply_text(text=send_msg, parse_mode="HTML", reply_markup=reply_kb, do_quote=True)
-        context.user_data["review_private_post_id"] = cur_id
-        context.user_data["review_private_post_msg_id"] = msg_id
-        context.user_data["review_private_operate_id"] = op_msg.id
-    return
+import json
+import os
+import subprocess
+import sys
+import time
+
+from sqlalchemy import select
+from sqlalchemy.orm.exc import StaleDataError
+from telegram import Update, InlineKeyboardMarkup, InlineKeyboardButton
+from telegram.ext import ContextTypes, ConversationHandler
+
+from src.bot import check_reviewer
+from src.bot.callback.router import CALLBACK_ROUTER, CallbackAction, VoteOption, encode_callback
+from src.bot.message import MEDIA_GROUP_DEBOUNCER
+from src.bot.outbox import OUTBOX_WORKER
+from src.bot.persistence import PERSISTENCE
+from src.bot.ratelimit import Priority, PriorityRateLimiter
+from src.bot.userdata import USER_DATA_STORE
+from src.config import BotConfig
+from src.database.archive import POST_ARCHIVE
+from src.database.backup import DATABASE_BACKUP
+from src.database.unit_of_work import UNIT_OF_WORK_STATS
+from src.dedup import NEAR_DUPLICATES
+from src.database.posts import get_post_db, PostModel, PostStatus, REVIEW_QUEUE, PostOperation, POSTS_WRITER
+from src.database.users import get_users_db, ReviewerModel, BannedUserModel, SubmitterModel, REVIEWER_REGISTRY, \
+    BAN_LIST, SUBMITTER_PROFILES, USERS_WRITER, USER_COUNTERS
+from src.logger import bot_logger
+from src.scheduler import SCHEDULER
+from src.utils import notify_submitter, MEDIA_GROUP_TYPES, check_post_status, POST_LOCKS, MEDIA_GROUPS, STATUS_EDITS
+
+
+async def update(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if update.effective_user.id not in BotConfig.ADMIN:
+        await update.message.reply_text("您没有权限执行此操作。")
+        return
+    try:
+        subprocess.run(['git', 'pull'], check=True)
+        await update.message.reply_text("Git 同步完成，正在重启")
+        # execl 不会经过 Application.stop，先写入尚未保存的 user_data 与会话状态
+        await context.application.update_persistence()
+        python = sys.executable
+        os.execl(python, python, *sys.argv)
+    except subprocess.CalledProcessError:
+        await update.message.reply_text("更新失败，请检查日志")
+
+
+async def metrics(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if update.effective_user.id not in BotConfig.ADMIN:
+        await update.message.reply_text("您没有权限执行此操作。")
+        return
+    stats = {
+        "reviewer_registry": REVIEWER_REGISTRY.stats(),
+        "ban_list": BAN_LIST.stats(),
+        "submitter_profiles": SUBMITTER_PROFILES.stats(),
+        "review_queue": REVIEW_QUEUE.stats(),
+        "post_locks": POST_LOCKS.stats(),
+        "status_edits": STATUS_EDITS.stats(),
+        "media_group_debouncer": MEDIA_GROUP_DEBOUNCER.stats(),
+        "media_groups": MEDIA_GROUPS.stats(),
+        "outbox": OUTBOX_WORKER.stats(),
+        "posts_writer": POSTS_WRITER.stats(),
+        "users_writer": USERS_WRITER.stats(),
+        "user_counters": USER_COUNTERS.stats(),
+        "archive": POST_ARCHIVE.stats(),
+        "backup": DATABASE_BACKUP.stats(),
+        "near_duplicates": NEAR_DUPLICATES.stats(),
+        "scheduler": SCHEDULER.stats(),
+        "callback_router": CALLBACK_ROUTER.stats(),
+        "unit_of_work": UNIT_OF_WORK_STATS.stats(),
+        "persistence": PERSISTENCE.stats(),
+        "user_data": USER_DATA_STORE.stats(),
+    }
+    if isinstance(context.bot.rate_limiter, PriorityRateLimiter):
+        stats["rate_limiter"] = context.bot.rate_limiter.stats()
+    lines = []
+    for name, values in stats.items():
+        lines.append(f"<b>{name}</b>")
+        lines.extend(f"  {k}: {v}" for k, v in values.items())
+    await update.message.reply_text("\n".join(lines), parse_mode="HTML")
+
+
+async def backup(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if update.effective_user.id not in BotConfig.ADMIN:
+        await update.message.reply_text("您没有权限执行此操作。")
+        return
+    await update.message.reply_text("正在备份数据库...")
+    try:
+        paths = await DATABASE_BACKUP.run()
+    except Exception as e:
+        bot_logger.error(f"Database backup failed: {e}")
+        await update.message.reply_text("备份失败，请检查日志")
+        return
+    lines = [f"{path.name}  {path.stat().st_size / 1024:.1f} KiB" for path in paths]
+    await update.message.reply_text("备份完成：\n" + "\n".join(lines))
+
+
+@check_reviewer
+async def append_comment(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    arg = context.args
+    if len(arg) != 2:
+        await update.message.reply_text("请提供投稿 ID 和备注内容。格式：/append <post_id> <comment>")
+        return
+    post_id, comment = arg
+    post_id = int(post_id)
+    comment = comment.strip()
+    eff_user = update.effective_user
+    if not comment:
+        await update.message.reply_text("请提供要添加的备注内容。")
+        return
+    if not await POSTS_WRITER.submit(
+            lambda session: PostOperation.add_comment(session, post_id, eff_user.id, comment)):
+        await update.message.reply_text(f"投稿 ID {post_id} 不存在。")
+        return
+    await update.message.reply_text(
+        f"已添加备注：{comment} 到投稿 ID {post_id}。\n")
+
+
+@check_reviewer
+async def remove_comment(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    arg = context.args
+    if len(arg) != 1:
+        await update.message.reply_text("格式错误")
+        return
+    post_id = int(arg[0])
+    if not await POSTS_WRITER.submit(
+            lambda session: PostOperation.remove_comments(session, post_id, update.effective_user.id)):
+        await update.message.reply_text(f"投稿 ID {post_id} 不存在。")
+        return
+    await update.message.reply_text(f"已删除您的备注。")
+
+
+async def become_reviewer(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    eff_user = update.effective_user
+    async with get_users_db() as session:
+        async with session.begin():
+            reviewer_info = await session.execute(
+                select(ReviewerModel).filter_by(user_id=eff_user.id)
+            )
+            reviewer_info = reviewer_info.scalar_one_or_none()
+            if not reviewer_info:
+                reviewer_info = ReviewerModel(
+                    user_id=eff_user.id,
+                    username=eff_user.username,
+                    fullname=eff_user.full_name,
+                )
+                session.add(reviewer_info)
+            else:
+                await update.message.reply_text("您已经是审核员了，无需再次申请。")
+                return
+    REVIEWER_REGISTRY.add(reviewer_info)
+    await update.message.reply_text("您已成为审核员。")
+
+
+@check_reviewer
+async def reply_submitter(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    arg = context.args
+    if len(arg) != 2:
+        await update.message.reply_text("格式错误")
+        return
+    post_id, comment = context.args
+    post_id = int(post_id)
+    if not comment:
+        await update.message.reply_text("请提供要添加的评论内容。")
+        return
+    post_info = await POST_ARCHIVE.get_post(post_id)
+    if not post_info:
+        await update.message.reply_text(f"投稿 ID {post_id} 不存在。")
+        return
+    await notify_submitter(post_info, context.bot, comment)
+    await update.message.reply_text("已向投稿者发送评论。")
+
+
+async def custom_reason(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    arg = context.args
+    if len(arg) != 2:
+        await update.message.reply_text("格式错误")
+        return
+    post_id, reason_msg = context.args
+    post_id = int(post_id)
+    eff_user = update.effective_user
+    async with POST_LOCKS.acquire(post_id):
+        try:
+            post_data, error = await POSTS_WRITER.submit(
+                lambda session: PostOperation.set_reject_reason(session, post_id, eff_user.id, reason_msg))
+        except StaleDataError:
+            error = "❗️投稿状态不正确，请稍后再试。"
+        if not error:
+            rev_ret = check_post_status(post_data, context)
+    if error:
+        await update.effective_message.reply_text(error)
+        return
+    if rev_ret == 2:
+        await update.effective_message.reply_text("❎拒绝理由已选择，此条投稿已被拒绝。")
+    else:
+        await update.effective_message.reply_text("❌似乎存在错误，请联系开发者。")
+
+
+@check_reviewer
+async def ban(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    arg = context.args
+    if len(arg) != 2:
+        await update.message.reply_text("请提供用户ID和封禁原因。")
+        return
+    user_id, reason = arg
+    if not user_id.isdigit():
+        await update.message.reply_text("用户ID必须是数字。")
+        return
+    user_id = int(user_id)
+    reason = reason.strip()
+    async with get_users_db() as session:
+        async with session.begin():
+            ban_user = BannedUserModel(user_id=user_id, banned_reason=reason, banned_date=int(time.time()),
+                                       banned_by=update.effective_user.id)
+            profile = SUBMITTER_PROFILES.get(user_id)
+            if profile:
+                ban_user.username, ban_user.fullname = profile
+            else:
+                submitter = await session.execute(select(SubmitterModel).filter_by(user_id=user_id))
+                submitter = submitter.scalar_one_or_none()
+                if submitter:
+                    ban_user.username = submitter.username
+                    ban_user.fullname = submitter.fullname
+            session.add(ban_user)
+    BAN_LIST.add(user_id)
+    await update.message.reply_text(f"已将用户 ID {user_id} 封禁，原因：{reason}.")
+
+
+@check_reviewer
+async def unban(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    arg = context.args
+    if len(arg) != 1:
+        await update.message.reply_text("请提供用户ID和封禁原因。")
+        return
+    if not arg[0].isdigit():
+        await update.message.reply_text("用户ID必须是数字。")
+        return
+    user_id = int(arg[0])
+    async with get_users_db() as session:
+        async with session.begin():
+            banned_user = await session.execute(select(BannedUserModel).filter_by(user_id=user_id))
+            banned_user = banned_user.scalar_one_or_none()
+            if not banned_user:
+                await update.message.reply_text(f"用户 ID {user_id} 未被封禁。")
+                return
+            await session.delete(banned_user)
+    BAN_LIST.discard(user_id)
+    await update.message.reply_text(f"已解除用户 ID {user_id} 的封禁.")
+
+
+@check_reviewer
+async def private_review_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    bot_logger.info("Starting private review process")
+    REVIEW_QUEUE.reset(update.effective_user.id)
+    if await private_review(update, context) == ConversationHandler.END:
+        bot_logger.info("No more posts to review.")
+        return ConversationHandler.END
+    return 1
+
+
+async def private_review(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    eff_user = update.effective_user
+    if update.callback_query:
+        await update.callback_query.answer("正在尝试获取新的稿件")
+    if update.effective_message.message_id:
+        try:
+            await update.effective_message.delete()
+        except Exception as e:
+            bot_logger.error(f"Failed to delete message: {e}")
+    # 先读完数据并结束读事务，发送消息时不持有 WAL 快照
+    async with get_post_db(readonly=True) as session:
+        while True:
+            cur_post_id = await REVIEW_QUEUE.pop(eff_user.id)
+            if cur_post_id is None:
+                break
+            post_info = await session.execute(select(PostModel).filter_by(id=cur_post_id))
+            post_info = post_info.scalar_one_or_none()
+            if post_info and post_info.status == PostStatus.PENDING.value:
+                break
+        if cur_post_id is not None:
+            # 新投稿者的资料可能还没有写入数据库，或者没有用户名
+            profile = SUBMITTER_PROFILES.get(post_info.submitter_id)
+            if profile is None:
+                async with get_users_db(readonly=True) as udb_session:
+                    submitter = await udb_session.execute(
+                        select(SubmitterModel).filter_by(user_id=post_info.submitter_id))
+                    submitter = submitter.scalar_one_or_none()
+                profile = (submitter.username, submitter.fullname) if submitter else (None, None)
+    if cur_post_id is None:
+        await eff_user.send_message("没有待审核的稿件。")
+        return ConversationHandler.END
+    username, fullname = profile
+    # 发送稿件信息
+    cur_id = str(cur_post_id)
+    reply_kb = InlineKeyboardMarkup([
+        [InlineKeyboardButton("✅SFW通过", callback_data=encode_callback(
+            CallbackAction.PRIVATE_VOTE, cur_post_id, VoteOption.APPROVE)),
+         InlineKeyboardButton("❌拒绝", callback_data=encode_callback(
+             CallbackAction.PRIVATE_VOTE, cur_post_id, VoteOption.REJECT))],
+        [InlineKeyboardButton("✅NSFW通过", callback_data=encode_callback(
+            CallbackAction.PRIVATE_VOTE, cur_post_id, VoteOption.APPROVE_NSFW)),
+         InlineKeyboardButton("❌重复投稿拒绝", callback_data=encode_callback(
+             CallbackAction.PRIVATE_VOTE, cur_post_id, VoteOption.REJECT_DUPLICATE))],
+        # 以下两个按钮由私聊审核的 ConversationHandler 处理，不经过 CALLBACK_ROUTER
+        [InlineKeyboardButton("➡️下一条", callback_data="next_post"),
+         InlineKeyboardButton("取消操作", callback_data="cancel")]
+    ])
+    send_text = post_info.text
+    # 审核评论处理
+    media_list = json.loads(post_info.attachment)
+    if media_list:
+        media = []
+        for media_item in media_list:
+            media.append(MEDIA_GROUP_TYPES[media_item["media_type"]](media=media_item["media_id"]))
+        msg = await context.bot.send_media_group(chat_id=eff_user.id, media=media, caption=send_text,
+                                                 parse_mode="HTML", rate_limit_args=Priority.HIGH)
+        msg_id = msg[0].id
+    else:
+        msg = await context.bot.send_message(chat_id=eff_user.id, text=send_text, parse_mode="HTML",
+                                             rate_limit_args=Priority.HIGH)
+        msg_id = msg.id
+    send_msg = "\n\n <b>稿件ID：</b>" + str(post_info.id)
+    send_msg += "\n <b>投稿者：</b> " + (f"@{username} " if username else "") + \
+                (fullname or str(post_info.submitter_id))
+    op_msg = await context.bot.send_message(chat_id=eff_user.id, text=send_msg, parse_mode="HTML",
+                                            reply_markup=reply_kb, reply_to_message_id=msg_id,
+                                            rate_limit_args=Priority.HIGH)
+    context.user_data["review_private_post_id"] = cur_id
+    context.user_data["review_private_post_msg_id"] = msg_id
+    context.user_data["review_private_operate_id"] = op_msg.id
+    return
@@ -0,0 +1,98 @@
+import asyncio
+import heapq
+import itertools
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Hashable
+
+from src.logger import bot_logger
+
+
+class Debouncer:
+    """
+    防抖服务：同一 key 在静默期内的多次 touch 只在最后一次之后触发一次回调。
+    所有 key 共用一个最小堆和一个后台任务，不再为每个 key 单独轮询。
+    """
+
+    def __init__(self, delay: float, callback: Callable[[Hashable, Any], Awaitable[None]], history: int = 1024):
+        self.delay = delay
+        self.callback = callback
+        self._deadlines: dict[Hashable, float] = {}
+        self._payloads: dict[Hashable, Any] = {}
+        self._heap: list[tuple[float, int, Hashable]] = []
+        self._seq = itertools.count()
+        self._fired: OrderedDict[Hashable, None] = OrderedDict()  # 最近已触发的 key，保证每个 key 只触发一次
+        self._history = history
+        self._wakeup = asyncio.Event()
+        self._task: asyncio.Task | None = None
+        # 事件循环只保存任务的弱引用，正在执行的回调由这里持有，避免执行中被回收
+        self._firing: set[asyncio.Task] = set()
+        self.fired = 0
+
+    @property
+    def pending(self) -> int:
+        return len(self._deadlines)
+
+    def touch(self, key: Hashable, payload: Any = None) -> None:
+        if key in self._fired:
+            return
+        deadline = asyncio.get_running_loop().time() + self.delay
+        self._deadlines[key] = deadline
+        self._payloads[key] = payload
+        # 旧的堆条目留在堆中，出堆时按截止时间判断是否过期
+        heapq.heappush(self._heap, (deadline, next(self._seq), key))
+        self._wakeup.set()
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while self._heap:
+            deadline, _, key = self._heap[0]
+            now = loop.time()
+            if deadline > now:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), deadline - now)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            heapq.heappop(self._heap)
+            if self._deadlines.get(key) != deadline:
+                continue
+            del self._deadlines[key]
+            payload = self._payloads.pop(key)
+            self._fired[key] = None
+            if len(self._fired) > self._history:
+                self._fired.popitem(last=False)
+            self.fired += 1
+            task = asyncio.create_task(self._fire(key, payload))
+            self._firing.add(task)
+            task.add_done_callback(self._firing.discard)
+
+    async def _fire(self, key: Hashable, payload: Any) -> None:
+        try:
+            await self.callback(key, payload)
+        except Exception as e:
+            bot_logger.error(f"Debounced callback for {key} failed: {e}")
+
+    async def stop(self) -> None:
+        """
+        停止计时并等待正在执行的回调，尚未到期的 key 不再触发
+        """
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        if self._deadlines:
+            bot_logger.warning(f"Debouncer stopped with {len(self._deadlines)} pending keys.")
+        self._deadlines.clear()
+        self._payloads.clear()
+        self._heap.clear()
+        if self._firing:
+            await asyncio.gather(*self._firing, return_exceptions=True)
+
+    def stats(self) -> dict:
+        return {
+            "pending": self.pending,
+            "firing": len(self._firing),
+            "fired": self.fired,
+        }
@@ -0,0 +1,128 @@
+import asyncio
+import contextlib
+import time
+from typing import Awaitable, Callable
+
+from sqlalchemy import select
+from telegram import Bot
+
+from src.database.posts import get_post_db, OutboxModel, OutboxStatus, POSTS_WRITER
+from src.database.unit_of_work import UnitOfWork, UNIT_OF_WORK_STATS
+from src.database.writer import Operation
+from src.logger import bot_logger
+
+
+class OutboxWorker:
+    """
+    后台执行 outbox 表中的任务，失败后按指数退避重试，重启后继续执行未完成的任务
+    任务可以返回一个写操作，与任务完成状态在同一事务中写入；写入失败时保留该操作，
+    重试只补写而不再执行任务，避免消息重复发送
+    """
+
+    def __init__(self, batch_size: int = 20, poll_interval: float = 30, max_attempts: int = 10):
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self._handlers: dict[str, Callable[[Bot, int], Awaitable[Operation | None]]] = {}
+        self._completions: dict[int, Operation] = {}
+        self._bot: Bot | None = None
+        self._wakeup = asyncio.Event()
+        self._task: asyncio.Task | None = None
+        self.done = 0
+        self.failed = 0
+        self.retries = 0
+
+    def register(self, action: str, handler: Callable[[Bot, int], Awaitable[Operation | None]]) -> None:
+        self._handlers[action] = handler
+
+    def wake(self) -> None:
+        self._wakeup.set()
+
+    def start(self, bot: Bot) -> None:
+        self._bot = bot
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            self._wakeup.clear()
+            try:
+                processed = await self.drain()
+            except Exception as e:
+                bot_logger.error(f"Outbox drain failed: {e}")
+                processed = 0
+            if processed:
+                continue
+            with contextlib.suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+
+    async def drain(self) -> int:
+        now = int(time.time())
+        async with get_post_db(readonly=True) as session:
+            result = await session.execute(
+                select(OutboxModel)
+                .where(OutboxModel.status == OutboxStatus.PENDING.value, OutboxModel.next_attempt_at <= now)
+                .order_by(OutboxModel.id)
+                .limit(self.batch_size))
+            entries = result.scalars().all()
+        for entry in entries:
+            await self._execute(entry)
+        return len(entries)
+
+    async def _execute(self, entry: OutboxModel) -> None:
+        handler = self._handlers.get(entry.action)
+        # 上次任务已执行但完成状态未写入，只需要补写
+        completion = self._completions.pop(entry.id, None)
+        try:
+            if completion is None:
+                if handler is None:
+                    raise ValueError(f"Unknown outbox action {entry.action}")
+                async with UnitOfWork("outbox") as unit:
+                    completion = await handler(self._bot, entry.post_id)
+                UNIT_OF_WORK_STATS.record(unit)
+        except Exception as e:
+            entry.attempts += 1
+            entry.last_error = str(e)[:500]
+            if entry.attempts >= self.max_attempts:
+                entry.status = OutboxStatus.FAILED.value
+                self.failed += 1
+                bot_logger.error(f"Outbox task {entry.key} failed permanently: {e}")
+            else:
+                entry.next_attempt_at = int(time.time()) + min(2 ** entry.attempts, 600)
+                self.retries += 1
+                bot_logger.warning(f"Outbox task {entry.key} failed, will retry: {e}")
+            await POSTS_WRITER.submit(lambda session: session.merge(entry))
+            return
+        entry.status = OutboxStatus.DONE.value
+
+        async def complete(session):
+            await session.merge(entry)
+            if completion is not None:
+                await completion(session)
+
+        try:
+            await POSTS_WRITER.submit(complete)
+        except Exception:
+            if completion is not None:
+                self._completions[entry.id] = completion
+            raise
+        self.done += 1
+
+    def stats(self) -> dict:
+        return {
+            "running": self._task is not None,
+            "done": self.done,
+            "retries": self.retries,
+            "failed": self.failed,
+            "unwritten": len(self._completions),
+        }
+
+
+OUTBOX_WORKER = OutboxWorker()
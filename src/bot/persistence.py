@@ -0,0 +1,185 @@
+"""
+把 context.user_data 与 ConversationHandler 的状态保存在 users.db 中，重启(/update)或崩溃后恢复私聊审核进度
+PTB 每隔 update_interval 秒在后台调用 update_*，处理器本身不等待写入；
+每个用户只写入与上次落盘相比有变化的键，同一轮的所有写入由 USERS_WRITER 合并为一个事务
+值以 JSON 保存，元组会变为列表、非字符串的字典键会变为字符串
+"""
+import json
+import time
+from typing import Any
+
+from sqlalchemy import delete, select
+from sqlalchemy.dialects.sqlite import insert
+from telegram.ext import BasePersistence, PersistenceInput
+
+from src.config import Config
+from src.database.users import get_users_db, UserDataModel, ConversationModel, USERS_WRITER
+from src.logger import bot_logger
+
+
+def _dumps(value: Any) -> str:
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+
+
+class SQLitePersistence(BasePersistence[dict, dict, dict]):
+    """
+    只保存 user_data 与会话状态，bot_data / chat_data / callback_data 不保存
+    """
+
+    def __init__(self, update_interval: float = 60):
+        super().__init__(store_data=PersistenceInput(bot_data=False, chat_data=False, user_data=True,
+                                                     callback_data=False),
+                         update_interval=update_interval)
+        # 每个用户已落盘的 {键: JSON}，用于找出变化的键
+        self._snapshots: dict[int, dict[str, str]] = {}
+        self.upserts = 0
+        self.deletes = 0
+        self.unchanged = 0
+        self.skipped = 0
+        self.failures = 0
+        self.conversation_writes = 0
+        self.last_ms = 0.0
+
+    async def get_user_data(self) -> dict[int, dict]:
+        user_data: dict[int, dict] = {}
+        self._snapshots.clear()
+        async with get_users_db(readonly=True) as session:
+            result = await session.execute(select(UserDataModel.user_id, UserDataModel.key, UserDataModel.value))
+            for user_id, key, value in result:
+                user_data.setdefault(user_id, {})[key] = json.loads(value)
+                self._snapshots.setdefault(user_id, {})[key] = value
+        bot_logger.info(f"Loaded user_data of {len(user_data)} users from persistence.")
+        return user_data
+
+    async def get_conversations(self, name: str) -> dict[tuple, object]:
+        async with get_users_db(readonly=True) as session:
+            result = await session.execute(select(ConversationModel.key, ConversationModel.state)
+                                           .filter_by(name=name))
+            return {tuple(json.loads(key)): json.loads(state) for key, state in result}
+
+    def _diff(self, user_id: int, data: dict) -> tuple[dict[str, str], list[str]]:
+        """
+        返回 (需要写入的键与 JSON, 需要删除的键)
+        """
+        snapshot = self._snapshots.get(user_id, {})
+        changed = {}
+        for key, value in data.items():
+            try:
+                dumped = _dumps(value)
+            except (TypeError, ValueError) as e:
+                self.skipped += 1
+                # 已落盘的旧值保持不变
+                bot_logger.warning(f"user_data[{user_id}][{key!r}] is not JSON serializable, not persisted: {e}")
+                continue
+            if snapshot.get(key) != dumped:
+                changed[key] = dumped
+        removed = [key for key in snapshot if key not in data]
+        return changed, removed
+
+    async def update_user_data(self, user_id: int, data: dict) -> None:
+        changed, removed = self._diff(user_id, {str(key): value for key, value in data.items()})
+        if not changed and not removed:
+            self.unchanged += 1
+            return
+
+        async def operation(session):
+            if changed:
+                stmt = insert(UserDataModel).values(
+                    [{"user_id": user_id, "key": key, "value": value} for key, value in changed.items()])
+                stmt = stmt.on_conflict_do_update(index_elements=[UserDataModel.user_id, UserDataModel.key],
+                                                  set_={"value": stmt.excluded.value})
+                await session.execute(stmt)
+            if removed:
+                await session.execute(delete(UserDataModel).where(UserDataModel.user_id == user_id,
+                                                                  UserDataModel.key.in_(removed)))
+
+        if not await self._write(operation):
+            # 快照不变，下次 update_persistence 时重新比较并写入
+            return
+        snapshot = self._snapshots.setdefault(user_id, {})
+        snapshot.update(changed)
+        for key in removed:
+            snapshot.pop(key, None)
+        self.upserts += len(changed)
+        self.deletes += len(removed)
+
+    async def drop_user_data(self, user_id: int) -> None:
+        # 快照与数据库一致，没有写入过的用户(例如只按过一次按钮就被淘汰的投稿者)不需要删除
+        if user_id not in self._snapshots:
+            return
+        if await self._write(lambda session: session.execute(
+                delete(UserDataModel).where(UserDataModel.user_id == user_id))):
+            self.deletes += len(self._snapshots.pop(user_id, {}))
+
+    async def update_conversation(self, name: str, key: tuple, new_state: object | None) -> None:
+        key = _dumps(list(key))
+        if new_state is None:
+            stmt = delete(ConversationModel).where(ConversationModel.name == name, ConversationModel.key == key)
+        else:
+            stmt = insert(ConversationModel).values(name=name, key=key, state=_dumps(new_state))
+            stmt = stmt.on_conflict_do_update(index_elements=[ConversationModel.name, ConversationModel.key],
+                                              set_={"state": stmt.excluded.state})
+        if await self._write(lambda session: session.execute(stmt)):
+            self.conversation_writes += 1
+
+    async def _write(self, operation) -> bool:
+        started = time.perf_counter()
+        try:
+            await USERS_WRITER.submit(operation)
+        except Exception as e:
+            self.failures += 1
+            bot_logger.error(f"Error writing persistence: {e}")
+            return False
+        self.last_ms = round((time.perf_counter() - started) * 1000, 2)
+        return True
+
+    async def get_chat_data(self) -> dict[int, dict]:
+        return {}
+
+    async def get_bot_data(self) -> dict:
+        return {}
+
+    async def get_callback_data(self) -> None:
+        return None
+
+    async def update_chat_data(self, chat_id: int, data: dict) -> None:
+        pass
+
+    async def update_bot_data(self, data: dict) -> None:
+        pass
+
+    async def update_callback_data(self, data: Any) -> None:
+        pass
+
+    async def drop_chat_data(self, chat_id: int) -> None:
+        pass
+
+    async def refresh_user_data(self, user_id: int, user_data: dict) -> None:
+        # 只有本进程写入，内存中的数据总是最新的
+        pass
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: dict) -> None:
+        pass
+
+    async def refresh_bot_data(self, bot_data: dict) -> None:
+        pass
+
+    async def flush(self) -> None:
+        # Application.stop 中已执行最后一次 update_persistence，每次写入返回时均已提交
+        pass
+
+    def stats(self) -> dict:
+        return {
+            "users": len(self._snapshots),
+            "keys": sum(len(snapshot) for snapshot in self._snapshots.values()),
+            "upserts": self.upserts,
+            "deletes": self.deletes,
+            "unchanged": self.unchanged,
+            "skipped": self.skipped,
+            "failures": self.failures,
+            "conversation_writes": self.conversation_writes,
+            "last_write": f"{self.last_ms}ms",
+        }
+
+
+PERSISTENCE = SQLitePersistence(Config.PERSISTENCE_INTERVAL)
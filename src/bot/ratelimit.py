@@ -0,0 +1,225 @@
+import asyncio
+import contextlib
+import heapq
+import itertools
+import time
+from enum import IntEnum
+from typing import Any, Callable, Coroutine
+
+from telegram.error import RetryAfter
+from telegram.ext import BaseRateLimiter
+
+from src.logger import bot_logger
+
+
+class Priority(IntEnum):
+    # 通过 rate_limit_args 传入，值不能为 0，否则会被 PTB 忽略
+    HIGH = 1  # 审核群内的编辑等审核员可见的操作
+    NORMAL = 2  # 发布到频道
+    LOW = 3  # 通知投稿者
+
+
+class TokenBucket:
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def wait_time(self, now: float) -> float:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def consume(self) -> None:
+        self.tokens -= 1
+
+    def idle(self, now: float) -> bool:
+        return self.wait_time(now) == 0 and self.tokens >= self.capacity
+
+
+class PriorityRateLimiter(BaseRateLimiter[int]):
+    """
+    出站请求限流：全局令牌桶 + 每个会话的令牌桶，按优先级排队，遇到 RetryAfter 时整体暂停后重试。
+    优先级通过 bot 方法的 rate_limit_args 参数传入，见 Priority。
+    """
+
+    def __init__(self, global_rate: float = 30, private_rate: float = 1, group_rate: float = 20 / 60,
+                 max_retries: int = 3, max_buckets: int = 512):
+        self.global_rate = global_rate
+        self.private_rate = private_rate
+        self.group_rate = group_rate
+        self.max_retries = max_retries
+        self.max_buckets = max_buckets
+        self._global = TokenBucket(global_rate, global_rate)
+        self._buckets: dict[int | str, TokenBucket] = {}
+        # 每个会话的等待请求 [(优先级, 序号, future)] 最小堆
+        self._queues: dict[int | str, list[tuple[int, int, asyncio.Future]]] = {}
+        # 有令牌可能可用的会话，按队首请求排序；_ready_keys 记录每个会话当前有效的条目，其余条目出堆时丢弃
+        self._ready: list[tuple[int, int, int | str]] = []
+        self._ready_keys: dict[int | str, tuple[int, int]] = {}
+        # 令牌用尽的会话 [(令牌恢复时间, 会话)]，恢复后移入 _ready
+        self._sleeping: list[tuple[float, int | str]] = []
+        self._asleep: set[int | str] = set()
+        self._seq = itertools.count()
+        self._wakeup: asyncio.Event | None = None
+        self._pump_task: asyncio.Task | None = None
+        self._paused_until = 0.0
+        self.granted = {p.name: 0 for p in Priority}
+        self.retries = 0
+
+    async def initialize(self) -> None:
+        self._wakeup = asyncio.Event()
+        self._pump_task = asyncio.create_task(self._pump())
+
+    async def shutdown(self) -> None:
+        if self._pump_task is not None:
+            self._pump_task.cancel()
+            self._pump_task = None
+        for queue in self._queues.values():
+            for _, _, future in queue:
+                future.cancel()
+        self._queues.clear()
+        self._ready.clear()
+        self._ready_keys.clear()
+        self._sleeping.clear()
+        self._asleep.clear()
+
+    def _bucket(self, chat_id: int | str) -> TokenBucket:
+        bucket = self._buckets.get(chat_id)
+        if bucket is None:
+            if len(self._buckets) >= self.max_buckets:
+                now = time.monotonic()
+                for key, old in list(self._buckets.items()):
+                    if old.idle(now):
+                        del self._buckets[key]
+            # 私聊 id 为正数，群组/频道为负数或用户名
+            if isinstance(chat_id, int) and chat_id > 0:
+                bucket = TokenBucket(self.private_rate, 1)
+            else:
+                bucket = TokenBucket(self.group_rate, 3)
+            self._buckets[chat_id] = bucket
+        return bucket
+
+    def _make_ready(self, chat_id: int | str) -> None:
+        """
+        丢弃队首已取消的请求，按新的队首把会话放入 _ready，队列已空时移除
+        """
+        queue = self._queues.get(chat_id)
+        while queue and queue[0][2].done():
+            heapq.heappop(queue)
+        if not queue:
+            self._queues.pop(chat_id, None)
+            self._ready_keys.pop(chat_id, None)
+            return
+        priority, seq, _ = queue[0]
+        self._ready_keys[chat_id] = (priority, seq)
+        heapq.heappush(self._ready, (priority, seq, chat_id))
+
+    def _grant(self, now: float) -> float | None:
+        """
+        按优先级放行第一个所在会话有令牌的请求，返回 0 表示已放行，否则返回需要等待的时间
+        """
+        if self._paused_until > now:
+            return self._paused_until - now
+        global_wait = self._global.wait_time(now)
+        if global_wait > 0:
+            return global_wait
+        while self._sleeping and self._sleeping[0][0] <= now:
+            _, chat_id = heapq.heappop(self._sleeping)
+            self._asleep.discard(chat_id)
+            self._make_ready(chat_id)
+        while self._ready:
+            priority, seq, chat_id = heapq.heappop(self._ready)
+            if self._ready_keys.get(chat_id) != (priority, seq):
+                continue
+            queue = self._queues[chat_id]
+            if queue[0][2].done():
+                # 队首已取消，按新的队首重新排队
+                self._make_ready(chat_id)
+                continue
+            del self._ready_keys[chat_id]
+            bucket = self._bucket(chat_id)
+            wait = bucket.wait_time(now)
+            if wait > 0:
+                self._asleep.add(chat_id)
+                heapq.heappush(self._sleeping, (now + wait, chat_id))
+                continue
+            self._global.consume()
+            bucket.consume()
+            heapq.heappop(queue)[2].set_result(None)
+            self._make_ready(chat_id)
+            return 0
+        return self._sleeping[0][0] - now if self._sleeping else None
+
+    async def _pump(self) -> None:
+        while True:
+            timeout = self._grant(time.monotonic())
+            if timeout == 0:
+                continue
+            self._wakeup.clear()
+            with contextlib.suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+
+    async def _acquire(self, chat_id: int | str, priority: int) -> None:
+        future = asyncio.get_running_loop().create_future()
+        entry = (priority, next(self._seq), future)
+        heapq.heappush(self._queues.setdefault(chat_id, []), entry)
+        if chat_id not in self._asleep:
+            key = self._ready_keys.get(chat_id)
+            if key is None or entry[:2] < key:
+                self._ready_keys[chat_id] = entry[:2]
+                heapq.heappush(self._ready, (priority, entry[1], chat_id))
+        self._wakeup.set()
+        await future
+
+    async def process_request(
+            self,
+            callback: Callable[..., Coroutine[Any, Any, bool | dict | list[dict]]],
+            args: Any,
+            kwargs: dict[str, Any],
+            endpoint: str,
+            data: dict[str, Any],
+            rate_limit_args: int | None,
+    ) -> bool | dict | list[dict]:
+        chat_id = data.get("chat_id")
+        if chat_id is None or self._pump_task is None:
+            # 回调应答、内联查询等不针对会话的请求不排队
+            return await callback(*args, **kwargs)
+        with contextlib.suppress(ValueError, TypeError):
+            chat_id = int(chat_id)
+        priority = Priority(rate_limit_args) if rate_limit_args else Priority.NORMAL
+        for attempt in range(self.max_retries + 1):
+            await self._acquire(chat_id, priority)
+            try:
+                result = await callback(*args, **kwargs)
+                self.granted[priority.name] += 1
+                return result
+            except RetryAfter as exc:
+                if attempt == self.max_retries:
+                    bot_logger.error(f"{endpoint} to {chat_id} still rate limited after {attempt} retries")
+                    raise
+                self.retries += 1
+                retry_after = exc.retry_after
+                if not isinstance(retry_after, (int, float)):
+                    retry_after = retry_after.total_seconds()
+                bot_logger.warning(f"Rate limited on {endpoint}, retrying after {retry_after}s")
+                self._paused_until = max(self._paused_until, time.monotonic() + retry_after + 0.1)
+                self._wakeup.set()
+        raise RuntimeError("unreachable")
+
+    def stats(self) -> dict:
+        queued = {p.name: 0 for p in Priority}
+        for queue in self._queues.values():
+            for priority, _, future in queue:
+                if not future.done():
+                    queued[Priority(priority).name] += 1
+        return {
+            "queued": queued,
+            "granted": dict(self.granted),
+            "retries": self.retries,
+            "paused": max(0.0, round(self._paused_until - time.monotonic(), 1)),
+            "buckets": len(self._buckets),
+        }
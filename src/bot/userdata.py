@@ -0,0 +1,105 @@
+"""
+限制 Application.user_data 的大小
+每个更新都会为其 effective_user 建立 user_data(至少有 check_duplicate_cbq 写入的 cbq)，不清理会随用户数一直增长。
+按最近访问排序，超过 USER_DATA_MAX 个或空闲超过 USER_DATA_IDLE_TTL 秒的用户通过 Application.drop_user_data 移除，
+持久化中对应的行也会在下一次 update_persistence 时删除
+"""
+import time
+from collections import OrderedDict
+
+from telegram.ext import Application
+
+from src.config import Config
+
+# 私聊审核进行中的用户，空闲时不按容量与 USER_DATA_IDLE_TTL 淘汰，只在空闲超过 USER_DATA_PIN_TTL 后移除
+PINNED_KEYS = ("review_private_post_id",)
+# 检查固定用户的最小间隔(秒)
+PINNED_CHECK_INTERVAL = 60
+
+
+class UserDataStore:
+    """
+    _entries 按最近访问时间排序的 {用户id: 最后访问时间}；
+    淘汰时遇到私聊审核中的用户，把它移到 _pinned，再次访问时放回 _entries
+    """
+
+    def __init__(self, max_entries: int, idle_ttl: float, pin_ttl: float):
+        self.max_entries = max_entries
+        self.idle_ttl = idle_ttl
+        self.pin_ttl = pin_ttl
+        self._application: Application | None = None
+        self._entries: OrderedDict[int, float] = OrderedDict()
+        self._pinned: dict[int, float] = {}
+        self._pinned_checked = 0.0
+        self.evicted_idle = 0
+        self.evicted_capacity = 0
+        self.evicted_pinned = 0
+
+    def bind(self, application: Application) -> None:
+        """
+        在 post_init 中调用，从持久化中加载的用户从此时开始计算空闲时间
+        """
+        self._application = application
+        now = time.monotonic()
+        for user_id in application.user_data:
+            self._entries.setdefault(user_id, now)
+        self.evict(now)
+
+    def is_pinned(self, user_id: int) -> bool:
+        data = self._application.user_data.get(user_id)
+        return bool(data) and any(key in data for key in PINNED_KEYS)
+
+    def touch(self, user_id: int) -> None:
+        """
+        处理更新之前调用，当前用户排到最后，不会在这次淘汰中被移除
+        """
+        if self._application is None:
+            return
+        now = time.monotonic()
+        self._pinned.pop(user_id, None)
+        self._entries[user_id] = now
+        self._entries.move_to_end(user_id)
+        oldest = next(iter(self._entries.values()))
+        if (len(self._entries) > self.max_entries or now - oldest > self.idle_ttl
+                or now - self._pinned_checked > PINNED_CHECK_INTERVAL):
+            self.evict(now)
+
+    def _drop(self, user_id: int) -> None:
+        self._application.drop_user_data(user_id)
+
+    def evict(self, now: float) -> None:
+        while self._entries:
+            user_id, last = next(iter(self._entries.items()))
+            over_capacity = len(self._entries) > self.max_entries
+            if not over_capacity and now - last <= self.idle_ttl:
+                break
+            del self._entries[user_id]
+            if self.is_pinned(user_id):
+                self._pinned[user_id] = last
+                continue
+            self._drop(user_id)
+            if over_capacity:
+                self.evicted_capacity += 1
+            else:
+                self.evicted_idle += 1
+        if now - self._pinned_checked > PINNED_CHECK_INTERVAL:
+            self._pinned_checked = now
+            # 审核已结束(cancel 清空了 user_data)或长时间没有操作的固定用户
+            for user_id, last in list(self._pinned.items()):
+                if now - last > self.pin_ttl or not self.is_pinned(user_id):
+                    del self._pinned[user_id]
+                    self._drop(user_id)
+                    self.evicted_pinned += 1
+
+    def stats(self) -> dict:
+        return {
+            "live": len(self._entries) + len(self._pinned),
+            "pinned": len(self._pinned),
+            "max": self.max_entries,
+            "evicted_idle": self.evicted_idle,
+            "evicted_capacity": self.evicted_capacity,
+            "evicted_pinned": self.evicted_pinned,
+        }
+
+
+USER_DATA_STORE = UserDataStore(Config.USER_DATA_MAX, Config.USER_DATA_IDLE_TTL, Config.USER_DATA_PIN_TTL)
@@ -64,6 +64,47 @@ class Config(BaseConfig):
     SQLALCHEMY_LOG = False  # 是否开启SQLAlchemy日志
     PROXY: str = None  # 代理
     DATABASES_DIR: Path = ROOT_PATH / 'database'  # 数据库路径
+    PROFILE_FLUSH_INTERVAL: int = 10  # 投稿者资料批量写入间隔(秒)
+    PROFILE_CACHE_MAX: int = 10000  # 内存中最多缓存的投稿者资料数量
+    PERSISTENCE_INTERVAL: int = 10  # user_data 与私聊审核会话状态写入数据库的间隔(秒)
+    USER_DATA_MAX: int = 5000  # 内存中最多保留多少个用户的 user_data
+    USER_DATA_IDLE_TTL: int = 3600  # 用户空闲多久(秒)后移除其 user_data
+    USER_DATA_PIN_TTL: int = 86400  # 私聊审核中的用户空闲多久(秒)后移除其 user_data
+
+
+# 枚举型 PRAGMA 的可选值，拼接进 SQL 之前按此检查(见 src.database.pragma_choice)
+JOURNAL_MODES = ("WAL", "DELETE", "TRUNCATE", "PERSIST", "MEMORY", "OFF")
+SYNCHRONOUS_MODES = ("OFF", "NORMAL", "FULL", "EXTRA")
+TEMP_STORE_MODES = ("DEFAULT", "FILE", "MEMORY")
+
+
+class DatabaseConfig(BaseConfig):
+    """
+    数据库连接配置，每个新连接都会应用以下 PRAGMA
+    """
+    JOURNAL_MODE: str = "WAL"  # 日志模式
+    SYNCHRONOUS: str = "NORMAL"  # 同步模式，WAL 下 NORMAL 已足够安全
+    CACHE_SIZE: int = -16000  # 页缓存大小，负数表示 KiB
+    MMAP_SIZE: int = 134217728  # 内存映射大小(字节)
+    BUSY_TIMEOUT: int = 5000  # 等待锁的超时时间(毫秒)
+    TEMP_STORE: str = "MEMORY"  # 临时表存放位置
+    READ_POOL_SIZE: int = 4  # 每个数据库的只读连接数量
+    WRITE_TIMEOUT: int = 30  # 等待写连接的超时时间(秒)
+    WRITE_BATCH_WINDOW_MS: int = 5  # 写操作合并提交的等待窗口(毫秒)
+    WRITE_BATCH_MAX: int = 50  # 每次合并提交的最大操作数
+    ARCHIVE_AFTER_DAYS: int = 90  # 完成超过多少天的稿件移入归档库
+    ARCHIVE_BATCH_SIZE: int = 200  # 每批归档的稿件数量
+    OUTBOX_KEEP_DAYS: int = 7  # 已完成的发布/通知任务保留天数
+    CHECKPOINT_INTERVAL: int = 300  # WAL 检查点间隔(秒)
+    WAL_TRUNCATE_SIZE: int = 67108864  # WAL 文件超过此大小(字节)时使用 TRUNCATE 检查点截断
+    MAINTENANCE_HOUR: int = 3  # 每日维护(归档/优化/备份)开始的整点，应选在低峰时段
+    VACUUM_STEP_PAGES: int = 1000  # 增量清理每步释放的页数
+    BACKUP_DIR: Path = ROOT_PATH / 'backup'  # 备份存放路径
+    BACKUP_PAGES_PER_STEP: int = 256  # 在线备份每步复制的页数
+    BACKUP_STEP_SLEEP_MS: int = 10  # 在线备份每步之间的间隔(毫秒)
+    BACKUP_MAX_RESTARTS: int = 5  # 备份期间源库被修改导致重来的最大次数，超过后一次性复制
+    BACKUP_COMPRESS: bool = True  # 是否使用 gzip 压缩备份
+    BACKUP_KEEP: int = 7  # 每个数据库保留的备份数量
 
 
 class BotConfig(BaseConfig):
@@ -74,9 +115,19 @@ class BotConfig(BaseConfig):
     BOT_TOKEN: str = ""  # 机器人 Token
     BASE_URL: str = "https://api.telegram.org/bot"  # 自定义URL
     TIMEOUT: int = 60  # bot请求/读取超时时间
+    RATE_LIMIT_GLOBAL: int = 30  # 全局每秒最多发送的请求数
+    RATE_LIMIT_PRIVATE: float = 1  # 每个私聊每秒最多发送的消息数
+    RATE_LIMIT_GROUP: int = 20  # 每个群组/频道每分钟最多发送的消息数
+    RATE_LIMIT_MAX_RETRIES: int = 3  # 遇到 RetryAfter 时的最大重试次数
 
 class Config_submit(BaseConfig):
     SUBMIT_DELETE_WHEN_CANCEL: bool = False
+    MEDIA_GROUP_QUIET_MS: int = 1000  # 相册最后一条消息后等待多久发送投稿确认(毫秒)
+    MEDIA_GROUP_TTL: int = 3600  # 未确认相册的缓存时间(秒)
+    MEDIA_GROUP_MAX: int = 1000  # 最多缓存的相册数量
+    DUPLICATE_MIN_TEXT_LENGTH: int = 10  # 参与查重的最短文字长度(去掉空白与标点后)
+    DUPLICATE_MAX_MATCHES: int = 5  # 审核消息中最多列出的疑似重复稿件数量
+    NEAR_DUPLICATE_THRESHOLD: float = 0.7  # 文字相似度(Jaccard)不低于此值时提示相似投稿，低于 0.42 时召回率明显下降
 
 class ReviewConfig(BaseConfig):
     """
@@ -98,7 +149,7 @@ class ReviewConfig(BaseConfig):
     RETRACT_NOTIFY: bool = True  # 是否通知投稿者稿件被驳回
     # BANNED_NOTIFY: bool = True  # 是否通知投稿者已被屏蔽（没写这个）
 
-class Config_verify(Config,BotConfig,ReviewConfig,Config_submit):
+class Config_verify(Config,DatabaseConfig,BotConfig,ReviewConfig,Config_submit):
     """
     验证配置
     """
@@ -115,6 +166,62 @@ class Config_verify(Config,BotConfig,ReviewConfig,Config_submit):
             return("fail","Config verify failed: HTTPX_LOG_LEVE should be int.")
         if (not isinstance(cls.SQLALCHEMY_LOG, bool)):
             return("fail","Config verify failed: SQLALCHEMY_LOG should be bool.")
+        if (not isinstance(cls.PROFILE_FLUSH_INTERVAL, int)) or cls.PROFILE_FLUSH_INTERVAL <= 0:
+            return("fail","Config verify failed: PROFILE_FLUSH_INTERVAL should be positive int.")
+        if (not isinstance(cls.PROFILE_CACHE_MAX, int)) or cls.PROFILE_CACHE_MAX <= 0:
+            return("fail","Config verify failed: PROFILE_CACHE_MAX should be positive int.")
+        if (not isinstance(cls.PERSISTENCE_INTERVAL, int)) or cls.PERSISTENCE_INTERVAL <= 0:
+            return("fail","Config verify failed: PERSISTENCE_INTERVAL should be positive int.")
+        if (not isinstance(cls.USER_DATA_MAX, int)) or cls.USER_DATA_MAX <= 0:
+            return("fail","Config verify failed: USER_DATA_MAX should be positive int.")
+        if (not isinstance(cls.USER_DATA_IDLE_TTL, int)) or cls.USER_DATA_IDLE_TTL <= 0:
+            return("fail","Config verify failed: USER_DATA_IDLE_TTL should be positive int.")
+        if (not isinstance(cls.USER_DATA_PIN_TTL, int)) or cls.USER_DATA_PIN_TTL < cls.USER_DATA_IDLE_TTL:
+            return("fail","Config verify failed: USER_DATA_PIN_TTL should be int not less than USER_DATA_IDLE_TTL.")
+        if (not isinstance(cls.JOURNAL_MODE, str)) or cls.JOURNAL_MODE.upper() not in JOURNAL_MODES:
+            return("fail","Config verify failed: JOURNAL_MODE is not a valid journal mode.")
+        if (not isinstance(cls.SYNCHRONOUS, str)) or cls.SYNCHRONOUS.upper() not in SYNCHRONOUS_MODES:
+            return("fail","Config verify failed: SYNCHRONOUS should be one of OFF/NORMAL/FULL/EXTRA.")
+        if (not isinstance(cls.CACHE_SIZE, int)):
+            return("fail","Config verify failed: CACHE_SIZE should be int.")
+        if (not isinstance(cls.MMAP_SIZE, int)) or cls.MMAP_SIZE < 0:
+            return("fail","Config verify failed: MMAP_SIZE should be non-negative int.")
+        if (not isinstance(cls.BUSY_TIMEOUT, int)) or cls.BUSY_TIMEOUT < 0:
+            return("fail","Config verify failed: BUSY_TIMEOUT should be non-negative int.")
+        if (not isinstance(cls.TEMP_STORE, str)) or cls.TEMP_STORE.upper() not in TEMP_STORE_MODES:
+            return("fail","Config verify failed: TEMP_STORE should be one of DEFAULT/FILE/MEMORY.")
+        if (not isinstance(cls.READ_POOL_SIZE, int)) or cls.READ_POOL_SIZE <= 0:
+            return("fail","Config verify failed: READ_POOL_SIZE should be positive int.")
+        if (not isinstance(cls.WRITE_TIMEOUT, int)) or cls.WRITE_TIMEOUT <= 0:
+            return("fail","Config verify failed: WRITE_TIMEOUT should be positive int.")
+        if (not isinstance(cls.WRITE_BATCH_WINDOW_MS, int)) or cls.WRITE_BATCH_WINDOW_MS < 0:
+            return("fail","Config verify failed: WRITE_BATCH_WINDOW_MS should be non-negative int.")
+        if (not isinstance(cls.WRITE_BATCH_MAX, int)) or cls.WRITE_BATCH_MAX <= 0:
+            return("fail","Config verify failed: WRITE_BATCH_MAX should be positive int.")
+        if (not isinstance(cls.ARCHIVE_AFTER_DAYS, int)) or cls.ARCHIVE_AFTER_DAYS <= 0:
+            return("fail","Config verify failed: ARCHIVE_AFTER_DAYS should be positive int.")
+        if (not isinstance(cls.ARCHIVE_BATCH_SIZE, int)) or cls.ARCHIVE_BATCH_SIZE <= 0:
+            return("fail","Config verify failed: ARCHIVE_BATCH_SIZE should be positive int.")
+        if (not isinstance(cls.OUTBOX_KEEP_DAYS, int)) or cls.OUTBOX_KEEP_DAYS <= 0:
+            return("fail","Config verify failed: OUTBOX_KEEP_DAYS should be positive int.")
+        if (not isinstance(cls.CHECKPOINT_INTERVAL, int)) or cls.CHECKPOINT_INTERVAL <= 0:
+            return("fail","Config verify failed: CHECKPOINT_INTERVAL should be positive int.")
+        if (not isinstance(cls.WAL_TRUNCATE_SIZE, int)) or cls.WAL_TRUNCATE_SIZE <= 0:
+            return("fail","Config verify failed: WAL_TRUNCATE_SIZE should be positive int.")
+        if (not isinstance(cls.MAINTENANCE_HOUR, int)) or not 0 <= cls.MAINTENANCE_HOUR <= 22:
+            return("fail","Config verify failed: MAINTENANCE_HOUR should be int between 0 and 22.")
+        if (not isinstance(cls.VACUUM_STEP_PAGES, int)) or cls.VACUUM_STEP_PAGES <= 0:
+            return("fail","Config verify failed: VACUUM_STEP_PAGES should be positive int.")
+        if (not isinstance(cls.BACKUP_PAGES_PER_STEP, int)) or cls.BACKUP_PAGES_PER_STEP <= 0:
+            return("fail","Config verify failed: BACKUP_PAGES_PER_STEP should be positive int.")
+        if (not isinstance(cls.BACKUP_STEP_SLEEP_MS, int)) or cls.BACKUP_STEP_SLEEP_MS < 0:
+            return("fail","Config verify failed: BACKUP_STEP_SLEEP_MS should be non-negative int.")
+        if (not isinstance(cls.BACKUP_MAX_RESTARTS, int)) or cls.BACKUP_MAX_RESTARTS < 0:
+            return("fail","Config verify failed: BACKUP_MAX_RESTARTS should be non-negative int.")
+        if (not isinstance(cls.BACKUP_COMPRESS, bool)):
+            return("fail","Config verify failed: BACKUP_COMPRESS should be bool.")
+        if (not isinstance(cls.BACKUP_KEEP, int)) or cls.BACKUP_KEEP <= 0:
+            return("fail","Config verify failed: BACKUP_KEEP should be positive int.")
         if (not isinstance(cls.ADMIN, list)):
             return("fail","Config verify failed: ADMIN should be list.")
         if (not isinstance(cls.BOT_TOKEN, str)):
@@ -127,8 +234,28 @@ class Config_verify(Config,BotConfig,ReviewConfig,Config_submit):
             return("fail","Config verify failed: BASE_URL is not correct api URL.")
         if (not isinstance(cls.TIMEOUT, int)):
             return("fail","Config verify failed: TIMEOUT should be int.")
+        if (not isinstance(cls.RATE_LIMIT_GLOBAL, int)) or cls.RATE_LIMIT_GLOBAL <= 0:
+            return("fail","Config verify failed: RATE_LIMIT_GLOBAL should be positive int.")
+        if (not isinstance(cls.RATE_LIMIT_PRIVATE, (int, float))) or cls.RATE_LIMIT_PRIVATE <= 0:
+            return("fail","Config verify failed: RATE_LIMIT_PRIVATE should be positive number.")
+        if (not isinstance(cls.RATE_LIMIT_GROUP, int)) or cls.RATE_LIMIT_GROUP <= 0:
+            return("fail","Config verify failed: RATE_LIMIT_GROUP should be positive int.")
+        if (not isinstance(cls.RATE_LIMIT_MAX_RETRIES, int)) or cls.RATE_LIMIT_MAX_RETRIES < 0:
+            return("fail","Config verify failed: RATE_LIMIT_MAX_RETRIES should be non-negative int.")
         if (not isinstance(cls.SUBMIT_DELETE_WHEN_CANCEL, bool)):
             return("fail","Config verify failed: SUBMIT_DELETE_WHEN_CANCEL should be bool.")
+        if (not isinstance(cls.MEDIA_GROUP_QUIET_MS, int)) or cls.MEDIA_GROUP_QUIET_MS < 0:
+            return("fail","Config verify failed: MEDIA_GROUP_QUIET_MS should be non-negative int.")
+        if (not isinstance(cls.MEDIA_GROUP_TTL, int)) or cls.MEDIA_GROUP_TTL <= 0:
+            return("fail","Config verify failed: MEDIA_GROUP_TTL should be positive int.")
+        if (not isinstance(cls.MEDIA_GROUP_MAX, int)) or cls.MEDIA_GROUP_MAX <= 0:
+            return("fail","Config verify failed: MEDIA_GROUP_MAX should be positive int.")
+        if (not isinstance(cls.DUPLICATE_MIN_TEXT_LENGTH, int)) or cls.DUPLICATE_MIN_TEXT_LENGTH <= 0:
+            return("fail","Config verify failed: DUPLICATE_MIN_TEXT_LENGTH should be positive int.")
+        if (not isinstance(cls.DUPLICATE_MAX_MATCHES, int)) or cls.DUPLICATE_MAX_MATCHES <= 0:
+            return("fail","Config verify failed: DUPLICATE_MAX_MATCHES should be positive int.")
+        if (not isinstance(cls.NEAR_DUPLICATE_THRESHOLD, (int, float))) or not 0 < cls.NEAR_DUPLICATE_THRESHOLD <= 1:
+            return("fail","Config verify failed: NEAR_DUPLICATE_THRESHOLD should be a number in (0, 1].")
         if (not isinstance(cls.REJECTED_CHANNEL, int)):
             return("fail","Config verify failed: REJECTED_CHANNEL should be int.")
         if not (str(cls.REJECTED_CHANNEL).startswith("-100")):
@@ -152,5 +279,7 @@ class Config_verify(Config,BotConfig,ReviewConfig,Config_submit):
         return("ok","")
 
 Config.update_from_toml()
+DatabaseConfig.update_from_toml('Database')
 BotConfig.update_from_toml('Bot')
 ReviewConfig.update_from_toml('Review')
+Config_submit.update_from_toml('Submit')
@@ -1,15 +1,109 @@
-import os
-
-from sqlalchemy import create_engine, text
-
-from src.config import Config
-
-
-def create_database(database_name: str, model):
-    os.makedirs(Config.DATABASES_DIR, exist_ok=True)
-    database_url = f"sqlite:///{os.path.join(Config.DATABASES_DIR, f'{database_name}.db')}"
-    engine = create_engine(database_url)
-    model.metadata.create_all(engine)
-    connection = engine.connect()
-    connection.execute(text('PRAGMA journal_mode = WAL'))
-    connection.close()
\ No newline at end of file
+import os
+
+from sqlalchemy import create_engine, text, event
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+
+from src.config import Config, DatabaseConfig, JOURNAL_MODES, SYNCHRONOUS_MODES, TEMP_STORE_MODES
+from src.database.migrations import run_migrations, check_query_plans
+from src.database.unit_of_work import count_query
+
+
+def get_sync_engine(database_name: str):
+    os.makedirs(Config.DATABASES_DIR, exist_ok=True)
+    database_url = f"sqlite:///{os.path.join(Config.DATABASES_DIR, f'{database_name}.db')}"
+    return create_engine(database_url)
+
+
+def convert_auto_vacuum(database_name: str) -> bool:
+    """
+    将旧库切换为增量 auto_vacuum，需要完整 VACUUM 一次(重写整个文件并持有写锁)，只应在机器人停止时执行
+    已是增量模式时返回 False
+    """
+    engine = get_sync_engine(database_name)
+    try:
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+            if connection.execute(text("PRAGMA auto_vacuum")).scalar() == 2:
+                return False
+            connection.execute(text("PRAGMA auto_vacuum = INCREMENTAL"))
+            connection.execute(text("VACUUM"))
+            return True
+    finally:
+        engine.dispose()
+
+
+def pragma_choice(name: str, value, choices: tuple[str, ...]) -> str:
+    """
+    数据库在导入时就会建立连接，早于 Config_verify，枚举型 PRAGMA 的值在拼接进 SQL 之前按白名单检查
+    """
+    if not isinstance(value, str) or value.upper() not in choices:
+        raise ValueError(f"Invalid {name} {value!r}, should be one of {'/'.join(choices)}")
+    return value.upper()
+
+
+def apply_pragmas(dbapi_connection, readonly: bool = False):
+    """
+    对新建立的连接应用 PRAGMA 配置，数值型的值经过 int() 转换
+    """
+    synchronous = pragma_choice("SYNCHRONOUS", DatabaseConfig.SYNCHRONOUS, SYNCHRONOUS_MODES)
+    temp_store = pragma_choice("TEMP_STORE", DatabaseConfig.TEMP_STORE, TEMP_STORE_MODES)
+    cursor = dbapi_connection.cursor()
+    cursor.execute(f"PRAGMA synchronous = {synchronous}")
+    cursor.execute(f"PRAGMA cache_size = {int(DatabaseConfig.CACHE_SIZE)}")
+    cursor.execute(f"PRAGMA mmap_size = {int(DatabaseConfig.MMAP_SIZE)}")
+    cursor.execute(f"PRAGMA busy_timeout = {int(DatabaseConfig.BUSY_TIMEOUT)}")
+    cursor.execute(f"PRAGMA temp_store = {temp_store}")
+    if readonly:
+        cursor.execute("PRAGMA query_only = ON")
+    cursor.close()
+
+
+def _on_writer_connect(dbapi_connection, _):
+    apply_pragmas(dbapi_connection)
+    # 由 SQLAlchemy 自行发出 BEGIN，驱动默认的隐式事务会破坏 SAVEPOINT
+    dbapi_connection.isolation_level = None
+
+
+def _on_writer_begin(connection):
+    if connection.get_execution_options().get("isolation_level") == "AUTOCOMMIT":
+        return
+    connection.exec_driver_sql("BEGIN IMMEDIATE")
+
+
+def create_async_engines(database_name: str) -> tuple[AsyncEngine, AsyncEngine]:
+    """
+    创建 (写引擎, 读引擎)
+    写引擎只有一个连接，所有写操作在此串行；读引擎是只读连接池，WAL 下读不会被写阻塞
+    """
+    database_url = f"sqlite+aiosqlite:///{os.path.join(Config.DATABASES_DIR, f'{database_name}.db')}"
+    write_engine = create_async_engine(database_url, echo=Config.SQLALCHEMY_LOG, pool_size=1, max_overflow=0,
+                                       pool_timeout=DatabaseConfig.WRITE_TIMEOUT)
+    read_engine = create_async_engine(database_url, echo=Config.SQLALCHEMY_LOG,
+                                      pool_size=DatabaseConfig.READ_POOL_SIZE, max_overflow=0)
+    event.listen(write_engine.sync_engine, "connect", _on_writer_connect)
+    event.listen(write_engine.sync_engine, "begin", _on_writer_begin)
+    event.listen(read_engine.sync_engine, "connect",
+                 lambda dbapi_connection, _: apply_pragmas(dbapi_connection, readonly=True))
+    for engine in (write_engine, read_engine):
+        event.listen(engine.sync_engine, "before_cursor_execute", count_query)
+    return write_engine, read_engine
+
+
+def create_database(database_name: str, model, migrations: list = (), hot_queries: list = ()) -> int:
+    """
+    建表或执行迁移，并检查热点查询的执行计划，返回数据库版本
+    model 可以是声明式基类或 MetaData
+    """
+    metadata = getattr(model, "metadata", model)
+    engine = get_sync_engine(database_name)
+    with engine.connect() as connection:
+        # auto_vacuum 只对尚未建表的新库生效，且必须在切换日志模式之前设置
+        connection.execute(text('PRAGMA auto_vacuum = INCREMENTAL'))
+        journal_mode = pragma_choice("JOURNAL_MODE", DatabaseConfig.JOURNAL_MODE, JOURNAL_MODES)
+        connection.execute(text(f'PRAGMA journal_mode = {journal_mode}'))
+    try:
+        version = run_migrations(engine, metadata, list(migrations))
+        if hot_queries:
+            check_query_plans(engine, list(hot_queries))
+    finally:
+        engine.dispose()
+    return version
@@ -0,0 +1,32 @@
+"""
+python -m src.database  执行迁移并打印热点查询的执行计划
+python -m src.database vacuum  停止机器人后执行，将旧库切换为增量 auto_vacuum(完整 VACUUM 一次)
+"""
+import sys
+
+from src.database import convert_auto_vacuum, get_sync_engine
+from src.database.migrations import explain, get_user_version, schema_engine
+from src.database.posts import HOT_QUERIES
+import src.database.users  # noqa: F401  导入时执行 users.db 的迁移
+
+if len(sys.argv) == 2 and sys.argv[1] == "vacuum":
+    import src.database.archive  # noqa: F401
+    import src.dedup.index  # noqa: F401
+    for name in ("posts", "users", "archive", "dedup"):
+        print(f"{name}.db {'converted' if convert_auto_vacuum(name) else 'already incremental'}")
+    sys.exit(0)
+elif len(sys.argv) != 1:
+    print(__doc__)
+    sys.exit(1)
+
+engine = get_sync_engine("posts")
+with engine.connect() as connection:
+    print(f"posts.db version {get_user_version(connection)}")
+memory = schema_engine(engine)
+with memory.connect() as connection:
+    for query in HOT_QUERIES:
+        print(f"{query.name}:")
+        for detail in explain(connection, query):
+            print(f"  {detail}")
+memory.dispose()
+engine.dispose()
@@ -0,0 +1,171 @@
+import asyncio
+import time
+
+from sqlalchemy import Connection, MetaData, delete, exists, func, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from src.database import create_database, create_async_engines
+from src.database.migrations import Migration, add_missing_columns
+from src.database.posts import PostModel, PostLogModel, PostCommentModel, PostStatus, OutboxModel, OutboxStatus, \
+    PostsReadSessionFactory, POSTS_WRITER
+from src.database.unit_of_work import read_session
+from src.logger import db_logger
+
+# 归档库与热库使用相同的表结构
+ARCHIVE_METADATA = MetaData()
+for _table in (PostModel.__table__, PostLogModel.__table__, PostCommentModel.__table__):
+    _table.to_metadata(ARCHIVE_METADATA)
+
+
+def sync_archive_columns(connection: Connection):
+    """
+    补上热库中新增而归档库中还没有的列
+    """
+    added = add_missing_columns(connection, ARCHIVE_METADATA)
+    if added:
+        db_logger.info(f"Added archive columns: {', '.join(added)}")
+
+
+# 热库的 posts / logs / post_comments 新增列时，在这里追加一个调用 sync_archive_columns 的迁移，
+# 否则已部署的归档库缺少该列，归档时的 insert 会失败
+MIGRATIONS = [
+    Migration(1, "align archive tables with the hot tables", sync_archive_columns),
+]
+
+create_database("archive", ARCHIVE_METADATA, MIGRATIONS)
+ENGINE, READ_ENGINE = create_async_engines("archive")
+ArchiveSessionFactory = async_sessionmaker(bind=ENGINE, expire_on_commit=False)
+ArchiveReadSessionFactory = async_sessionmaker(bind=READ_ENGINE, expire_on_commit=False)
+
+FINISHED_STATUS = (PostStatus.APPROVED.value, PostStatus.REJECTED.value)
+
+
+class PostArchive:
+    """
+    冷热分离：完成超过一定天数的稿件连同日志、审核注移入 archive.db
+    每批先写入归档库并提交，再从热库删除，中途中断时下次运行会重新写入(覆盖)并继续删除
+    """
+
+    def __init__(self):
+        self._lock = asyncio.Lock()
+        self.archived_posts = 0
+        self.archived_logs = 0
+        self.runs = 0
+        self.last_run_at = 0
+        self.last_duration_ms = 0.0
+
+    async def _next_batch(self, cutoff: int, batch_size: int) -> tuple[list[int], dict[str, list[dict]]]:
+        pending_outbox = select(OutboxModel.id).where(OutboxModel.post_id == PostModel.id,
+                                                      OutboxModel.status == OutboxStatus.PENDING.value)
+        async with PostsReadSessionFactory() as session:
+            result = await session.execute(
+                select(PostModel.id)
+                .where(PostModel.status.in_(FINISHED_STATUS),
+                       func.coalesce(PostModel.finish_at, PostModel.created_at) < cutoff,
+                       ~exists(pending_outbox))
+                .order_by(PostModel.id)
+                .limit(batch_size))
+            post_ids = list(result.scalars().all())
+            if not post_ids:
+                return [], {}
+            rows = {}
+            for table, column in ((PostModel.__table__, PostModel.__table__.c.id),
+                                  (PostLogModel.__table__, PostLogModel.__table__.c.post_id),
+                                  (PostCommentModel.__table__, PostCommentModel.__table__.c.post_id)):
+                result = await session.execute(select(table).where(column.in_(post_ids)))
+                rows[table.name] = [dict(row) for row in result.mappings()]
+        return post_ids, rows
+
+    @staticmethod
+    async def _remove_from_hot(session: AsyncSession, post_ids: list[int]) -> None:
+        # 先删除稿件，全文索引的触发器据此保留已归档稿件的审核注
+        await session.execute(delete(PostModel).where(PostModel.id.in_(post_ids),
+                                                      PostModel.status.in_(FINISHED_STATUS)))
+        await session.execute(delete(PostLogModel).where(PostLogModel.post_id.in_(post_ids)))
+        await session.execute(delete(PostCommentModel).where(PostCommentModel.post_id.in_(post_ids)))
+        await session.execute(delete(OutboxModel).where(OutboxModel.post_id.in_(post_ids)))
+
+    async def run(self, days: int, batch_size: int) -> int:
+        """
+        归档完成超过 days 天的稿件，每批最多 batch_size 条，返回归档的稿件数
+        """
+        async with self._lock:
+            started = time.perf_counter()
+            cutoff = int(time.time()) - days * 86400
+            total = 0
+            while True:
+                post_ids, rows = await self._next_batch(cutoff, batch_size)
+                if not post_ids:
+                    break
+                async with ArchiveSessionFactory() as session:
+                    async with session.begin():
+                        for name, values in rows.items():
+                            if values:
+                                await session.execute(
+                                    insert(ARCHIVE_METADATA.tables[name]).prefix_with("OR REPLACE"), values)
+                await POSTS_WRITER.submit(lambda session: self._remove_from_hot(session, post_ids))
+                total += len(post_ids)
+                self.archived_posts += len(post_ids)
+                self.archived_logs += len(rows[PostLogModel.__tablename__])
+                # 让出事件循环，避免长时间占用写连接
+                await asyncio.sleep(0)
+            self.runs += 1
+            self.last_run_at = int(time.time())
+            self.last_duration_ms = (time.perf_counter() - started) * 1000
+        if total:
+            db_logger.info(f"Archived {total} posts older than {days} days.")
+        return total
+
+    @staticmethod
+    async def get_post(post_id: int) -> PostModel | None:
+        """
+        按 id 查找稿件，热库中没有时查找归档库
+        """
+        async with read_session("posts", PostsReadSessionFactory) as session:
+            post_data = await session.get(PostModel, post_id)
+        if post_data is not None:
+            return post_data
+        async with read_session("archive", ArchiveReadSessionFactory) as session:
+            return await session.get(PostModel, post_id)
+
+    @staticmethod
+    async def get_posts(post_ids: list[int]) -> dict[int, PostModel]:
+        """
+        批量查找稿件，热库中没有的查找归档库
+        """
+        posts = {}
+        for database, session_factory in (("posts", PostsReadSessionFactory), ("archive", ArchiveReadSessionFactory)):
+            missing = [post_id for post_id in post_ids if post_id not in posts]
+            if not missing:
+                break
+            async with read_session(database, session_factory) as session:
+                result = await session.execute(select(PostModel).where(PostModel.id.in_(missing)))
+                posts.update((post.id, post) for post in result.scalars())
+        return posts
+
+    @staticmethod
+    async def get_logs(post_id: int, reviewer_id: int | None = None) -> list[PostLogModel]:
+        """
+        查找稿件的审核日志，热库中没有时查找归档库
+        """
+        stmt = select(PostLogModel).filter_by(post_id=post_id).order_by(PostLogModel.operate_time, PostLogModel.id)
+        if reviewer_id is not None:
+            stmt = stmt.filter_by(reviewer_id=reviewer_id)
+        for database, session_factory in (("posts", PostsReadSessionFactory), ("archive", ArchiveReadSessionFactory)):
+            async with read_session(database, session_factory) as session:
+                logs = list((await session.execute(stmt)).scalars().all())
+            if logs:
+                return logs
+        return []
+
+    def stats(self) -> dict:
+        return {
+            "archived_posts": self.archived_posts,
+            "archived_logs": self.archived_logs,
+            "runs": self.runs,
+            "last_run_at": self.last_run_at,
+            "last_duration_ms": round(self.last_duration_ms, 2),
+        }
+
+
+POST_ARCHIVE = PostArchive()
@@ -0,0 +1,241 @@
+"""
+在线备份
+使用 SQLite 在线备份 API，每步只复制少量页并在两步之间让出锁，不会长时间阻塞写操作。
+备份文件为 <库名>-<时间>.db(.gz)，同名的 .sha256 文件记录未压缩数据库的校验和，恢复前先校验。
+
+python -m src.database.backup             立即备份
+python -m src.database.backup restore 文件  从备份恢复，需先停止机器人
+"""
+import asyncio
+import gzip
+import hashlib
+import os
+import re
+import shutil
+import sqlite3
+import sys
+import time
+from pathlib import Path
+
+from src.config import Config, DatabaseConfig
+from src.logger import db_logger
+
+# dedup.db 可由 python -m src.dedup backfill 重建，不备份
+DATABASES = ("posts", "users", "archive")
+BACKUP_NAME = re.compile(r"^(?P<name>\w+)-(?P<stamp>\d{8}-\d{6})\.db(?:\.gz)?$")
+CHUNK_SIZE = 1024 * 1024
+
+
+class BackupError(RuntimeError):
+    pass
+
+
+class _TooManyRestarts(Exception):
+    pass
+
+
+def _sha256_file(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(CHUNK_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _checksum_path(path: Path) -> Path:
+    return path.with_name(path.name + ".sha256")
+
+
+class DatabaseBackup:
+    """
+    在线备份与恢复
+    备份期间源库被其他连接修改时 SQLite 会从头重来，重来次数过多时改为一步复制完成，
+    WAL 模式下一步复制只持有读事务，同样不会阻塞写操作
+    """
+
+    def __init__(self):
+        self._lock = asyncio.Lock()
+        self.runs = 0
+        self.failures = 0
+        self.restarts = 0
+        self.fallbacks = 0
+        self.last_run_at = 0
+        self.last_duration_ms = 0.0
+        self.last_size = 0
+
+    def _copy(self, source: sqlite3.Connection, target: sqlite3.Connection) -> None:
+        remaining_before = None
+        restarts = 0
+
+        def progress(status, remaining, total):
+            nonlocal remaining_before, restarts
+            if remaining_before is not None and remaining >= remaining_before:
+                restarts += 1
+                self.restarts += 1
+                if restarts > DatabaseConfig.BACKUP_MAX_RESTARTS:
+                    raise _TooManyRestarts
+            remaining_before = remaining
+            # backup() 的 sleep 参数只在遇到锁时生效，每步之间的间隔需要自行让出
+            if remaining:
+                time.sleep(DatabaseConfig.BACKUP_STEP_SLEEP_MS / 1000)
+
+        try:
+            source.backup(target, pages=DatabaseConfig.BACKUP_PAGES_PER_STEP, progress=progress)
+        except _TooManyRestarts:
+            self.fallbacks += 1
+            source.backup(target, pages=-1)
+
+    def _backup_one(self, name: str, stamp: str) -> Path:
+        backup_dir = Path(DatabaseConfig.BACKUP_DIR)
+        os.makedirs(backup_dir, exist_ok=True)
+        database_path = Path(Config.DATABASES_DIR) / f"{name}.db"
+        temp_path = backup_dir / f"{name}-{stamp}.db.tmp"
+        path = backup_dir / (f"{name}-{stamp}.db.gz" if DatabaseConfig.BACKUP_COMPRESS else f"{name}-{stamp}.db")
+        try:
+            source = sqlite3.connect(database_path)
+            source.execute(f"PRAGMA busy_timeout = {int(DatabaseConfig.BUSY_TIMEOUT)}")
+            target = sqlite3.connect(temp_path)
+            try:
+                self._copy(source, target)
+            finally:
+                target.close()
+                source.close()
+            checksum = _sha256_file(temp_path)
+            if DatabaseConfig.BACKUP_COMPRESS:
+                with open(temp_path, "rb") as src, gzip.open(path, "wb", compresslevel=6) as dst:
+                    shutil.copyfileobj(src, dst, CHUNK_SIZE)
+            else:
+                temp_path.replace(path)
+            _checksum_path(path).write_text(f"{checksum}  {name}.db\n")
+        except BaseException:
+            # 写了一半的备份也匹配 BACKUP_NAME，会被当作最新的备份参与轮换
+            path.unlink(missing_ok=True)
+            _checksum_path(path).unlink(missing_ok=True)
+            raise
+        finally:
+            # .tmp 不匹配 BACKUP_NAME，轮换不会删除它
+            temp_path.unlink(missing_ok=True)
+        return path
+
+    @staticmethod
+    def list_backups(name: str) -> list[Path]:
+        """
+        列出某个数据库的备份，按时间从新到旧排列
+        """
+        backup_dir = Path(DatabaseConfig.BACKUP_DIR)
+        if not backup_dir.exists():
+            return []
+        backups = []
+        for path in backup_dir.iterdir():
+            match = BACKUP_NAME.match(path.name)
+            if match and match.group("name") == name:
+                backups.append((match.group("stamp"), path))
+        return [path for _, path in sorted(backups, reverse=True)]
+
+    def rotate(self, name: str, keep: int) -> int:
+        """
+        只保留最新的 keep 个备份，返回删除的数量
+        """
+        removed = 0
+        for path in self.list_backups(name)[keep:]:
+            path.unlink(missing_ok=True)
+            _checksum_path(path).unlink(missing_ok=True)
+            removed += 1
+        return removed
+
+    def backup_all(self) -> list[Path]:
+        """
+        同步执行一次完整备份并轮换旧备份
+        """
+        started = time.perf_counter()
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        paths = []
+        try:
+            for name in DATABASES:
+                if not (Path(Config.DATABASES_DIR) / f"{name}.db").exists():
+                    continue
+                paths.append(self._backup_one(name, stamp))
+                self.rotate(name, DatabaseConfig.BACKUP_KEEP)
+        except Exception:
+            self.failures += 1
+            raise
+        self.runs += 1
+        self.last_run_at = int(time.time())
+        self.last_duration_ms = (time.perf_counter() - started) * 1000
+        self.last_size = sum(path.stat().st_size for path in paths)
+        db_logger.info(f"Backed up {len(paths)} databases in {self.last_duration_ms:.0f} ms.")
+        return paths
+
+    async def run(self) -> list[Path]:
+        """
+        在线程中执行备份，不阻塞事件循环
+        """
+        async with self._lock:
+            return await asyncio.to_thread(self.backup_all)
+
+    @staticmethod
+    def restore(path: Path) -> Path:
+        """
+        校验备份后写回对应的数据库，返回恢复的数据库路径
+        校验和或完整性检查不通过时抛出 BackupError，不会改动现有数据库
+        """
+        path = Path(path)
+        match = BACKUP_NAME.match(path.name)
+        if not match:
+            raise BackupError(f"Unrecognized backup file name: {path.name}")
+        checksum_path = _checksum_path(path)
+        if not checksum_path.exists():
+            raise BackupError(f"Checksum file not found: {checksum_path}")
+        expected = checksum_path.read_text().split()[0]
+        database_path = Path(Config.DATABASES_DIR) / f"{match.group('name')}.db"
+        temp_path = database_path.with_name(database_path.name + ".restore")
+        try:
+            if path.suffix == ".gz":
+                with gzip.open(path, "rb") as src, open(temp_path, "wb") as dst:
+                    shutil.copyfileobj(src, dst, CHUNK_SIZE)
+            else:
+                shutil.copyfile(path, temp_path)
+            actual = _sha256_file(temp_path)
+            if actual != expected:
+                raise BackupError(f"Checksum mismatch for {path.name}: expected {expected}, got {actual}")
+            source = sqlite3.connect(temp_path)
+            try:
+                result = source.execute("PRAGMA integrity_check").fetchone()[0]
+                if result != "ok":
+                    raise BackupError(f"Integrity check failed for {path.name}: {result}")
+                # 通过备份 API 写回，现有的 WAL 会被正确处理
+                target = sqlite3.connect(database_path)
+                try:
+                    source.backup(target)
+                finally:
+                    target.close()
+            finally:
+                source.close()
+        finally:
+            temp_path.unlink(missing_ok=True)
+        db_logger.info(f"Restored {database_path.name} from {path.name}.")
+        return database_path
+
+    def stats(self) -> dict:
+        return {
+            "runs": self.runs,
+            "failures": self.failures,
+            "restarts": self.restarts,
+            "fallbacks": self.fallbacks,
+            "last_run_at": self.last_run_at,
+            "last_duration_ms": round(self.last_duration_ms, 2),
+            "last_size": self.last_size,
+        }
+
+
+DATABASE_BACKUP = DatabaseBackup()
+
+if __name__ == "__main__":
+    if len(sys.argv) == 3 and sys.argv[1] == "restore":
+        print(DATABASE_BACKUP.restore(Path(sys.argv[2])))
+    elif len(sys.argv) == 1:
+        for backup_path in DATABASE_BACKUP.backup_all():
+            print(backup_path)
+    else:
+        print(__doc__)
+        sys.exit(1)
@@ -0,0 +1,55 @@
+"""
+稿件指纹，用于发现重复投稿
+文件使用 Telegram 的 file_unique_id(同一文件重复发送时不变，file_id 会变)，文字使用归一化后的哈希
+"""
+import hashlib
+import html
+import json
+import re
+import unicodedata
+
+from src.config import Config_submit
+
+TAG_PATTERN = re.compile(r"<[^>]+>")
+# 投稿时追加的转发来源与署名
+SIGNATURE_PATTERN = re.compile(r"\n\n<i>(?:from|via)</i> .*\Z", re.S)
+NON_WORD_PATTERN = re.compile(r"[\W_]+")
+
+
+def normalize_text(text: str | None) -> str:
+    """
+    去掉标签、署名、空白与标点，统一大小写与全半角
+    """
+    if not text:
+        return ""
+    text = SIGNATURE_PATTERN.sub("", text)
+    text = html.unescape(TAG_PATTERN.sub("", text))
+    text = unicodedata.normalize("NFKC", text).casefold()
+    return NON_WORD_PATTERN.sub("", text)
+
+
+def text_fingerprint(text: str | None) -> str | None:
+    """
+    稿件文字(HTML)的指纹，过短的文字不参与查重
+    """
+    normalized = normalize_text(text)
+    if len(normalized) < Config_submit.DUPLICATE_MIN_TEXT_LENGTH:
+        return None
+    return "t:" + hashlib.blake2b(normalized.encode(), digest_size=8).hexdigest()
+
+
+def file_fingerprint(file_unique_id: str) -> str:
+    return "f:" + file_unique_id
+
+
+def post_fingerprints(text: str | None, attachment: str | None) -> set[str]:
+    """
+    由稿件的 text 与 attachment(json) 计算指纹，3.0 的附件没有记录 file_unique_id
+    """
+    fingerprints = set()
+    if fingerprint := text_fingerprint(text):
+        fingerprints.add(fingerprint)
+    for item in json.loads(attachment or "[]"):
+        if item.get("file_unique_id"):
+            fingerprints.add(file_fingerprint(item["file_unique_id"]))
+    return fingerprints
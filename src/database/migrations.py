@@ -0,0 +1,126 @@
+"""
+数据库迁移
+每个数据库的版本号记录在 PRAGMA user_version 中，启动时依次执行尚未执行的迁移。
+新建的数据库直接按当前模型建表并标记为最新版本，因此修改模型时必须同时追加一个迁移。
+"""
+import re
+from typing import Callable, NamedTuple
+
+from sqlalchemy import Connection, Engine, create_engine, inspect, text
+from sqlalchemy.schema import CreateColumn
+
+from src.logger import db_logger
+
+
+class Migration(NamedTuple):
+    version: int
+    description: str
+    upgrade: Callable[[Connection], None]
+
+
+class HotQuery(NamedTuple):
+    name: str
+    sql: str
+    params: dict
+
+
+class QueryPlanError(RuntimeError):
+    pass
+
+
+SCAN_PATTERN = re.compile(r"^SCAN (?:TABLE )?(\w+)")
+
+
+def get_user_version(connection: Connection) -> int:
+    return connection.exec_driver_sql("PRAGMA user_version").scalar()
+
+
+def set_user_version(connection: Connection, version: int) -> None:
+    connection.exec_driver_sql(f"PRAGMA user_version = {int(version)}")
+
+
+def has_column(connection: Connection, table: str, column: str) -> bool:
+    return column in {c["name"] for c in inspect(connection).get_columns(table)}
+
+
+def add_missing_columns(connection: Connection, metadata) -> list[str]:
+    """
+    按 metadata 创建缺少的表，并用 ALTER TABLE ADD COLUMN 补上已有表缺少的列，返回新增的 "表.列"
+    SQLite 要求新增的 NOT NULL 列带有 server_default
+    """
+    metadata.create_all(connection, checkfirst=True)
+    added = []
+    for table in metadata.sorted_tables:
+        existing = {c["name"] for c in inspect(connection).get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in existing:
+                ddl = CreateColumn(column).compile(dialect=connection.dialect)
+                connection.exec_driver_sql(f"ALTER TABLE {table.name} ADD COLUMN {ddl}")
+                added.append(f"{table.name}.{column.name}")
+    return added
+
+
+def run_migrations(engine: Engine, metadata, migrations: list[Migration]) -> int:
+    """
+    执行迁移，返回数据库当前版本
+    """
+    latest = max((m.version for m in migrations), default=0)
+    with engine.begin() as connection:
+        if not inspect(connection).get_table_names():
+            metadata.create_all(connection)
+            set_user_version(connection, latest)
+            db_logger.info(f"Created database {engine.url.database} at version {latest}.")
+            return latest
+        current = get_user_version(connection)
+    for migration in sorted(migrations, key=lambda m: m.version):
+        if migration.version <= current:
+            continue
+        with engine.begin() as connection:
+            migration.upgrade(connection)
+            set_user_version(connection, migration.version)
+        current = migration.version
+        db_logger.info(f"Migrated {engine.url.database} to version {current}: {migration.description}")
+    return current
+
+
+def explain(connection: Connection, query: HotQuery) -> list[str]:
+    result = connection.execute(text(f"EXPLAIN QUERY PLAN {query.sql}"), query.params)
+    return [row[-1] for row in result]
+
+
+def schema_engine(engine: Engine) -> Engine:
+    """
+    复制表结构到内存库，执行计划只取决于索引，不受小表统计信息影响
+    """
+    with engine.connect() as connection:
+        # FTS 等虚拟表的影子表随虚拟表自动创建，不能再单独复制
+        shadow = set(connection.exec_driver_sql(
+            "SELECT name FROM pragma_table_list WHERE type = 'shadow'").scalars().all())
+        schema = connection.exec_driver_sql(
+            "SELECT name, sql FROM sqlite_master WHERE type IN ('table', 'index') AND sql IS NOT NULL "
+            "AND name NOT LIKE 'sqlite_%' ORDER BY type = 'index'").all()
+    memory = create_engine("sqlite://")
+    with memory.begin() as connection:
+        for name, ddl in schema:
+            if name not in shadow:
+                connection.exec_driver_sql(ddl)
+    return memory
+
+
+def check_query_plans(engine: Engine, queries: list[HotQuery]) -> None:
+    """
+    检查热点查询的执行计划，出现全表扫描时抛出 QueryPlanError
+    """
+    failures = []
+    memory = schema_engine(engine)
+    with memory.connect() as connection:
+        tables = set(inspect(connection).get_table_names())
+        for query in queries:
+            for detail in explain(connection, query):
+                match = SCAN_PATTERN.match(detail)
+                # 虚拟表(FTS)的 SCAN 由其自身的索引完成
+                if match and match.group(1) in tables and "VIRTUAL TABLE" not in detail:
+                    failures.append(f"{query.name}: {detail}")
+    memory.dispose()
+    if failures:
+        raise QueryPlanError("Hot queries fall back to table scans:\n" + "\n".join(failures))
@@ -1,75 +1,619 @@
-from contextlib import asynccontextmanager
-from enum import Enum
-from typing import AsyncGenerator, Any
-
-from sqlalchemy import Integer, String
-from sqlalchemy.ext.asyncio import AsyncAttrs, create_async_engine, async_sessionmaker, AsyncSession
-from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
-
-from src.config import Config
-from src.database import create_database
-from src.logger import db_logger
-
-
-class PostBase(AsyncAttrs, DeclarativeBase):
-    pass
-
-
-class PostStatus(Enum):
-    PENDING = 0
-    APPROVED = 1
-    REJECTED = 2
-    NEED_REASON = 3
-
-
-class PostModel(PostBase):
-    # 稿件数据
-    __tablename__ = "posts"
-    id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True, comment='稿件id')
-    text: Mapped[str] = mapped_column(String, nullable=True, comment='稿件内容')
-    attachment: Mapped[str] = mapped_column(String, nullable=True, comment='稿件附件(json内容)')
-    submitter_id: Mapped[int] = mapped_column(Integer, comment='投稿者id')
-    status: Mapped[int] = mapped_column(Integer, default=PostStatus.PENDING.value, comment='稿件状态')
-    submitter_msg_id: Mapped[int] = mapped_column(Integer, nullable=True, comment='投稿者消息id')
-    review_msg_id: Mapped[int] = mapped_column(Integer, nullable=True, comment='审核群内消息id')
-    operate_msg_id: Mapped[int] = mapped_column(Integer, nullable=True, comment='操作消息id')
-    publish_msg_id: Mapped[int] = mapped_column(Integer, nullable=True, comment='发布消息id')  # 如果是拒稿的话，那么就是拒稿频道的id
-    other: Mapped[str] = mapped_column(String, nullable=True, comment='其他信息(json内容)')
-    created_at: Mapped[int] = mapped_column(Integer, nullable=True, comment='创建时间')
-    finish_at: Mapped[int] = mapped_column(Integer, nullable=True, comment='审核完成时间')
-
-
-class VoteType(Enum):
-    APPROVE = 1
-    REJECT = 2
-    APPROVE_NSFW = 3
-
-
-class PostLogModel(PostBase):
-    # 稿件审核日志
-    __tablename__ = "logs"
-    id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True, autoincrement=True, comment='日志id')
-    post_id: Mapped[int] = mapped_column(Integer, index=True, autoincrement=True, comment='稿件id')
-    reviewer_id: Mapped[int] = mapped_column(Integer, nullable=True, comment='审核者id')
-    vote: Mapped[int] = mapped_column(Integer, nullable=True, comment='投票类型')
-    operate_type: Mapped[str] = mapped_column(String, nullable=True, comment='操作来源 reviewer/system')
-    operate_time: Mapped[int] = mapped_column(Integer, default=0, comment='操作时间')
-    msg: Mapped[str] = mapped_column(String, nullable=True, comment='通过/拒绝理由')
-
-
-create_database("posts", PostBase)
-DATABASE_URL = f'sqlite+aiosqlite:///{Config.DATABASES_DIR / "posts.db"}'
-ENGINE = create_async_engine(DATABASE_URL, echo=Config.SQLALCHEMY_LOG)
-PostsSessionFactory = async_sessionmaker(bind=ENGINE, expire_on_commit=False)
-
-@asynccontextmanager
-async def get_post_db() -> AsyncGenerator[AsyncSession, Any]:
-    async with PostsSessionFactory() as session:
-        try:
-            yield session
-        except Exception as e:
-            db_logger.error(f"Error in get_post_db: {e}")
-            await session.rollback()
-            raise
-        finally:
-            await session.close()
+from collections import deque
+import os
+import sqlite3
+import time
+from contextlib import asynccontextmanager
+from enum import Enum
+from typing import AsyncGenerator, Any
+
+from sqlalchemy import Connection, Integer, String, select, exists, update, delete, text, Index, bindparam, event
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.ext.asyncio import AsyncAttrs, async_sessionmaker, AsyncSession
+from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
+
+from src.config import Config, DatabaseConfig, ReviewConfig
+from src.database import create_database, create_async_engines
+from src.database.fingerprint import post_fingerprints
+from src.database.migrations import Migration, HotQuery, has_column
+from src.database.unit_of_work import read_session
+from src.database.writer import WriteQueue
+from src.logger import db_logger
+
+
+class PostBase(AsyncAttrs, DeclarativeBase):
+    pass
+
+
+class PostStatus(Enum):
+    PENDING = 0
+    APPROVED = 1
+    REJECTED = 2
+    NEED_REASON = 3
+
+
+class PostModel(PostBase):
+    # 稿件数据
+    __tablename__ = "posts"
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True, comment='稿件id')
+    text: Mapped[str] = mapped_column(String, nullable=True, comment='稿件内容')
+    attachment: Mapped[str] = mapped_column(String, nullable=True, comment='稿件附件(json内容)')
+    submitter_id: Mapped[int] = mapped_column(Integer, comment='投稿者id')
+    status: Mapped[int] = mapped_column(Integer, default=PostStatus.PENDING.value, comment='稿件状态')
+    submitter_msg_id: Mapped[int] = mapped_column(Integer, nullable=True, comment='投稿者消息id')
+    review_msg_id: Mapped[int] = mapped_column(Integer, nullable=True, comment='审核群内消息id')
+    operate_msg_id: Mapped[int] = mapped_column(Integer, nullable=True, comment='操作消息id')
+    publish_msg_id: Mapped[int] = mapped_column(Integer, nullable=True, comment='发布消息id')  # 如果是拒稿的话，那么就是拒稿频道的id
+    other: Mapped[str] = mapped_column(String, nullable=True, comment='其他信息(json内容)')
+    created_at: Mapped[int] = mapped_column(Integer, nullable=True, comment='创建时间')
+    finish_at: Mapped[int] = mapped_column(Integer, nullable=True, comment='审核完成时间')
+    approve_count: Mapped[int] = mapped_column(Integer, default=0, server_default="0", comment='以 SFW 通过票数')
+    reject_count: Mapped[int] = mapped_column(Integer, default=0, server_default="0", comment='拒绝票数')
+    nsfw_count: Mapped[int] = mapped_column(Integer, default=0, server_default="0", comment='以 NSFW 通过票数')
+    version: Mapped[int] = mapped_column(Integer, nullable=False, server_default="0", comment='乐观锁版本号')
+
+    # 状态变更时按版本号比较并更新，版本不一致时抛出 StaleDataError
+    __mapper_args__ = {"version_id_col": version}
+    __table_args__ = (Index("ix_posts_status", "status"),)
+
+
+class VoteType(Enum):
+    APPROVE = 1
+    REJECT = 2
+    APPROVE_NSFW = 3
+
+
+class PostLogModel(PostBase):
+    # 稿件审核日志
+    __tablename__ = "logs"
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True, autoincrement=True, comment='日志id')
+    post_id: Mapped[int] = mapped_column(Integer, comment='稿件id')
+    reviewer_id: Mapped[int] = mapped_column(Integer, nullable=True, comment='审核者id')
+    vote: Mapped[int] = mapped_column(Integer, nullable=True, comment='投票类型')
+    operate_type: Mapped[str] = mapped_column(String, nullable=True, comment='操作来源 reviewer/system')
+    operate_time: Mapped[int] = mapped_column(Integer, default=0, comment='操作时间')
+    msg: Mapped[str] = mapped_column(String, nullable=True, comment='通过/拒绝理由')
+
+    __table_args__ = (Index("ix_logs_post_id_reviewer_id", "post_id", "reviewer_id"),
+                      Index("ix_logs_post_id_operate_time", "post_id", "operate_time"))
+
+
+class PostCommentModel(PostBase):
+    # 审核注，发布时附在稿件正文后
+    __tablename__ = "post_comments"
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True, comment='评论id')
+    post_id: Mapped[int] = mapped_column(Integer, comment='稿件id')
+    user_id: Mapped[int] = mapped_column(Integer, comment='审核者id')
+    comment: Mapped[str] = mapped_column(String, comment='评论内容')
+    created_at: Mapped[int] = mapped_column(Integer, nullable=True, comment='创建时间')
+
+    __table_args__ = (Index("ix_post_comments_post_id_user_id", "post_id", "user_id"),)
+
+
+class PostFingerprintModel(PostBase):
+    """稿件指纹 file_unique_id / 归一化文字哈希，稿件归档后保留"""
+    __tablename__ = "post_fingerprints"
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True, comment='指纹id')
+    post_id: Mapped[int] = mapped_column(Integer, comment='稿件id')
+    fingerprint: Mapped[str] = mapped_column(String, comment='指纹 f:file_unique_id / t:文字哈希')
+
+    __table_args__ = (Index("ix_post_fingerprints_fingerprint_post_id", "fingerprint", "post_id"),
+                      Index("ix_post_fingerprints_post_id", "post_id"))
+
+
+class OutboxStatus(Enum):
+    PENDING = 0
+    DONE = 1
+    FAILED = 2
+
+
+class OutboxModel(PostBase):
+    # 待执行的发布/通知任务，与稿件状态在同一事务中写入
+    __tablename__ = "outbox"
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True, comment='任务id')
+    key: Mapped[str] = mapped_column(String, unique=True, comment='幂等键 action:post_id')
+    action: Mapped[str] = mapped_column(String, comment='任务类型')
+    post_id: Mapped[int] = mapped_column(Integer, comment='稿件id')
+    status: Mapped[int] = mapped_column(Integer, default=OutboxStatus.PENDING.value, comment='任务状态')
+    attempts: Mapped[int] = mapped_column(Integer, default=0, comment='已尝试次数')
+    next_attempt_at: Mapped[int] = mapped_column(Integer, default=0, comment='下次尝试时间')
+    last_error: Mapped[str] = mapped_column(String, nullable=True, comment='最后一次错误')
+    created_at: Mapped[int] = mapped_column(Integer, nullable=True, comment='创建时间')
+
+    __table_args__ = (Index("ix_outbox_status_next_attempt_at", "status", "next_attempt_at"),)
+
+
+# 稿件文字与审核注的全文索引，rowid 即稿件 id
+# trigram 分词支持中文的任意子串查询(至少 3 个字)；稿件归档后索引保留，仍可搜索
+FULL_TEXT_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS posts_fts USING fts5(text, comments, tokenize='trigram')",
+    "CREATE TRIGGER IF NOT EXISTS posts_fts_insert AFTER INSERT ON posts BEGIN "
+    "INSERT INTO posts_fts (rowid, text, comments) VALUES (new.id, new.text, coalesce("
+    "(SELECT group_concat(comment, char(10)) FROM post_comments WHERE post_id = new.id), '')); END",
+    "CREATE TRIGGER IF NOT EXISTS posts_fts_update AFTER UPDATE OF text ON posts BEGIN "
+    "UPDATE posts_fts SET text = new.text WHERE rowid = new.id; END",
+    "CREATE TRIGGER IF NOT EXISTS post_comments_fts_insert AFTER INSERT ON post_comments BEGIN "
+    "UPDATE posts_fts SET comments = (SELECT group_concat(comment, char(10)) FROM post_comments "
+    "WHERE post_id = new.post_id) WHERE rowid = new.post_id; END",
+    # 归档时先删除稿件再删除审核注，已归档稿件的审核注保留在索引中
+    "CREATE TRIGGER IF NOT EXISTS post_comments_fts_delete AFTER DELETE ON post_comments "
+    "WHEN EXISTS (SELECT 1 FROM posts WHERE id = old.post_id) BEGIN "
+    "UPDATE posts_fts SET comments = coalesce((SELECT group_concat(comment, char(10)) FROM post_comments "
+    "WHERE post_id = old.post_id), '') WHERE rowid = old.post_id; END",
+]
+
+
+def create_full_text_index(connection: Connection) -> None:
+    for ddl in FULL_TEXT_DDL:
+        connection.exec_driver_sql(ddl)
+
+
+@event.listens_for(PostBase.metadata, "after_create")
+def _create_full_text_index(target, connection: Connection, **kw):
+    # 新建的数据库不执行迁移，直接建立索引
+    create_full_text_index(connection)
+
+
+def add_vote_tallies(connection: Connection):
+    """
+    3.0 之后新增的列与 outbox 表，新增票数列时按已有审核日志回填
+    """
+    columns = {"approve_count": "INTEGER DEFAULT 0", "reject_count": "INTEGER DEFAULT 0",
+               "nsfw_count": "INTEGER DEFAULT 0", "version": "INTEGER NOT NULL DEFAULT 0"}
+    backfill = not has_column(connection, "posts", "approve_count")
+    for column, ddl in columns.items():
+        if not has_column(connection, "posts", column):
+            connection.exec_driver_sql(f"ALTER TABLE posts ADD COLUMN {column} {ddl}")
+    OutboxModel.__table__.create(connection, checkfirst=True)
+    if not backfill:
+        return
+    connection.execute(text(
+        "UPDATE posts SET "
+        "approve_count = (SELECT COUNT(*) FROM logs WHERE logs.post_id = posts.id "
+        "AND logs.operate_type = 'reviewer' AND logs.vote = :approve), "
+        "reject_count = (SELECT COUNT(*) FROM logs WHERE logs.post_id = posts.id "
+        "AND logs.operate_type = 'reviewer' AND logs.vote = :reject), "
+        "nsfw_count = (SELECT COUNT(*) FROM logs WHERE logs.post_id = posts.id "
+        "AND logs.operate_type = 'reviewer' AND logs.vote = :nsfw)"
+    ), {"approve": VoteType.APPROVE.value, "reject": VoteType.REJECT.value, "nsfw": VoteType.APPROVE_NSFW.value})
+    db_logger.info("Vote tallies backfilled from logs.")
+
+
+def add_hot_path_indexes(connection: Connection):
+    """
+    审核日志按 (post_id, reviewer_id) / (post_id, operate_time) 查询，稿件按 status 查询
+    """
+    connection.exec_driver_sql("DROP INDEX IF EXISTS ix_logs_post_id")
+    connection.exec_driver_sql(
+        "CREATE INDEX IF NOT EXISTS ix_logs_post_id_reviewer_id ON logs (post_id, reviewer_id)")
+    connection.exec_driver_sql(
+        "CREATE INDEX IF NOT EXISTS ix_logs_post_id_operate_time ON logs (post_id, operate_time)")
+    connection.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_posts_status ON posts (status)")
+
+
+def move_comments_to_table(connection: Connection):
+    """
+    把 posts.other 中 JSON 形式的审核注迁移到 post_comments 表
+    """
+    PostCommentModel.__table__.create(connection, checkfirst=True)
+    connection.exec_driver_sql(
+        "INSERT INTO post_comments (post_id, user_id, comment, created_at) "
+        "SELECT posts.id, json_extract(c.value, '$.user_id'), json_extract(c.value, '$.comment'), "
+        "json_extract(c.value, '$.timestamp') "
+        "FROM posts, json_each(posts.other, '$.comment') AS c "
+        "WHERE json_valid(posts.other) AND json_type(posts.other, '$.comment') = 'array' "
+        "ORDER BY posts.id, c.key")
+    connection.exec_driver_sql(
+        "UPDATE posts SET other = NULLIF(json_remove(other, '$.comment'), '{}') "
+        "WHERE json_valid(other) AND json_type(other, '$.comment') IS NOT NULL")
+
+
+def add_post_fingerprints(connection: Connection):
+    """
+    新增稿件指纹表，按已有稿件的文字回填(3.0 的附件没有记录 file_unique_id，无法回填)
+    """
+    PostFingerprintModel.__table__.create(connection, checkfirst=True)
+    rows = connection.exec_driver_sql("SELECT id, text, attachment FROM posts")
+    values = [{"post_id": post_id, "fingerprint": fingerprint}
+              for post_id, text_, attachment in rows
+              for fingerprint in post_fingerprints(text_, attachment)]
+    if values:
+        connection.execute(insert(PostFingerprintModel), values)
+    db_logger.info(f"Backfilled {len(values)} post fingerprints.")
+
+
+def add_full_text_search(connection: Connection):
+    """
+    全文索引，按热库与归档库中已有的稿件回填
+    """
+    create_full_text_index(connection)
+    connection.exec_driver_sql(
+        "INSERT INTO posts_fts (rowid, text, comments) "
+        "SELECT posts.id, posts.text, coalesce((SELECT group_concat(comment, char(10)) FROM post_comments "
+        "WHERE post_comments.post_id = posts.id), '') FROM posts")
+    archive_path = os.path.join(Config.DATABASES_DIR, "archive.db")
+    if not os.path.exists(archive_path):
+        return
+    archive = sqlite3.connect(archive_path)
+    total = 0
+    try:
+        cursor = archive.execute(
+            "SELECT posts.id, posts.text, coalesce((SELECT group_concat(comment, char(10)) FROM post_comments "
+            "WHERE post_comments.post_id = posts.id), '') FROM posts")
+        while rows := cursor.fetchmany(1000):
+            connection.exec_driver_sql("INSERT OR REPLACE INTO posts_fts (rowid, text, comments) VALUES (?, ?, ?)",
+                                       rows)
+            total += len(rows)
+    finally:
+        archive.close()
+    db_logger.info(f"Indexed {total} archived posts for full text search.")
+
+
+MIGRATIONS = [
+    Migration(1, "vote tallies, optimistic version and outbox", add_vote_tallies),
+    Migration(2, "hot path indexes for logs and posts", add_hot_path_indexes),
+    Migration(3, "post_comments table", move_comments_to_table),
+    Migration(4, "post_fingerprints table for duplicate detection", add_post_fingerprints),
+    Migration(5, "posts_fts full text index", add_full_text_search),
+]
+
+# 处理器中的热点查询，启动时检查执行计划不能退化为全表扫描
+HOT_QUERIES = [
+    HotQuery("reviewer vote", "SELECT * FROM logs WHERE post_id = :post_id AND reviewer_id = :reviewer_id "
+                              "AND operate_type = 'reviewer'", {"post_id": 1, "reviewer_id": 1}),
+    HotQuery("post logs", "SELECT * FROM logs WHERE post_id = :post_id ORDER BY operate_time, id",
+             {"post_id": 1}),
+    HotQuery("reject reason", "SELECT msg FROM logs WHERE post_id = :post_id AND operate_type = 'system' "
+                              "ORDER BY operate_time DESC, id DESC LIMIT 1", {"post_id": 1}),
+    HotQuery("post votes", "SELECT reviewer_id, vote FROM logs WHERE post_id = :post_id "
+                           "AND operate_type = 'reviewer'", {"post_id": 1}),
+    HotQuery("unvoted posts", "SELECT id FROM posts WHERE status = :status AND id > :after_id AND NOT EXISTS "
+                              "(SELECT id FROM logs WHERE logs.post_id = posts.id AND logs.reviewer_id = :reviewer_id) "
+                              "ORDER BY id LIMIT 20",
+             {"status": PostStatus.PENDING.value, "after_id": 0, "reviewer_id": 1}),
+    HotQuery("post comments", "SELECT comment FROM post_comments WHERE post_id = :post_id ORDER BY id",
+             {"post_id": 1}),
+    HotQuery("duplicate fingerprints", "SELECT f.post_id, posts.status FROM post_fingerprints AS f "
+                                       "LEFT JOIN posts ON posts.id = f.post_id "
+                                       "WHERE f.fingerprint IN (:a, :b) AND f.post_id != :post_id "
+                                       "GROUP BY f.post_id ORDER BY f.post_id DESC LIMIT 5",
+             {"a": "f:", "b": "t:", "post_id": 0}),
+    HotQuery("search posts", "SELECT posts_fts.rowid, posts.status FROM posts_fts "
+                             "LEFT JOIN posts ON posts.id = posts_fts.rowid "
+                             "WHERE posts_fts MATCH :query AND posts_fts.rowid >= (SELECT coalesce(min(rowid), 0) "
+                             "FROM (SELECT rowid FROM posts_fts WHERE posts_fts MATCH :query "
+                             "ORDER BY rowid DESC LIMIT 1000)) ORDER BY rank LIMIT 20", {"query": '"abc"'}),
+    HotQuery("due outbox", "SELECT * FROM outbox WHERE status = :status AND next_attempt_at <= :now "
+                           "ORDER BY id LIMIT 20", {"status": OutboxStatus.PENDING.value, "now": 0}),
+]
+
+create_database("posts", PostBase, MIGRATIONS, HOT_QUERIES)
+ENGINE, READ_ENGINE = create_async_engines("posts")
+PostsSessionFactory = async_sessionmaker(bind=ENGINE, expire_on_commit=False)
+PostsReadSessionFactory = async_sessionmaker(bind=READ_ENGINE, expire_on_commit=False)
+POSTS_WRITER = WriteQueue("posts", PostsSessionFactory, DatabaseConfig.WRITE_BATCH_WINDOW_MS / 1000,
+                          DatabaseConfig.WRITE_BATCH_MAX)
+
+
+@asynccontextmanager
+async def get_post_db(readonly: bool = False) -> AsyncGenerator[AsyncSession, Any]:
+    """
+    readonly 为 True 时使用只读连接池(同一个 UnitOfWork 中共享会话)，否则使用唯一的写连接
+    """
+    if readonly:
+        async with read_session("posts", PostsReadSessionFactory) as session:
+            try:
+                yield session
+            except Exception as e:
+                db_logger.error(f"Error in get_post_db: {e}")
+                raise
+        return
+    async with PostsSessionFactory() as session:
+        try:
+            yield session
+        except Exception as e:
+            db_logger.error(f"Error in get_post_db: {e}")
+            await session.rollback()
+            raise
+        finally:
+            await session.close()
+
+
+DUPLICATE_QUERY = text(
+    "SELECT f.post_id, posts.status FROM post_fingerprints AS f LEFT JOIN posts ON posts.id = f.post_id "
+    "WHERE f.fingerprint IN :fingerprints AND f.post_id != :exclude_post_id "
+    "GROUP BY f.post_id ORDER BY f.post_id DESC LIMIT :limit"
+).bindparams(bindparam("fingerprints", expanding=True))
+
+# 常见词可能匹配数万条稿件，bm25 需要逐条计算，只在最新的若干条匹配中按相关度排序
+SEARCH_RANK_WINDOW = 1000
+SEARCH_QUERY = text(
+    "SELECT posts_fts.rowid, posts.status, posts.review_msg_id, snippet(posts_fts, -1, '', '', '…', 24) "
+    "FROM posts_fts LEFT JOIN posts ON posts.id = posts_fts.rowid "
+    "WHERE posts_fts MATCH :query AND posts_fts.rowid >= (SELECT coalesce(min(rowid), 0) FROM "
+    "(SELECT rowid FROM posts_fts WHERE posts_fts MATCH :query ORDER BY rowid DESC LIMIT :window)) "
+    "ORDER BY rank LIMIT :limit OFFSET :offset"
+)
+
+
+def build_match_query(keywords: str) -> str | None:
+    """
+    把用户输入转换为 FTS5 查询，每个词按短语匹配且都必须出现
+    trigram 分词无法匹配少于 3 个字的词，这些词被忽略，没有可用的词时返回 None
+    """
+    terms = [term for term in keywords.split() if len(term) >= 3]
+    if not terms:
+        return None
+    return " ".join('"' + term.replace('"', '""') + '"' for term in terms)
+
+
+TALLY_COLUMNS = {
+    VoteType.APPROVE.value: PostModel.approve_count,
+    VoteType.REJECT.value: PostModel.reject_count,
+    VoteType.APPROVE_NSFW.value: PostModel.nsfw_count,
+}
+
+
+class PostOperation:
+    @staticmethod
+    async def apply_vote(session: AsyncSession, post_id: int, old_vote: int | None,
+                         new_vote: int | None) -> PostModel:
+        """
+        在调用方的事务中更新票数，返回最新的稿件数据
+        """
+        values = {}
+        if old_vote in TALLY_COLUMNS:
+            column = TALLY_COLUMNS[old_vote]
+            values[column.key] = column - 1
+        if new_vote in TALLY_COLUMNS:
+            column = TALLY_COLUMNS[new_vote]
+            values[column.key] = values.get(column.key, column) + 1
+        if values:
+            values[PostModel.version.key] = PostModel.version + 1
+            await session.execute(update(PostModel).where(PostModel.id == post_id).values(**values))
+        result = await session.execute(
+            select(PostModel).filter_by(id=post_id).execution_options(populate_existing=True))
+        return result.scalar_one()
+
+    @staticmethod
+    async def enqueue_outbox(session: AsyncSession, action: str, post_id: int) -> None:
+        """
+        在调用方的事务中写入发布任务，同一任务重复写入时忽略
+        """
+        await session.execute(
+            insert(OutboxModel)
+            .values(key=f"{action}:{post_id}", action=action, post_id=post_id, created_at=int(time.time()))
+            .on_conflict_do_nothing(index_elements=[OutboxModel.key]))
+
+    @staticmethod
+    async def prune_outbox(session: AsyncSession, before: int, limit: int) -> int:
+        """
+        删除创建时间早于 before 的已完成任务，失败的任务保留以便排查，返回删除的数量
+        """
+        done = (select(OutboxModel.id)
+                .where(OutboxModel.status == OutboxStatus.DONE.value, OutboxModel.created_at < before)
+                .limit(limit))
+        result = await session.execute(delete(OutboxModel).where(OutboxModel.id.in_(done)))
+        return result.rowcount
+
+    @staticmethod
+    async def add_comment(session: AsyncSession, post_id: int, user_id: int, comment: str) -> bool:
+        """
+        添加审核注，稿件不存在时返回 False
+        """
+        if await session.get(PostModel, post_id) is None:
+            return False
+        session.add(PostCommentModel(post_id=post_id, user_id=user_id, comment=comment,
+                                     created_at=int(time.time())))
+        return True
+
+    @staticmethod
+    async def remove_comments(session: AsyncSession, post_id: int, user_id: int) -> bool:
+        """
+        删除某个审核者在稿件上的全部审核注，稿件不存在时返回 False
+        """
+        if await session.get(PostModel, post_id) is None:
+            return False
+        await session.execute(delete(PostCommentModel).filter_by(post_id=post_id, user_id=user_id))
+        return True
+
+    @staticmethod
+    async def get_comments(post_id: int) -> list[str]:
+        async with get_post_db(readonly=True) as session:
+            result = await session.execute(
+                select(PostCommentModel.comment).filter_by(post_id=post_id).order_by(PostCommentModel.id))
+            return list(result.scalars().all())
+
+    @staticmethod
+    async def finalize(session: AsyncSession, post_id: int) -> None:
+        """
+        稿件进入最终状态，在同一事务中写入发布与计数任务
+        """
+        await PostOperation.enqueue_outbox(session, "publish", post_id)
+        await PostOperation.enqueue_outbox(session, "count", post_id)
+
+    @staticmethod
+    async def set_reject_reason(session: AsyncSession, post_id: int, reviewer_id: int,
+                                reason: str) -> tuple[PostModel | None, str | None]:
+        """
+        为待选理由的稿件写入拒稿理由并完成拒稿，返回 (稿件, 错误提示)
+        """
+        result = await session.execute(select(PostModel).filter_by(id=post_id))
+        post_data = result.scalar_one_or_none()
+        if not post_data:
+            return None, "❗️投稿不存在或已被处理，请稍后再试。"
+        if post_data.status != PostStatus.NEED_REASON.value:
+            return None, "❗️投稿状态不正确，请稍后再试。"
+        session.add(PostLogModel(post_id=post_id, reviewer_id=reviewer_id, operate_type="system",
+                                 operate_time=int(time.time()), msg=reason))
+        post_data.status = PostStatus.REJECTED.value
+        await PostOperation.finalize(session, post_id)
+        return post_data, None
+
+    @staticmethod
+    async def add_fingerprints(session: AsyncSession, post_id: int, fingerprints: set[str]) -> None:
+        """
+        在调用方的事务中写入稿件指纹
+        """
+        if fingerprints:
+            await session.execute(insert(PostFingerprintModel),
+                                  [{"post_id": post_id, "fingerprint": f} for f in fingerprints])
+
+    @staticmethod
+    async def find_duplicates(fingerprints: set[str], exclude_post_id: int | None = None,
+                              limit: int = 5) -> list[tuple[int, int | None]]:
+        """
+        查找指纹相同的稿件，返回 [(稿件id, 状态)]，从新到旧排列，已归档的稿件状态为 None
+        """
+        if not fingerprints:
+            return []
+        params = {"fingerprints": list(fingerprints),
+                  "exclude_post_id": -1 if exclude_post_id is None else exclude_post_id, "limit": limit}
+        # 预先写好的 text 语句，省去 ORM 编译的开销
+        async with get_post_db(readonly=True) as session:
+            return [tuple(row) for row in (await session.execute(DUPLICATE_QUERY, params)).all()]
+
+    @staticmethod
+    async def get_fingerprints(post_id: int) -> set[str]:
+        async with get_post_db(readonly=True) as session:
+            result = await session.execute(
+                select(PostFingerprintModel.fingerprint).filter_by(post_id=post_id))
+            return set(result.scalars().all())
+
+    @staticmethod
+    async def search(keywords: str, offset: int = 0,
+                     limit: int = 20) -> list[tuple[int, int | None, int | None, str]]:
+        """
+        全文搜索稿件文字与审核注，在最新的 SEARCH_RANK_WINDOW 条匹配中按相关度排序
+        返回 [(稿件id, 状态, 审核消息id, 摘要)]，已归档的稿件状态与审核消息id为 None
+        """
+        match_query = build_match_query(keywords)
+        if match_query is None:
+            return []
+        async with get_post_db(readonly=True) as session:
+            result = await session.execute(SEARCH_QUERY, {"query": match_query, "window": SEARCH_RANK_WINDOW,
+                                                          "limit": limit, "offset": offset})
+            return [tuple(row) for row in result.all()]
+
+    @staticmethod
+    def decide_status(post: PostModel) -> int:
+        """
+        根据票数判断稿件状态
+        """
+        if post.approve_count + post.nsfw_count >= ReviewConfig.APPROVE_NUMBER_REQUIRED:
+            return PostStatus.APPROVED.value
+        if post.reject_count >= ReviewConfig.REJECT_NUMBER_REQUIRED:
+            return PostStatus.NEED_REASON.value
+        return PostStatus.PENDING.value
+
+    @staticmethod
+    async def get_unvoted_post_ids(reviewer_id: int, after_id: int = 0, limit: int = 100) -> list[int]:
+        """
+        按 id 键集分页获取审核员尚未投票的待审稿件
+        """
+        voted = select(PostLogModel.id).where(PostLogModel.post_id == PostModel.id,
+                                              PostLogModel.reviewer_id == reviewer_id)
+        async with get_post_db(readonly=True) as session:
+            result = await session.execute(
+                select(PostModel.id)
+                .where(PostModel.status == PostStatus.PENDING.value, PostModel.id > after_id, ~exists(voted))
+                .order_by(PostModel.id)
+                .limit(limit)
+            )
+            return list(result.scalars().all())
+
+
+class ReviewQueue:
+    """
+    每个审核员尚未投票的稿件队列，按页从数据库补充，并随新投稿/投票/结束审核增量维护
+    """
+    PAGE_SIZE = 100
+
+    def __init__(self):
+        self._queues: dict[int, deque[int]] = {}
+        self._members: dict[int, set[int]] = {}
+        self._cursors: dict[int, int] = {}
+        self._exhausted: set[int] = set()  # 数据库中已没有更多可补充的稿件
+        self.refills = 0
+        self.trims = 0
+
+    def reset(self, reviewer_id: int) -> None:
+        self._queues.pop(reviewer_id, None)
+        self._members.pop(reviewer_id, None)
+        self._cursors.pop(reviewer_id, None)
+        self._exhausted.discard(reviewer_id)
+
+    async def pop(self, reviewer_id: int) -> int | None:
+        queue = self._queues.setdefault(reviewer_id, deque())
+        members = self._members.setdefault(reviewer_id, set())
+        while True:
+            while queue:
+                post_id = queue.popleft()
+                # 已投票或已结束审核的稿件只从集合中删除，出队时跳过
+                if post_id in members:
+                    members.discard(post_id)
+                    return post_id
+            if reviewer_id in self._exhausted:
+                return None
+            post_ids = await PostOperation.get_unvoted_post_ids(reviewer_id, self._cursors.get(reviewer_id, 0),
+                                                                self.PAGE_SIZE)
+            self.refills += 1
+            if len(post_ids) < self.PAGE_SIZE:
+                self._exhausted.add(reviewer_id)
+            if post_ids:
+                self._cursors[reviewer_id] = post_ids[-1]
+                queue.extend(post_ids)
+                members.update(post_ids)
+
+    def add_post(self, post_id: int) -> None:
+        """
+        新投稿入队，尚未翻到的页会在补充时自然取到
+        """
+        for reviewer_id, queue in self._queues.items():
+            cursor = self._cursors.get(reviewer_id, 0)
+            if reviewer_id in self._exhausted or post_id <= cursor:
+                queue.append(post_id)
+                self._members[reviewer_id].add(post_id)
+                self._cursors[reviewer_id] = max(cursor, post_id)
+
+    def restore(self, reviewer_id: int, post_id: int) -> None:
+        """
+        审核员撤回投票后重新入队
+        """
+        if reviewer_id in self._queues and post_id not in self._members[reviewer_id]:
+            self._queues[reviewer_id].append(post_id)
+            self._members[reviewer_id].add(post_id)
+
+    def _trim(self, reviewer_id: int) -> None:
+        """
+        出队时才跳过的稿件超过一半时重建队列，不活跃审核员的队列长度不超过待审稿件数的两倍
+        """
+        queue, members = self._queues[reviewer_id], self._members[reviewer_id]
+        if len(queue) > 2 * len(members):
+            # 原地重建，pop 在补充时仍持有这个队列
+            kept = [post_id for post_id in queue if post_id in members]
+            queue.clear()
+            queue.extend(kept)
+            self.trims += 1
+
+    def discard(self, reviewer_id: int, post_id: int) -> None:
+        if reviewer_id in self._members:
+            self._members[reviewer_id].discard(post_id)
+            self._trim(reviewer_id)
+
+    def close_post(self, post_id: int) -> None:
+        for reviewer_id, members in self._members.items():
+            if post_id in members:
+                members.discard(post_id)
+                self._trim(reviewer_id)
+
+    def stats(self) -> dict:
+        return {
+            "reviewers": len(self._queues),
+            "queued": sum(len(m) for m in self._members.values()),
+            "entries": sum(len(q) for q in self._queues.values()),
+            "refills": self.refills,
+            "trims": self.trims,
+        }
+
+
+REVIEW_QUEUE = ReviewQueue()
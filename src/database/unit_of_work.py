@@ -0,0 +1,117 @@
+"""
+每个更新(或后台任务)一个 UnitOfWork，处理过程中的只读查询共享会话
+每个数据库最多打开一个只读会话，第一次使用时才打开；写操作仍然经过 WriteQueue 合并提交
+"""
+import time
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import Any, AsyncGenerator
+
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+CURRENT_UNIT: ContextVar["UnitOfWork | None"] = ContextVar("unit_of_work", default=None)
+
+
+class UnitOfWork:
+    """
+    会话在每个 with 块结束时结束读事务并归还连接，等待网络请求时不持有 WAL 快照
+    同一个更新中写操作提交后清空会话中的对象，之后的查询读到刚写入的数据
+    """
+
+    def __init__(self, name: str = "update"):
+        self.name = name
+        self._sessions: dict[str, AsyncSession] = {}
+        self._depth: dict[str, int] = {}
+        self.closed = False
+        self.queries = 0
+        self.commits = 0
+        self.started = 0.0
+        self.elapsed_ms = 0.0
+
+    async def __aenter__(self) -> "UnitOfWork":
+        self.started = time.perf_counter()
+        self._token = CURRENT_UNIT.set(self)
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        CURRENT_UNIT.reset(self._token)
+        # 在此之后创建的任务(例如防抖)仍可能看到这个实例，关闭后不再共享
+        self.closed = True
+        for session in self._sessions.values():
+            await session.close()
+        self.elapsed_ms = (time.perf_counter() - self.started) * 1000
+
+    @property
+    def sessions(self) -> int:
+        return len(self._sessions)
+
+    @asynccontextmanager
+    async def session(self, database: str, session_factory: async_sessionmaker) -> AsyncGenerator[AsyncSession, Any]:
+        session = self._sessions.get(database)
+        if session is None:
+            session = self._sessions[database] = session_factory()
+        self._depth[database] = self._depth.get(database, 0) + 1
+        try:
+            yield session
+        finally:
+            self._depth[database] -= 1
+            if self._depth[database] == 0:
+                # 只读会话没有改动，commit 只结束事务；rollback 会让已取出的对象过期
+                await session.commit()
+
+    def written(self) -> None:
+        self.commits += 1
+        for session in self._sessions.values():
+            session.expunge_all()
+
+
+def current_unit() -> UnitOfWork | None:
+    unit = CURRENT_UNIT.get()
+    return None if unit is None or unit.closed else unit
+
+
+@asynccontextmanager
+async def read_session(database: str, session_factory: async_sessionmaker) -> AsyncGenerator[AsyncSession, Any]:
+    """
+    有 UnitOfWork 时使用其中共享的会话，否则新建并在退出时关闭
+    """
+    unit = current_unit()
+    if unit is None:
+        async with session_factory() as session:
+            yield session
+    else:
+        async with unit.session(database, session_factory) as session:
+            yield session
+
+
+def count_query(*_) -> None:
+    """
+    before_cursor_execute 事件，统计当前 UnitOfWork 执行的语句
+    """
+    unit = current_unit()
+    if unit is not None:
+        unit.queries += 1
+
+
+class UnitOfWorkStats:
+    def __init__(self):
+        self._stats: dict[str, dict] = {}
+
+    def record(self, unit: UnitOfWork) -> None:
+        stats = self._stats.setdefault(unit.name, {"units": 0, "queries": 0, "commits": 0, "sessions": 0,
+                                                   "max_queries": 0, "max_ms": 0.0})
+        stats["units"] += 1
+        stats["queries"] += unit.queries
+        stats["commits"] += unit.commits
+        stats["sessions"] += unit.sessions
+        stats["max_queries"] = max(stats["max_queries"], unit.queries)
+        stats["max_ms"] = round(max(stats["max_ms"], unit.elapsed_ms), 2)
+
+    def stats(self) -> dict:
+        return {name: f"units={s['units']} avg_queries={s['queries'] / s['units']:.2f} "
+                      f"avg_commits={s['commits'] / s['units']:.2f} avg_sessions={s['sessions'] / s['units']:.2f} "
+                      f"max_queries={s['max_queries']} max={s['max_ms']}ms"
+                for name, s in self._stats.items()}
+
+
+UNIT_OF_WORK_STATS = UnitOfWorkStats()
@@ -1,83 +1,479 @@
-from contextlib import asynccontextmanager
-from typing import AsyncGenerator, Any
-
-from sqlalchemy import Integer, String, select
-from sqlalchemy.ext.asyncio import AsyncAttrs, create_async_engine, async_sessionmaker, AsyncSession
-from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
-
-from src.config import Config
-from src.database import create_database
-from src.logger import db_logger
-
-
-class Base(AsyncAttrs, DeclarativeBase):
-    pass
-
-
-class ReviewerModel(Base):
-    __tablename__ = "reviewers"  # 审核者数据
-    user_id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True, comment='用户id')
-    username: Mapped[str] = mapped_column(String, nullable=True, comment="用户名")
-    fullname: Mapped[str] = mapped_column(String, nullable=True, comment="TG全名")
-    approve_count: Mapped[int] = mapped_column(Integer, default=0, comment='通过稿件数量')
-    reject_count: Mapped[int] = mapped_column(Integer, default=0, comment='拒绝稿件数量')
-    approve_but_rejected_count: Mapped[int] = mapped_column(Integer, default=0, comment='通过但是最后被拒绝的稿件数量')
-    reject_but_approved_count: Mapped[int] = mapped_column(Integer, default=0, comment='拒绝但是最后通过的稿件数量')
-    last_time: Mapped[int] = mapped_column(Integer, default=0, comment='最后审核时间')
-
-
-class SubmitterModel(Base):
-    __tablename__ = "submitters"  # 投稿者数据
-    user_id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True, comment='用户id')
-    username: Mapped[str] = mapped_column(String, nullable=True, comment="用户名")
-    fullname: Mapped[str] = mapped_column(String, nullable=True, comment="TG全名")
-    submission_count: Mapped[int] = mapped_column(Integer, default=0, comment='投稿数量')
-    approved_count: Mapped[int] = mapped_column(Integer, default=0, comment='通过数量')
-    rejected_count: Mapped[int] = mapped_column(Integer, default=0, comment='拒绝数量')
-
-
-class BannedUserModel(Base):
-    __tablename__ = "banned_users"
-    user_id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True, comment='用户id')
-    username: Mapped[str] = mapped_column(String, nullable=True, comment="用户名")
-    fullname: Mapped[str] = mapped_column(String, nullable=True, comment="TG全名")
-    banned_reason: Mapped[str] = mapped_column(String(50), nullable=True, comment='封禁原因')
-    banned_date: Mapped[int] = mapped_column(Integer, default=0, comment='封禁日期')
-    banned_by: Mapped[int] = mapped_column(Integer, comment='封禁操作人ID')
-
-
-create_database("users", Base)
-DATABASE_URL = f'sqlite+aiosqlite:///{Config.DATABASES_DIR / "users.db"}'
-ENGINE = create_async_engine(DATABASE_URL, echo=Config.SQLALCHEMY_LOG)
-UsersSessionFactory = async_sessionmaker(bind=ENGINE, expire_on_commit=False)
-
-@asynccontextmanager
-async def get_users_db() -> AsyncGenerator[AsyncSession, Any]:
-    async with UsersSessionFactory() as session:
-        try:
-            yield session
-        except Exception as e:
-            db_logger.error(f"Error in get_users_db: {e}")
-            await session.rollback()
-            raise
-        finally:
-            await session.close()
-
-
-class UserOperation:
-    @staticmethod
-    async def submitter_add_count(user_id: int):
-        async with UsersSessionFactory() as session:
-            async with session.begin():
-                submitter = await session.execute(select(SubmitterModel).filter_by(user_id=user_id))
-                submitter = submitter.scalar_one_or_none()
-                if not submitter:
-                    submitter = SubmitterModel(user_id=user_id, submission_count=0)
-                submitter.submission_count += 1
-                await session.merge(submitter)
-
-    @staticmethod
-    async def get_reviewer(user_id: int) -> ReviewerModel | None:
-        async with UsersSessionFactory() as session:
-            reviewer = await session.execute(select(ReviewerModel).filter_by(user_id=user_id))
-            return reviewer.scalar_one_or_none()
+import asyncio
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import AsyncGenerator, Any
+
+from sqlalchemy import Integer, String, select, update, bindparam, Connection
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.ext.asyncio import AsyncAttrs, async_sessionmaker, AsyncSession
+from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
+
+from src.config import Config, DatabaseConfig
+from src.database import create_database, create_async_engines
+from src.database.migrations import Migration
+from src.database.unit_of_work import read_session
+from src.database.writer import WriteQueue
+from src.logger import db_logger
+
+
+class Base(AsyncAttrs, DeclarativeBase):
+    pass
+
+
+class ReviewerModel(Base):
+    __tablename__ = "reviewers"  # 审核者数据
+    user_id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True, comment='用户id')
+    username: Mapped[str] = mapped_column(String, nullable=True, comment="用户名")
+    fullname: Mapped[str] = mapped_column(String, nullable=True, comment="TG全名")
+    approve_count: Mapped[int] = mapped_column(Integer, default=0, comment='通过稿件数量')
+    reject_count: Mapped[int] = mapped_column(Integer, default=0, comment='拒绝稿件数量')
+    approve_but_rejected_count: Mapped[int] = mapped_column(Integer, default=0, comment='通过但是最后被拒绝的稿件数量')
+    reject_but_approved_count: Mapped[int] = mapped_column(Integer, default=0, comment='拒绝但是最后通过的稿件数量')
+    last_time: Mapped[int] = mapped_column(Integer, default=0, comment='最后审核时间')
+
+
+class SubmitterModel(Base):
+    __tablename__ = "submitters"  # 投稿者数据
+    user_id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True, comment='用户id')
+    username: Mapped[str] = mapped_column(String, nullable=True, comment="用户名")
+    fullname: Mapped[str] = mapped_column(String, nullable=True, comment="TG全名")
+    submission_count: Mapped[int] = mapped_column(Integer, default=0, comment='投稿数量')
+    approved_count: Mapped[int] = mapped_column(Integer, default=0, comment='通过数量')
+    rejected_count: Mapped[int] = mapped_column(Integer, default=0, comment='拒绝数量')
+
+
+class BannedUserModel(Base):
+    __tablename__ = "banned_users"
+    user_id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True, comment='用户id')
+    username: Mapped[str] = mapped_column(String, nullable=True, comment="用户名")
+    fullname: Mapped[str] = mapped_column(String, nullable=True, comment="TG全名")
+    banned_reason: Mapped[str] = mapped_column(String(50), nullable=True, comment='封禁原因')
+    banned_date: Mapped[int] = mapped_column(Integer, default=0, comment='封禁日期')
+    banned_by: Mapped[int] = mapped_column(Integer, comment='封禁操作人ID')
+
+
+class UserDataModel(Base):
+    __tablename__ = "user_data"  # context.user_data，每个键一行
+    user_id: Mapped[int] = mapped_column(Integer, primary_key=True, comment='用户id')
+    key: Mapped[str] = mapped_column(String, primary_key=True, comment='键')
+    value: Mapped[str] = mapped_column(String, comment='JSON 值')
+
+
+class ConversationModel(Base):
+    __tablename__ = "conversations"  # ConversationHandler 的会话状态
+    name: Mapped[str] = mapped_column(String, primary_key=True, comment='ConversationHandler 名称')
+    key: Mapped[str] = mapped_column(String, primary_key=True, comment='JSON 形式的会话键')
+    state: Mapped[str] = mapped_column(String, comment='JSON 形式的状态')
+
+
+def add_persistence_tables(connection: Connection):
+    UserDataModel.__table__.create(connection, checkfirst=True)
+    ConversationModel.__table__.create(connection, checkfirst=True)
+
+
+MIGRATIONS = [
+    Migration(1, "user_data and conversations tables for bot persistence", add_persistence_tables),
+]
+
+create_database("users", Base, MIGRATIONS)
+ENGINE, READ_ENGINE = create_async_engines("users")
+UsersSessionFactory = async_sessionmaker(bind=ENGINE, expire_on_commit=False)
+UsersReadSessionFactory = async_sessionmaker(bind=READ_ENGINE, expire_on_commit=False)
+USERS_WRITER = WriteQueue("users", UsersSessionFactory, DatabaseConfig.WRITE_BATCH_WINDOW_MS / 1000,
+                          DatabaseConfig.WRITE_BATCH_MAX)
+
+
+@asynccontextmanager
+async def get_users_db(readonly: bool = False) -> AsyncGenerator[AsyncSession, Any]:
+    """
+    readonly 为 True 时使用只读连接池(同一个 UnitOfWork 中共享会话)，否则使用唯一的写连接
+    """
+    if readonly:
+        async with read_session("users", UsersReadSessionFactory) as session:
+            try:
+                yield session
+            except Exception as e:
+                db_logger.error(f"Error in get_users_db: {e}")
+                raise
+        return
+    async with UsersSessionFactory() as session:
+        try:
+            yield session
+        except Exception as e:
+            db_logger.error(f"Error in get_users_db: {e}")
+            await session.rollback()
+            raise
+        finally:
+            await session.close()
+
+
+class UserOperation:
+    @staticmethod
+    async def submitter_add_count(user_id: int):
+        USER_COUNTERS.add(SubmitterModel, user_id, submission_count=1)
+        # 尚未刷新的资料与计数在同一个写操作中提交，新投稿者的行不会只有计数没有用户名
+        await USER_COUNTERS.commit(profiles=SUBMITTER_PROFILES)
+
+    @staticmethod
+    async def get_reviewer(user_id: int) -> ReviewerModel | None:
+        async with get_users_db(readonly=True) as session:
+            reviewer = await session.execute(select(ReviewerModel).filter_by(user_id=user_id))
+            return reviewer.scalar_one_or_none()
+
+    @staticmethod
+    async def get_reviewers(user_ids) -> dict[int, ReviewerModel]:
+        return await REVIEWER_REGISTRY.get_many(user_ids)
+
+
+class CounterBuffer:
+    """
+    计数器缓冲，累积的变化在 commit 时合并，每张表只执行一条语句
+    投稿者使用 INSERT ... ON CONFLICT DO UPDATE SET x = x + excluded.x，不存在的行会被创建；
+    审核者只更新已有的行，避免给已移除的审核者重新建档
+    """
+    COUNTER_COLUMNS = {
+        SubmitterModel: ("submission_count", "approved_count", "rejected_count"),
+        ReviewerModel: ("approve_count", "reject_count", "approve_but_rejected_count", "reject_but_approved_count"),
+    }
+
+    def __init__(self):
+        self._pending: dict[type, dict[int, dict[str, int]]] = {}
+        # 变化仍在 _pending 中(尚未提交或提交失败后放回)的来源
+        self._sources: set = set()
+        self.commits = 0
+        self.failures = 0
+        self.statements = 0
+        self.changes = 0
+
+    def add(self, model: type, user_id: int, **deltas: int) -> None:
+        columns = self.COUNTER_COLUMNS[model]
+        row = self._pending.setdefault(model, {}).setdefault(user_id, dict.fromkeys(columns, 0))
+        for column, delta in deltas.items():
+            if column not in row:
+                raise ValueError(f"{column} is not a counter of {model.__tablename__}")
+            row[column] += delta
+            self.changes += 1
+
+    def stage(self, source) -> bool:
+        """
+        会重试的调用者在 add 之前调用，返回 False 表示 source 的变化已在缓冲中(上次提交失败后放回)，不要再次累积
+        """
+        if source in self._sources:
+            return False
+        self._sources.add(source)
+        return True
+
+    def _restore(self, pending: dict[type, dict[int, dict[str, int]]]) -> None:
+        for model, rows in pending.items():
+            current = self._pending.setdefault(model, {})
+            for user_id, deltas in rows.items():
+                row = current.setdefault(user_id, dict.fromkeys(self.COUNTER_COLUMNS[model], 0))
+                for column, delta in deltas.items():
+                    row[column] += delta
+
+    @staticmethod
+    def build_statements(pending: dict[type, dict[int, dict[str, int]]]) -> list:
+        statements = []
+        rows = pending.get(SubmitterModel)
+        if rows:
+            stmt = insert(SubmitterModel).values(
+                [{"user_id": user_id, **deltas} for user_id, deltas in rows.items()])
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[SubmitterModel.user_id],
+                set_={column: getattr(SubmitterModel, column) + getattr(stmt.excluded, column)
+                      for column in CounterBuffer.COUNTER_COLUMNS[SubmitterModel]})
+            statements.append((stmt, None))
+        rows = pending.get(ReviewerModel)
+        if rows:
+            columns = CounterBuffer.COUNTER_COLUMNS[ReviewerModel]
+            stmt = (update(ReviewerModel)
+                    .where(ReviewerModel.user_id == bindparam("b_user_id"))
+                    .values({column: getattr(ReviewerModel, column) + bindparam(f"b_{column}")
+                             for column in columns}))
+            params = [{"b_user_id": user_id, **{f"b_{column}": deltas[column] for column in columns}}
+                      for user_id, deltas in rows.items()]
+            statements.append((stmt, params))
+        return statements
+
+    async def commit(self, profiles: "SubmitterProfileCache | None" = None) -> None:
+        """
+        把当前累积的变化写入数据库，返回时已提交
+        指定 profiles 时，尚未刷新的投稿者资料与计数在同一个写操作中写入
+        """
+        pending, self._pending = self._pending, {}
+        sources, self._sources = self._sources, set()
+        dirty = profiles.take() if profiles is not None else {}
+        if not pending and not dirty:
+            return
+        statements = SubmitterProfileCache.build_statements(dirty) + self.build_statements(pending)
+
+        async def operation(session: AsyncSession):
+            connection = await session.connection()
+            for stmt, params in statements:
+                await connection.execute(stmt, params)
+
+        try:
+            await USERS_WRITER.submit(operation)
+        except Exception:
+            # 放回缓冲，由下一次 commit(或调用者重试)写入，其他调用者合并进来的变化不会丢失
+            self.failures += 1
+            self._restore(pending)
+            self._sources |= sources
+            if profiles is not None:
+                profiles.restore(dirty)
+            raise
+        if profiles is not None:
+            profiles.flushed(dirty)
+        self.commits += 1
+        self.statements += len(statements)
+
+    def stats(self) -> dict:
+        return {
+            "pending": sum(len(rows) for rows in self._pending.values()),
+            "changes": self.changes,
+            "commits": self.commits,
+            "failures": self.failures,
+            "statements": self.statements,
+        }
+
+
+class ReviewerRegistry:
+    """
+    审核员名单的内存缓存，启动时加载一次，之后由 become_reviewer 等指令原地更新
+    """
+
+    def __init__(self):
+        self._reviewers: dict[int, ReviewerModel] | None = None
+        self._stale: set[int] = set()
+        self._lock = asyncio.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def loaded(self) -> bool:
+        return self._reviewers is not None
+
+    async def load(self) -> None:
+        async with self._lock:
+            async with get_users_db(readonly=True) as session:
+                result = await session.execute(select(ReviewerModel))
+                self._reviewers = {r.user_id: r for r in result.scalars().all()}
+            self._stale.clear()
+        db_logger.info(f"Reviewer registry loaded, {len(self._reviewers)} reviewers.")
+
+    def invalidate(self, user_id: int | None = None) -> None:
+        """
+        使缓存失效，不指定 user_id 时整体失效，下次访问时重新从数据库加载
+        """
+        if user_id is None:
+            self._reviewers = None
+            self._stale.clear()
+        elif self._reviewers is not None:
+            self._reviewers.pop(user_id, None)
+            self._stale.add(user_id)
+
+    async def get(self, user_id: int) -> ReviewerModel | None:
+        if self._reviewers is None:
+            self.misses += 1
+            await self.load()
+        elif user_id in self._stale:
+            self.misses += 1
+            async with get_users_db(readonly=True) as session:
+                result = await session.execute(select(ReviewerModel).filter_by(user_id=user_id))
+                reviewer = result.scalar_one_or_none()
+            self._stale.discard(user_id)
+            if reviewer:
+                self._reviewers[user_id] = reviewer
+        else:
+            self.hits += 1
+        return self._reviewers.get(user_id)
+
+    async def get_many(self, user_ids) -> dict[int, ReviewerModel]:
+        """
+        批量获取，缓存失效的部分用一次 IN 查询补齐
+        """
+        user_ids = set(user_ids)
+        if self._reviewers is None:
+            self.misses += len(user_ids)
+            await self.load()
+        else:
+            stale = user_ids & self._stale
+            self.hits += len(user_ids) - len(stale)
+            if stale:
+                self.misses += len(stale)
+                async with get_users_db(readonly=True) as session:
+                    result = await session.execute(select(ReviewerModel).where(ReviewerModel.user_id.in_(stale)))
+                    for reviewer in result.scalars().all():
+                        self._reviewers[reviewer.user_id] = reviewer
+                self._stale -= stale
+        return {uid: self._reviewers[uid] for uid in user_ids if uid in self._reviewers}
+
+    async def is_reviewer(self, user_id: int) -> bool:
+        return await self.get(user_id) is not None
+
+    def add(self, reviewer: ReviewerModel) -> None:
+        if self._reviewers is not None:
+            self._reviewers[reviewer.user_id] = reviewer
+            self._stale.discard(reviewer.user_id)
+
+    def remove(self, user_id: int) -> None:
+        if self._reviewers is not None:
+            self._reviewers.pop(user_id, None)
+            self._stale.discard(user_id)
+
+    def stats(self) -> dict:
+        return {
+            "reviewers": len(self._reviewers) if self._reviewers is not None else None,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+REVIEWER_REGISTRY = ReviewerRegistry()
+
+
+class BanList:
+    """
+    封禁名单的内存缓存，由 /ban /unban 保持一致
+    """
+
+    def __init__(self):
+        self._banned: set[int] | None = None
+        self._lock = asyncio.Lock()
+
+    async def load(self) -> None:
+        async with self._lock:
+            async with get_users_db(readonly=True) as session:
+                result = await session.execute(select(BannedUserModel.user_id))
+                self._banned = set(result.scalars().all())
+        db_logger.info(f"Ban list loaded, {len(self._banned)} users.")
+
+    async def is_banned(self, user_id: int) -> bool:
+        if self._banned is None:
+            await self.load()
+        return user_id in self._banned
+
+    def add(self, user_id: int) -> None:
+        if self._banned is not None:
+            self._banned.add(user_id)
+
+    def discard(self, user_id: int) -> None:
+        if self._banned is not None:
+            self._banned.discard(user_id)
+
+    def stats(self) -> dict:
+        return {"banned": len(self._banned) if self._banned is not None else None}
+
+
+class SubmitterProfileCache:
+    """
+    投稿者资料缓存，只有用户名/全名变化时才写入，写入攒批后定期在一个事务中刷新
+    最多缓存 max_size 个最近出现的投稿者，被淘汰的投稿者再次出现时会重新写入一次
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._profiles: OrderedDict[int, tuple[str | None, str | None]] = OrderedDict()
+        self._dirty: dict[int, tuple[str | None, str | None]] = {}
+        self._task: asyncio.Task | None = None
+        self.writes = 0
+        self.flushes = 0
+
+    def touch(self, user_id: int, username: str | None, fullname: str | None) -> bool:
+        profile = (username, fullname)
+        if self._profiles.get(user_id) == profile:
+            self._profiles.move_to_end(user_id)
+            return False
+        self._profiles[user_id] = profile
+        self._profiles.move_to_end(user_id)
+        if len(self._profiles) > self.max_size:
+            # 尚未写入的资料仍在 _dirty 中
+            self._profiles.popitem(last=False)
+        self._dirty[user_id] = profile
+        return True
+
+    def get(self, user_id: int) -> tuple[str | None, str | None] | None:
+        return self._dirty.get(user_id) or self._profiles.get(user_id)
+
+    def take(self) -> dict[int, tuple[str | None, str | None]]:
+        """
+        取出尚未写入的资料，写入失败时由调用者 restore
+        """
+        dirty, self._dirty = self._dirty, {}
+        return dirty
+
+    def restore(self, dirty: dict[int, tuple[str | None, str | None]]) -> None:
+        # 写入失败时放回，较新的资料优先
+        for uid, profile in dirty.items():
+            self._dirty.setdefault(uid, profile)
+
+    def flushed(self, dirty: dict[int, tuple[str | None, str | None]]) -> None:
+        if dirty:
+            self.writes += len(dirty)
+            self.flushes += 1
+
+    @staticmethod
+    def build_statements(dirty: dict[int, tuple[str | None, str | None]]) -> list:
+        if not dirty:
+            return []
+        stmt = insert(SubmitterModel).values(
+            [{"user_id": uid, "username": username, "fullname": fullname}
+             for uid, (username, fullname) in dirty.items()])
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[SubmitterModel.user_id],
+            set_={"username": stmt.excluded.username, "fullname": stmt.excluded.fullname})
+        return [(stmt, None)]
+
+    async def flush(self) -> None:
+        """
+        写入尚未刷新的资料，失败时放回并抛出异常
+        """
+        dirty = self.take()
+        if not dirty:
+            return
+        statements = self.build_statements(dirty)
+
+        async def operation(session: AsyncSession):
+            for stmt, _ in statements:
+                await session.execute(stmt)
+
+        try:
+            await USERS_WRITER.submit(operation)
+        except Exception:
+            self.restore(dirty)
+            raise
+        self.flushed(dirty)
+
+    async def _run(self, interval: float) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                db_logger.error(f"Error flushing submitter profiles: {e}")
+
+    def start(self, interval: float) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(interval))
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        try:
+            await self.flush()
+        except Exception as e:
+            db_logger.error(f"Error flushing submitter profiles: {e}")
+
+    def stats(self) -> dict:
+        return {
+            "cached": len(self._profiles),
+            "dirty": len(self._dirty),
+            "writes": self.writes,
+            "flushes": self.flushes,
+        }
+
+
+USER_COUNTERS = CounterBuffer()
+BAN_LIST = BanList()
+SUBMITTER_PROFILES = SubmitterProfileCache(Config.PROFILE_CACHE_MAX)
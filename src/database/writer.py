@@ -0,0 +1,141 @@
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, TypeVar
+
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from src.database.unit_of_work import CURRENT_UNIT, current_unit
+from src.logger import db_logger
+
+T = TypeVar("T")
+
+Operation = Callable[[AsyncSession], Awaitable[Any]]
+
+
+class WriteQueue:
+    """
+    单写者组提交队列
+    并发提交的写操作在一个短窗口内(或凑满 max_batch 个)合并为一个事务，
+    每个操作运行在自己的 SAVEPOINT 中，单个操作失败不影响同批的其他操作，
+    调用者在整批提交后才拿到结果
+    """
+
+    def __init__(self, name: str, session_factory: async_sessionmaker, window: float, max_batch: int):
+        self.name = name
+        self._session_factory = session_factory
+        self.window = window
+        self.max_batch = max_batch
+        self._queue: asyncio.Queue | None = None
+        self._task: asyncio.Task | None = None
+        self.batches = 0
+        self.operations = 0
+        self.failed = 0
+        self.largest_batch = 0
+        self.commit_ms_total = 0.0
+        self.commit_ms_max = 0.0
+
+    async def submit(self, operation: Callable[[AsyncSession], Awaitable[T]]) -> T:
+        """
+        提交一个写操作，operation 只能做数据库操作，不能再向同一个队列提交
+        """
+        if self._task is None or self._task.done():
+            self._queue = asyncio.Queue()
+            self._task = asyncio.create_task(self._run())
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((operation, future))
+        result = await future
+        if unit := current_unit():
+            unit.written()
+        return result
+
+    async def stop(self) -> None:
+        """
+        提交队列中剩余的操作后退出
+        """
+        if self._task is None:
+            return
+        if not self._task.done():
+            self._queue.put_nowait(None)
+            await self._task
+        self._task = None
+
+    async def _run(self) -> None:
+        # 任务继承了第一个提交者的上下文，批量写入不计入它的 UnitOfWork
+        CURRENT_UNIT.set(None)
+        loop = asyncio.get_running_loop()
+        while True:
+            item = await self._queue.get()
+            if item is None:
+                return
+            batch = [item]
+            stopping = False
+            deadline = loop.time() + self.window
+            while len(batch) < self.max_batch:
+                if self._queue.empty():
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        item = await asyncio.wait_for(self._queue.get(), timeout)
+                    except asyncio.TimeoutError:
+                        break
+                else:
+                    item = self._queue.get_nowait()
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+            await self._commit(batch)
+            if stopping:
+                return
+
+    async def _commit(self, batch: list[tuple[Operation, asyncio.Future]]) -> None:
+        started = time.perf_counter()
+        results = []
+        try:
+            async with self._session_factory() as session:
+                async with session.begin():
+                    for operation, future in batch:
+                        if future.done():
+                            # 调用者已取消
+                            results.append(None)
+                            continue
+                        try:
+                            async with session.begin_nested():
+                                results.append((True, await operation(session)))
+                        except Exception as e:
+                            results.append((False, e))
+        except Exception as e:
+            db_logger.error(f"Write batch on {self.name} failed to commit: {e}")
+            self.failed += len(batch)
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        elapsed = (time.perf_counter() - started) * 1000
+        self.batches += 1
+        self.operations += len(batch)
+        self.largest_batch = max(self.largest_batch, len(batch))
+        self.commit_ms_total += elapsed
+        self.commit_ms_max = max(self.commit_ms_max, elapsed)
+        for (_, future), result in zip(batch, results):
+            if result is None or future.done():
+                continue
+            ok, value = result
+            if ok:
+                future.set_result(value)
+            else:
+                self.failed += 1
+                future.set_exception(value)
+
+    def stats(self) -> dict:
+        return {
+            "batches": self.batches,
+            "operations": self.operations,
+            "failed": self.failed,
+            "avg_batch": round(self.operations / self.batches, 2) if self.batches else 0,
+            "largest_batch": self.largest_batch,
+            "avg_commit_ms": round(self.commit_ms_total / self.batches, 2) if self.batches else 0,
+            "max_commit_ms": round(self.commit_ms_max, 2),
+            "queued": self._queue.qsize() if self._queue else 0,
+        }
@@ -0,0 +1,11 @@
+"""
+近似重复投稿检测(MinHash/LSH)
+索引模块导入时即建库，这里按需导入，python -m src.dedup bench 可以先把数据目录切换到临时目录
+"""
+
+
+def __getattr__(name: str):
+    if name in ("NEAR_DUPLICATES", "NearDuplicateIndex"):
+        from src.dedup import index
+        return getattr(index, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
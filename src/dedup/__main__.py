@@ -0,0 +1,105 @@
+"""
+python -m src.dedup backfill [--batch-size N]    为已有稿件补写签名
+python -m src.dedup query 文字 [--threshold T]   查找相似稿件
+python -m src.dedup bench [--sizes N ...]        测量查询延迟随语料规模的变化
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+from src.config import Config, Config_submit
+from src.dedup.minhash import lsh_threshold
+
+# 常用汉字区间，用于生成测试语料
+CJK_START, CJK_END = 0x4E00, 0x4E00 + 3000
+
+
+def random_text(rng: random.Random) -> str:
+    return "".join(chr(rng.randint(CJK_START, CJK_END)) for _ in range(rng.randint(30, 150)))
+
+
+def mutate(rng: random.Random, source: str) -> str:
+    """
+    模拟改了几个字并加上转发来源的重复稿件
+    """
+    chars = list(source)
+    for _ in range(max(1, len(chars) // 20)):
+        chars[rng.randrange(len(chars))] = chr(rng.randint(CJK_START, CJK_END))
+    return "".join(chars) + "\n\n<i>from</i> <a href='https://t.me/example'>某频道</a>"
+
+
+async def bench(sizes: list[int], queries: int, threshold: float) -> None:
+    """
+    调用前 Config.DATABASES_DIR 已指向临时目录，索引模块导入时在其中建库
+    """
+    from src.dedup.index import ENGINE, READ_ENGINE, NearDuplicateIndex
+
+    rng = random.Random(0)
+    index = NearDuplicateIndex(ENGINE, READ_ENGINE)
+    corpus = []
+    print(f"LSH threshold ≈ {lsh_threshold():.2f}, Jaccard threshold {threshold}")
+    print(f"{'posts':>8} {'insert/post':>12} {'p50':>8} {'p95':>8} {'candidates':>11} {'recall':>7}")
+    for size in sorted(sizes):
+        started = time.perf_counter()
+        previous = len(corpus)
+        batch = []
+        while len(corpus) < size:
+            corpus.append(random_text(rng))
+            batch.append((len(corpus), corpus[-1]))
+            if len(batch) == 1000 or len(corpus) == size:
+                await index.add_many(batch)
+                batch = []
+        insert_ms = (time.perf_counter() - started) * 1000 / max(size - previous, 1)
+        latencies, found, candidates_before = [], 0, index.candidates
+        for _ in range(queries):
+            post_id = rng.randint(1, size)
+            started = time.perf_counter()
+            matches = await index.query(mutate(rng, corpus[post_id - 1]), threshold)
+            latencies.append((time.perf_counter() - started) * 1000)
+            found += any(match_id == post_id for match_id, _ in matches)
+        latencies.sort()
+        print(f"{size:>8} {insert_ms:>10.2f}ms {statistics.median(latencies):>6.2f}ms "
+              f"{latencies[int(len(latencies) * 0.95) - 1]:>6.2f}ms "
+              f"{(index.candidates - candidates_before) / queries:>11.1f} {found / queries:>7.2%}")
+    await ENGINE.dispose()
+    await READ_ENGINE.dispose()
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog="python -m src.dedup", description="近似重复投稿索引")
+    commands = parser.add_subparsers(dest="command", required=True)
+    backfill_parser = commands.add_parser("backfill", help="为已有稿件补写签名")
+    backfill_parser.add_argument("--batch-size", type=int, default=500)
+    query_parser = commands.add_parser("query", help="查找相似稿件")
+    query_parser.add_argument("text")
+    query_parser.add_argument("--threshold", type=float, default=Config_submit.NEAR_DUPLICATE_THRESHOLD)
+    bench_parser = commands.add_parser("bench", help="测量查询延迟")
+    bench_parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 50000])
+    bench_parser.add_argument("--queries", type=int, default=200)
+    bench_parser.add_argument("--threshold", type=float, default=Config_submit.NEAR_DUPLICATE_THRESHOLD)
+    return parser.parse_args()
+
+
+async def main(args: argparse.Namespace) -> None:
+    from src.dedup import NEAR_DUPLICATES
+
+    if args.command == "backfill":
+        print(f"{await NEAR_DUPLICATES.backfill(args.batch_size)} posts indexed.")
+    else:
+        for post_id, score in await NEAR_DUPLICATES.query(args.text, args.threshold, limit=20):
+            print(f"{post_id}  {score:.2f}")
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.command == "bench":
+        # 必须在导入任何建库的模块之前切换目录，压测不会碰到正式数据库
+        with tempfile.TemporaryDirectory() as directory:
+            Config.DATABASES_DIR = Path(directory)
+            asyncio.run(bench(args.sizes, args.queries, args.threshold))
+    else:
+        asyncio.run(main(args))
@@ -0,0 +1,161 @@
+import time
+from array import array
+
+from sqlalchemy import Integer, LargeBinary, bindparam, select, text
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.ext.asyncio import AsyncAttrs, AsyncEngine, async_sessionmaker
+from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
+
+from src.database import create_database, create_async_engines
+from src.database.archive import ArchiveReadSessionFactory
+from src.database.migrations import HotQuery
+from src.database.posts import PostModel, PostsReadSessionFactory
+from src.database.unit_of_work import read_session
+from src.dedup.minhash import band_keys, from_bytes, shingles, signature, similarity, to_bytes
+from src.logger import db_logger
+
+
+class DedupBase(AsyncAttrs, DeclarativeBase):
+    pass
+
+
+class SignatureModel(DedupBase):
+    """稿件文字的 MinHash 签名"""
+    __tablename__ = "minhash_signatures"
+    post_id: Mapped[int] = mapped_column(Integer, primary_key=True, comment='稿件id')
+    signature: Mapped[bytes] = mapped_column(LargeBinary, comment='签名 uint32 数组(小端)')
+    created_at: Mapped[int] = mapped_column(Integer, nullable=True, comment='写入时间')
+
+
+class BucketModel(DedupBase):
+    """LSH 桶，每个签名每段一行"""
+    __tablename__ = "minhash_buckets"
+    bucket: Mapped[int] = mapped_column(Integer, primary_key=True, comment='桶编号')
+    post_id: Mapped[int] = mapped_column(Integer, primary_key=True, comment='稿件id')
+
+    __table_args__ = {"sqlite_with_rowid": False}
+
+
+CANDIDATE_QUERY = text(
+    "SELECT s.post_id, s.signature FROM minhash_signatures AS s "
+    "WHERE s.post_id IN (SELECT DISTINCT post_id FROM minhash_buckets WHERE bucket IN :buckets) "
+    "AND s.post_id != :exclude_post_id"
+).bindparams(bindparam("buckets", expanding=True))
+
+
+class NearDuplicateIndex:
+    """
+    近似重复文字索引，签名与桶持久化在 dedup.db 中，启动时无需重建
+    查询时先取与新稿件任意一段签名相同的候选，再用完整签名估计相似度
+    """
+
+    def __init__(self, write_engine: AsyncEngine, read_engine: AsyncEngine):
+        self._session_factory = async_sessionmaker(bind=write_engine, expire_on_commit=False)
+        self._read_engine = read_engine
+        self._read_session_factory = async_sessionmaker(bind=read_engine, expire_on_commit=False)
+        self.added = 0
+        self.queries = 0
+        self.candidates = 0
+        self.query_ms_total = 0.0
+        self.query_ms_max = 0.0
+
+    @staticmethod
+    def _rows(post_id: int, sig: array) -> tuple[dict, list[dict]]:
+        return ({"post_id": post_id, "signature": to_bytes(sig), "created_at": int(time.time())},
+                [{"bucket": key, "post_id": post_id} for key in band_keys(sig)])
+
+    async def add_many(self, posts: list[tuple[int, str | None]]) -> int:
+        """
+        为 [(稿件id, 文字)] 写入签名，已存在的覆盖，返回写入的数量
+        """
+        signatures, buckets = [], []
+        for post_id, post_text in posts:
+            sig = signature(shingles(post_text))
+            if not sig:
+                continue
+            signature_row, bucket_rows = self._rows(post_id, sig)
+            signatures.append(signature_row)
+            buckets.extend(bucket_rows)
+        if not signatures:
+            return 0
+        async with self._session_factory() as session:
+            async with session.begin():
+                await session.execute(insert(SignatureModel).prefix_with("OR REPLACE"), signatures)
+                await session.execute(insert(BucketModel).prefix_with("OR IGNORE"), buckets)
+        self.added += len(signatures)
+        return len(signatures)
+
+    async def add(self, post_id: int, post_text: str | None) -> bool:
+        return await self.add_many([(post_id, post_text)]) > 0
+
+    async def query(self, post_text: str | None, threshold: float, exclude_post_id: int | None = None,
+                    limit: int = 5) -> list[tuple[int, float]]:
+        """
+        查找估计相似度不低于 threshold 的稿件，返回 [(稿件id, 相似度)]，按相似度从高到低排列
+        """
+        started = time.perf_counter()
+        sig = signature(shingles(post_text))
+        if not sig:
+            return []
+        params = {"buckets": band_keys(sig), "exclude_post_id": -1 if exclude_post_id is None else exclude_post_id}
+        async with read_session("dedup", self._read_session_factory) as session:
+            rows = (await session.execute(CANDIDATE_QUERY, params)).all()
+        matches = []
+        for post_id, blob in rows:
+            score = similarity(sig, from_bytes(blob))
+            if score >= threshold:
+                matches.append((post_id, score))
+        matches.sort(key=lambda m: (-m[1], -m[0]))
+        elapsed = (time.perf_counter() - started) * 1000
+        self.queries += 1
+        self.candidates += len(rows)
+        self.query_ms_total += elapsed
+        self.query_ms_max = max(self.query_ms_max, elapsed)
+        return matches[:limit]
+
+    async def backfill(self, batch_size: int = 500) -> int:
+        """
+        为热库与归档库中尚未建立签名的稿件补写签名，可以重复执行，返回写入的数量
+        """
+        total = 0
+        for session_factory in (PostsReadSessionFactory, ArchiveReadSessionFactory):
+            after_id = 0
+            while True:
+                async with session_factory() as session:
+                    result = await session.execute(
+                        select(PostModel.id, PostModel.text)
+                        .where(PostModel.id > after_id)
+                        .order_by(PostModel.id)
+                        .limit(batch_size))
+                    posts = [tuple(row) for row in result.all()]
+                if not posts:
+                    break
+                after_id = posts[-1][0]
+                async with self._read_engine.connect() as connection:
+                    indexed = set((await connection.execute(
+                        select(SignatureModel.post_id)
+                        .where(SignatureModel.post_id.in_([post_id for post_id, _ in posts])))).scalars())
+                total += await self.add_many([post for post in posts if post[0] not in indexed])
+        db_logger.info(f"Backfilled {total} MinHash signatures.")
+        return total
+
+    def stats(self) -> dict:
+        return {
+            "added": self.added,
+            "queries": self.queries,
+            "avg_candidates": round(self.candidates / self.queries, 2) if self.queries else 0,
+            "avg_query_ms": round(self.query_ms_total / self.queries, 2) if self.queries else 0,
+            "max_query_ms": round(self.query_ms_max, 2),
+        }
+
+
+HOT_QUERIES = [
+    HotQuery("near duplicate candidates",
+             "SELECT s.post_id, s.signature FROM minhash_signatures AS s WHERE s.post_id IN "
+             "(SELECT DISTINCT post_id FROM minhash_buckets WHERE bucket IN (:a, :b)) AND s.post_id != :post_id",
+             {"a": 1, "b": 2, "post_id": 0}),
+]
+
+create_database("dedup", DedupBase, hot_queries=HOT_QUERIES)
+ENGINE, READ_ENGINE = create_async_engines("dedup")
+NEAR_DUPLICATES = NearDuplicateIndex(ENGINE, READ_ENGINE)
@@ -0,0 +1,97 @@
+"""
+MinHash 签名与 LSH 分桶
+文字先按 fingerprint.normalize_text 归一化，再取字符 n-gram 作为集合元素(中文没有分词，按字符切分)
+两个签名中相同位置取值相同的比例即 Jaccard 相似度的估计值；签名按 BANDS 段分桶，任意一段完全相同的稿件成为候选
+签名是 NUM_PERM 个 uint32，统一按小端存储与参与分桶，与平台无关
+修改以下常量后已有的签名全部失效，需要清空 dedup.db 后重新回填
+"""
+import hashlib
+import sys
+from array import array
+
+from src.database.fingerprint import normalize_text
+
+SHINGLE_SIZE = 3
+NUM_PERM = 128
+BANDS = 32
+ROWS = NUM_PERM // BANDS
+
+
+def _uint32_typecode() -> str:
+    # array 的 "I" 只保证至少 2 字节，按实际宽度选择
+    for typecode in ("I", "L"):
+        if array(typecode).itemsize == 4:
+            return typecode
+    raise RuntimeError("No 4-byte unsigned array type on this platform")
+
+
+UINT32 = _uint32_typecode()
+BIG_ENDIAN = sys.byteorder == "big"
+
+
+def from_bytes(data: bytes) -> array:
+    """
+    小端字节串转为 uint32 数组
+    """
+    values = array(UINT32, data)
+    if BIG_ENDIAN:
+        values.byteswap()
+    return values
+
+
+def to_bytes(sig: array) -> bytes:
+    """
+    uint32 数组转为小端字节串
+    """
+    if BIG_ENDIAN:
+        sig = array(UINT32, sig)
+        sig.byteswap()
+    return sig.tobytes()
+
+
+def shingles(text: str | None) -> set[bytes]:
+    """
+    归一化后按字符 n-gram 切分
+    """
+    normalized = normalize_text(text)
+    if len(normalized) <= SHINGLE_SIZE:
+        return {normalized.encode()} if normalized else set()
+    return {normalized[i:i + SHINGLE_SIZE].encode() for i in range(len(normalized) - SHINGLE_SIZE + 1)}
+
+
+def signature(items: set[bytes]) -> array:
+    """
+    计算 MinHash 签名，空集合返回空签名
+    SHAKE-128 的输出每 4 字节(小端)视为一个独立的哈希函数，逐位取最小值都在 C 中完成
+    """
+    if not items:
+        return array(UINT32)
+    hashes = [from_bytes(hashlib.shake_128(item).digest(NUM_PERM * 4)) for item in items]
+    return array(UINT32, map(min, *hashes)) if len(hashes) > 1 else hashes[0]
+
+
+def similarity(left: array, right: array) -> float:
+    """
+    由两个签名估计 Jaccard 相似度
+    """
+    if not left or len(left) != len(right):
+        return 0.0
+    return sum(1 for x, y in zip(left, right) if x == y) / len(left)
+
+
+def band_keys(sig: array) -> list[int]:
+    """
+    签名每段的桶编号，段序号参与哈希，不同段的相同取值不会落入同一个桶
+    """
+    keys = []
+    for band in range(BANDS):
+        data = band.to_bytes(1, "little") + to_bytes(sig[band * ROWS:(band + 1) * ROWS])
+        keys.append(int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), "little", signed=True))
+    return keys
+
+
+def lsh_threshold() -> float:
+    """
+    LSH 的近似阈值，相似度低于此值的稿件很难成为候选
+    """
+    return (1 / BANDS) ** (1 / ROWS)
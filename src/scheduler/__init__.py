@@ -1,20 +1,75 @@
-"""
-定时任务
-"""
-
-from apscheduler.schedulers.asyncio import AsyncIOScheduler
-from apscheduler.schedulers.background import BackgroundScheduler
-
-from .clean import clean_memory, sync_database
-from ..logger import scheduler_logger
-
-
-def start_scheduler():
-    scheduler_logger.info("Starting scheduler...")
-    scheduler = BackgroundScheduler()
-    scheduler.add_job(clean_memory, 'cron', hour=2, minute=30, second=0)
-    scheduler.start()
-
-    async_scheduler = AsyncIOScheduler()
-    async_scheduler.add_job(sync_database, 'cron', hour=3, minute=30, second=0)
-    async_scheduler.start()
+"""
+定时任务
+"""
+import time
+from typing import Any, Awaitable, Callable
+
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
+
+from src.config import DatabaseConfig
+from .clean import checkpoint_wal, optimize_database, archive_posts, prune_outbox, backup_databases, clean_memory
+from ..logger import scheduler_logger
+
+
+class MaintenanceScheduler:
+    """
+    在机器人的事件循环中运行维护任务，随应用启动和关闭，并记录每个任务的耗时
+    """
+
+    def __init__(self):
+        self._scheduler: AsyncIOScheduler | None = None
+        self.jobs: dict[str, dict] = {}
+
+    def _timed(self, job: Callable[[], Awaitable[Any]], quiet: bool) -> Callable[[], Awaitable[None]]:
+        name = job.__name__
+        stats = self.jobs.setdefault(name, {"runs": 0, "failures": 0, "last_ms": 0.0, "max_ms": 0.0,
+                                            "last_run_at": 0, "last_result": None})
+
+        async def run():
+            started = time.perf_counter()
+            try:
+                stats["last_result"] = await job()
+            except Exception as e:
+                stats["failures"] += 1
+                stats["last_result"] = repr(e)
+                scheduler_logger.error(f"Job {name} failed: {e}")
+            elapsed = (time.perf_counter() - started) * 1000
+            stats["runs"] += 1
+            stats["last_ms"] = round(elapsed, 2)
+            stats["max_ms"] = round(max(stats["max_ms"], elapsed), 2)
+            stats["last_run_at"] = int(time.time())
+            (scheduler_logger.debug if quiet else scheduler_logger.info)(f"Job {name} finished in {elapsed:.0f} ms.")
+
+        return run
+
+    def add_job(self, job: Callable[[], Awaitable[Any]], trigger: str, quiet: bool = False, **trigger_args) -> None:
+        self._scheduler.add_job(self._timed(job, quiet), trigger, id=job.__name__, coalesce=True,
+                                max_instances=1, **trigger_args)
+
+    def start(self) -> None:
+        """
+        需要在事件循环中调用(post_init)
+        """
+        scheduler_logger.info("Starting scheduler...")
+        self._scheduler = AsyncIOScheduler()
+        hour = DatabaseConfig.MAINTENANCE_HOUR
+        self.add_job(checkpoint_wal, 'interval', quiet=True, seconds=DatabaseConfig.CHECKPOINT_INTERVAL)
+        self.add_job(archive_posts, 'cron', hour=hour, minute=0)
+        self.add_job(prune_outbox, 'cron', hour=hour, minute=15)
+        self.add_job(optimize_database, 'cron', hour=hour, minute=30)
+        self.add_job(clean_memory, 'cron', hour=hour, minute=45)
+        self.add_job(backup_databases, 'cron', hour=hour + 1, minute=0)
+        self._scheduler.start()
+
+    def stop(self) -> None:
+        if self._scheduler is not None and self._scheduler.running:
+            self._scheduler.shutdown(wait=False)
+        self._scheduler = None
+
+    def stats(self) -> dict:
+        return {name: f"runs={s['runs']} failures={s['failures']} last={s['last_ms']}ms max={s['max_ms']}ms "
+                      f"result={s['last_result']}"
+                for name, s in self.jobs.items()}
+
+
+SCHEDULER = MaintenanceScheduler()
@@ -1,30 +1,112 @@
-from sqlalchemy import text
-
-from src.database.posts import get_post_db
-from src.database.users import get_users_db
-from src.logger import scheduler_logger
-
-
-async def sync_database():
-    """
-    清理/同步/提交WAL更改
-    """
-    async with get_users_db() as session:
-        await session.execute(text('PRAGMA wal_checkpoint(FULL)'))
-        await session.execute(text('PRAGMA optimize'))
-        await session.commit()
-
-    async with get_post_db() as session:
-        await session.execute(text('PRAGMA wal_checkpoint(FULL)'))
-        await session.execute(text('PRAGMA optimize'))
-        await session.commit()
-
-    scheduler_logger.info("Database synchronized and WAL changes committed.")
-
-def clean_memory():
-    """
-    清理内存
-    """
-    import gc
-    gc.collect()
-    scheduler_logger.info("Memory cleaned.")
\ No newline at end of file
+import asyncio
+import gc
+import os
+import time
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from src.config import DatabaseConfig
+from src.database.archive import POST_ARCHIVE, ENGINE as ARCHIVE_ENGINE
+from src.database.backup import DATABASE_BACKUP
+from src.database.posts import ENGINE as POSTS_ENGINE, PostOperation, POSTS_WRITER
+from src.database.users import ENGINE as USERS_ENGINE
+from src.dedup.index import ENGINE as DEDUP_ENGINE
+from src.logger import scheduler_logger
+
+ENGINES = {"posts": POSTS_ENGINE, "users": USERS_ENGINE, "archive": ARCHIVE_ENGINE, "dedup": DEDUP_ENGINE}
+
+
+async def _pragma(engine: AsyncEngine, sql: str):
+    # 检查点、VACUUM 等不能在事务中执行
+    async with engine.connect() as connection:
+        connection = await connection.execution_options(isolation_level="AUTOCOMMIT")
+        result = await connection.execute(text(sql))
+        return result.first() if result.returns_rows else None
+
+
+async def _incremental_vacuum(engine: AsyncEngine, pages: int) -> None:
+    async with engine.connect() as connection:
+        connection = await connection.execution_options(isolation_level="AUTOCOMMIT")
+        raw = await connection.get_raw_connection()
+        # 驱动对没有结果列的语句只执行一步(只释放一页)，executescript 会执行到底
+        await raw.driver_connection.executescript(f"PRAGMA incremental_vacuum({int(pages)})")
+
+
+def wal_size(engine: AsyncEngine) -> int:
+    path = f"{engine.url.database}-wal"
+    return os.path.getsize(path) if os.path.exists(path) else 0
+
+
+async def checkpoint_wal() -> dict:
+    """
+    按 WAL 文件大小执行检查点：平时 PASSIVE 不等待读写，过大时 TRUNCATE 截断文件
+    """
+    result = {}
+    for name, engine in ENGINES.items():
+        size = wal_size(engine)
+        if size == 0:
+            continue
+        mode = "TRUNCATE" if size >= DatabaseConfig.WAL_TRUNCATE_SIZE else "PASSIVE"
+        busy, log, checkpointed = await _pragma(engine, f"PRAGMA wal_checkpoint({mode})")
+        result[name] = f"{mode} {size // 1024}KiB {checkpointed}/{log}{' busy' if busy else ''}"
+        if mode == "TRUNCATE":
+            scheduler_logger.info(f"WAL of {name}.db reached {size} bytes, truncated: {result[name]}")
+    return result
+
+
+async def optimize_database() -> dict:
+    """
+    低峰时段更新查询统计信息并分步回收空闲页
+    """
+    result = {}
+    for name, engine in ENGINES.items():
+        await _pragma(engine, "PRAGMA optimize")
+        auto_vacuum = (await _pragma(engine, "PRAGMA auto_vacuum"))[0]
+        if auto_vacuum != 2:
+            # 旧库需要停机后执行 python -m src.database vacuum 切换为增量模式，这里不做完整 VACUUM
+            result[name] = "not incremental"
+            continue
+        freed = 0
+        while (free := (await _pragma(engine, "PRAGMA freelist_count"))[0]) > 0:
+            await _incremental_vacuum(engine, DatabaseConfig.VACUUM_STEP_PAGES)
+            freed += min(free, DatabaseConfig.VACUUM_STEP_PAGES)
+            # 每步单独提交，让写队列有机会插入
+            await asyncio.sleep(0)
+        result[name] = f"freed {freed} pages"
+    return result
+
+
+async def archive_posts() -> int:
+    """
+    归档已完成的旧稿件
+    """
+    return await POST_ARCHIVE.run(DatabaseConfig.ARCHIVE_AFTER_DAYS, DatabaseConfig.ARCHIVE_BATCH_SIZE)
+
+
+async def prune_outbox() -> int:
+    """
+    分批删除已完成的旧发布/通知任务
+    """
+    before = int(time.time()) - DatabaseConfig.OUTBOX_KEEP_DAYS * 86400
+    total = 0
+    while True:
+        deleted = await POSTS_WRITER.submit(
+            lambda session: PostOperation.prune_outbox(session, before, DatabaseConfig.ARCHIVE_BATCH_SIZE))
+        total += deleted
+        if deleted < DatabaseConfig.ARCHIVE_BATCH_SIZE:
+            return total
+
+
+async def backup_databases() -> list:
+    """
+    在线备份数据库
+    """
+    return [path.name for path in await DATABASE_BACKUP.run()]
+
+
+async def clean_memory() -> int:
+    """
+    清理内存
+    """
+    return gc.collect()
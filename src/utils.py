@@ -1,322 +1,638 @@
-import json
-import time
-
-from sqlalchemy import select
-from telegram import InputMediaAudio, InputMediaDocument, InputMediaPhoto, InputMediaVideo, \
-    InlineKeyboardButton, InlineKeyboardMarkup
-from telegram.ext import ContextTypes
-
-from src.config import ReviewConfig
-from src.database.posts import PostModel, PostStatus, get_post_db, PostLogModel, VoteType
-from src.database.users import UserOperation, SubmitterModel, get_users_db
-
-MEDIA_GROUPS = {}
-
-MEDIA_GROUP_TYPES = {
-    "audio": InputMediaAudio,
-    "document": InputMediaDocument,
-    "photo": InputMediaPhoto,
-    "video": InputMediaVideo,
-}
-
-
-def get_media_group(media_group_id: str):
-    return MEDIA_GROUPS.get(media_group_id, [])
-
-
-def clear_media_group(media_group_id: str):
-    MEDIA_GROUPS.pop(media_group_id, None)
-
-
-def clear_all_media_groups():
-    MEDIA_GROUPS.clear()
-
-
-def generate_review_keyboard(post_id: str, ) -> InlineKeyboardMarkup:
-    return InlineKeyboardMarkup(
-        [
-            [
-                InlineKeyboardButton(
-                    "🟢 通过",
-                    callback_data=f"v3.0.approve_{post_id}",
-                ),
-                InlineKeyboardButton(
-                    "🟡 以 NSFW 通过",
-                    callback_data=f"v3.0.approve_{post_id}_NSFW",
-                ),
-            ],
-            [
-                InlineKeyboardButton(
-                    "🔴 拒绝",
-                    callback_data=f"v3.0.reject_{post_id}",
-                ),
-                InlineKeyboardButton(
-                    "🔴 以重复投稿拒绝",
-                    callback_data=f"v3.0.rejectDuplicate_{post_id}",
-                ),
-            ],
-            [
-                InlineKeyboardButton(
-                    "❔ 查询我的投票",
-                    callback_data=f"v3.0.voteQuery_{post_id}",
-                ),
-                InlineKeyboardButton(
-                    "↩️ 撤回我的投票",
-                    callback_data=f"v3.0.voteRevoke_{post_id}",
-                ),
-            ],
-            [
-                InlineKeyboardButton(
-                    "📝 添加备注",
-                    switch_inline_query_current_chat=f"v3.0.append_{post_id}# ",
-                ),
-                InlineKeyboardButton(
-                    "⬅️ 删除备注",
-                    switch_inline_query_current_chat=f"v3.0.removeAppend_{post_id}",
-                ),
-            ],
-            [
-                InlineKeyboardButton(
-                    "💬 回复投稿人",
-                    switch_inline_query_current_chat=f"v3.0.reply_{post_id}# ",
-                ),
-            ],
-        ]
-    )
-
-
-def generate_reject_keyboard(post_id: str, ) -> InlineKeyboardMarkup:
-    keyboard = []
-    reason = ReviewConfig.REJECTION_REASON
-    for i in range(0, len(reason), 2):
-        row = [InlineKeyboardButton(reason[i], callback_data=f"reason_{post_id}_{i}")]
-        if i + 1 < len(reason):
-            row.append(InlineKeyboardButton(reason[i + 1], callback_data=f"reason_{post_id}_{i + 1}"))
-        keyboard.append(row)
-    keyboard.append(
-        [
-            InlineKeyboardButton(
-                "自定义理由",
-                switch_inline_query_current_chat=f"customReason_{post_id}# ",
-            ),
-            InlineKeyboardButton("忽略此投稿[待开发]", callback_data=f"reason_{post_id}_skip"),
-        ]
-    )
-    keyboard.append(
-        [
-            InlineKeyboardButton(
-                "💬 回复投稿人",
-                switch_inline_query_current_chat=f"reply_{post_id}# ",
-            )
-        ]
-    )
-    return InlineKeyboardMarkup(keyboard)
-
-
-async def notify_submitter(post_data: PostModel, context: ContextTypes.DEFAULT_TYPE, msg: str) -> None:
-    post_msg_id = post_data.publish_msg_id
-    if post_data.status == PostStatus.APPROVED.value:
-        message_text = msg
-        chat_id = str(ReviewConfig.PUBLISH_CHANNEL)
-        if chat_id.startswith("-100"):
-            chat_id = chat_id[4:]
-            url = f"https://t.me/c/{chat_id}/{post_msg_id}"
-            keyboard = InlineKeyboardMarkup(
-                [[InlineKeyboardButton("在频道中查看", url=url),
-                  InlineKeyboardButton("查看评论区", url=f"{url}?thread={post_msg_id}" )]]
-            )
-        else:
-            url = f"https://t.me/{chat_id}/{post_msg_id}"
-            keyboard = InlineKeyboardMarkup(
-                [[InlineKeyboardButton("在频道中查看", url=url),
-                  InlineKeyboardButton("查看评论区", url=url + "?comment=1")]]
-            )
-    elif post_data.status == PostStatus.REJECTED.value:
-        if not ReviewConfig.RETRACT_NOTIFY:
-            return
-        message_text = msg
-        chat_id = str(ReviewConfig.REJECTED_CHANNEL)
-        if chat_id.startswith("-100"):
-            chat_id = chat_id[4:]
-            url = f"https://t.me/c/{chat_id}/{post_msg_id}"
-        else:
-            url = f"https://t.me/{chat_id}/{post_msg_id}"
-        keyboard = InlineKeyboardMarkup(
-            [[InlineKeyboardButton("在拒稿频道中查看", url=url)]]
-        )
-    else:
-        message_text = "来自审核的回复消息：\n\n" + msg
-        keyboard = None
-    await context.bot.send_message(
-        chat_id=post_data.submitter_id,
-        text=message_text,
-        reply_markup=keyboard,
-        parse_mode="HTML",
-        reply_to_message_id=post_data.submitter_msg_id
-    )
-
-
-async def check_post_status(post_data: PostModel, context: ContextTypes.DEFAULT_TYPE) -> int:
-    async with get_post_db() as session:
-        async with session.begin():
-            result = await session.execute(
-                select(PostLogModel).filter_by(post_id=post_data.id).order_by(PostLogModel.operate_time.asc()))
-            logs = result.scalars().all()
-            if not logs:
-                return -1
-            last_log = logs[-1]
-            last_reviewer_id = last_log.reviewer_id
-            is_nsfw = False
-            reason = last_log.msg if last_log.operate_type == "system" else None
-            if reason:
-                post_data.status = PostStatus.REJECTED.value
-            else:
-                approve_count, reject_count, nsfw_count = 0, 0, 0
-                for log in logs:
-                    vote_info = log.vote
-                    if vote_info == VoteType.APPROVE.value:
-                        approve_count += 1
-                    elif vote_info == VoteType.REJECT.value:
-                        reject_count += 1
-                    elif vote_info == VoteType.APPROVE_NSFW.value:
-                        nsfw_count += 1
-                        is_nsfw = True
-                total_approve = approve_count + nsfw_count
-                if total_approve >= ReviewConfig.APPROVE_NUMBER_REQUIRED:
-                    new_log = PostLogModel(post_id=post_data.id, reviewer_id=last_reviewer_id, operate_type="system",
-                                           operate_time=int(time.time()), msg="通过")
-                    session.add(new_log)
-                    post_data.status = PostStatus.APPROVED.value
-                    last_log = new_log
-                    last_reviewer_id = last_log.reviewer_id
-                elif reject_count >= ReviewConfig.REJECT_NUMBER_REQUIRED:
-                    post_data.status = PostStatus.NEED_REASON.value
-            await session.merge(post_data)
-    # 生成消息以及tag
-    vote_icons = {
-        VoteType.APPROVE.value: "🟢",
-        VoteType.REJECT.value: "🔴",
-        VoteType.APPROVE_NSFW.value: "🔞"
-    }
-    vote_types = {
-        VoteType.APPROVE.value: "以 SFW 通过",
-        VoteType.REJECT.value: "拒绝",
-        VoteType.APPROVE_NSFW.value: "以 NSFW 通过"
-    }
-    tag = [f"#USER_{post_data.submitter_id}", f"#SUBMITTER_{post_data.submitter_id}"]
-    msg_parts = []
-    for log in logs:
-        if log.operate_type == "system":
-            continue
-        vote_info = log.vote
-        tag.append(f"#USER_{log.reviewer_id}")
-        tag.append(f"#REVIEWER_{log.reviewer_id}")
-        reviewer_info = await UserOperation.get_reviewer(log.reviewer_id)
-        icon = vote_icons.get(vote_info, "")
-        vote_type = vote_types.get(vote_info, "")
-        msg_parts.append(
-            f"- {icon} 由 {reviewer_info.fullname} (@{reviewer_info.username} reviewer_id) {vote_type}")
-    msg_info = "\n".join(msg_parts) + "\n"
-    if post_data.status == PostStatus.REJECTED.value:
-        msg_info += f"-❗️拒绝人：{last_reviewer_id}，理由：{reason}\n"
-
-    # 处理编辑消息，用户/审核数据
-    async with get_users_db() as session:
-        async with session.begin():
-            submitter = await session.execute(
-                select(SubmitterModel).filter_by(user_id=post_data.submitter_id))
-            submitter = submitter.scalar_one_or_none()
-            submitter.approved_count += 1
-        keyboard = None
-        if post_data.status == PostStatus.APPROVED.value:
-            msg = (f"✅ 已通过稿件。\n"
-                   f"投稿人：{submitter.fullname} (@{submitter.username} {submitter.user_id})\n"
-                   f"审稿人：\n{msg_info}\n")
-            tag.append(f"#APPROVED")
-            chat_id = ReviewConfig.PUBLISH_CHANNEL
-        elif post_data.status == PostStatus.REJECTED.value:
-            msg = (f"❌ 已拒绝稿件。\n"
-                   f"投稿人：{submitter.fullname} (@{submitter.username} {submitter.user_id})\n"
-                   f"审稿人：\n{msg_info}\n"
-                   f"当前状态：已拒绝\n")
-            chat_id = ReviewConfig.REJECTED_CHANNEL
-        elif post_data.status == PostStatus.NEED_REASON.value:
-            msg = (f"❌ 已拒绝稿件。\n"
-                   f"投稿人：{submitter.fullname} (@{submitter.username} {submitter.user_id})\n"
-                   f"审稿人：\n{msg_info}\n"
-                   f"当前状态：待选择理由\n")
-            chat_id = None
-            keyboard = generate_reject_keyboard(str(post_data.id))
-        elif post_data.status == PostStatus.PENDING.value:
-            return PostStatus.PENDING.value  # 仍在审核中
-        msg += " ".join(tag)
-        await context.bot.edit_message_text(msg, ReviewConfig.REVIEWER_GROUP, post_data.operate_msg_id,
-                                            parse_mode="HTML", reply_markup=keyboard)
-        if not chat_id:
-            return PostStatus.NEED_REASON.value  # 已拒绝但未选择理由
-        send_text = post_data.text
-        # 审核评论处理
-        if post_data.other:
-            other_data = json.loads(post_data.other)
-            if "comment" in other_data:
-                comment = "\n\n".join(
-                    [f"<b>审核注:</b> {c['comment']}" for c in other_data["comment"]])
-                send_text += f"\n{comment}"
-        media_list = json.loads(post_data.attachment)
-        if media_list:
-            media = []
-            for media_item in media_list:
-                media_type = media_item["media_type"]
-                if media_type in ["photo", "video"]:
-                    media.append(MEDIA_GROUP_TYPES[media_type](
-                        media=media_item["media_id"],
-                        has_spoiler=is_nsfw
-                    ))
-                else:
-                    media.append(MEDIA_GROUP_TYPES[media_type](
-                        media=media_item["media_id"]
-                    ))
-
-            if is_nsfw:
-                inline_keyboard = InlineKeyboardMarkup(
-                    [[InlineKeyboardButton("跳到下一条", url=f"https://t.me/")]]
-                )
-                skip_msg = await context.bot.send_message(
-                    chat_id=chat_id,
-                    text="⚠️ #NSFW 提前预警",
-                    reply_markup=inline_keyboard,
-                )
-            msg = await context.bot.send_media_group(chat_id=chat_id, media=media, caption=send_text, parse_mode="HTML")
-            pub_msg_id = msg[0].id
-            if is_nsfw:
-                pub_chat_id = str(chat_id)
-                if pub_chat_id.startswith("-100"):
-                    pub_chat_id = pub_chat_id[4:]
-                    url = f"https://t.me/c/{pub_chat_id}/{pub_msg_id}"
-                else:
-                    url = f"https://t.me/{pub_chat_id}/{pub_msg_id}"
-                inline_keyboard = InlineKeyboardMarkup(
-                    [[InlineKeyboardButton("跳到下一条", url=url)]]
-                )
-                await skip_msg.edit_text(
-                    text="⚠️ #NSFW 提前预警", reply_markup=inline_keyboard
-                )
-        else:
-            msg = await context.bot.send_message(
-                chat_id=chat_id,
-                text=send_text,
-                parse_mode="HTML"
-            )
-            pub_msg_id = msg.id
-        async with get_post_db() as post_db_session:
-            async with post_db_session.begin():
-                post_data.publish_msg_id = pub_msg_id
-                post_data.finish_at = int(time.time())
-                await post_db_session.merge(post_data)
-    if post_data.status == PostStatus.APPROVED.value:
-        await notify_submitter(post_data, context, "您的投稿已通过审核！")
-        return PostStatus.APPROVED.value
-    else:
-        if isinstance(reason, str) and reason != "":
-            await notify_submitter(post_data, context, "您的投稿被拒绝。\n拒绝原因: <b>" + reason + "</b>")
-        return PostStatus.REJECTED.value
+import asyncio
+import json
+import sys
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import Awaitable, Callable, NamedTuple
+
+from sqlalchemy import select, update
+from telegram import Bot, InputMediaAudio, InputMediaDocument, InputMediaPhoto, InputMediaVideo, \
+    InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.ext import ContextTypes
+
+from src.bot.callback.router import CallbackAction, VoteOption, encode_callback
+from src.bot.outbox import OUTBOX_WORKER
+from src.bot.ratelimit import Priority
+from src.config import ReviewConfig, Config_submit
+from src.database.posts import PostModel, PostStatus, get_post_db, PostLogModel, VoteType, REVIEW_QUEUE, \
+    PostOperation
+from src.database.archive import POST_ARCHIVE
+from src.database.unit_of_work import UnitOfWork, UNIT_OF_WORK_STATS
+from src.database.writer import Operation
+from src.dedup import NEAR_DUPLICATES
+from src.database.users import UserOperation, SubmitterModel, ReviewerModel, get_users_db, USER_COUNTERS
+from src.logger import bot_logger
+
+
+MEDIA_GROUP_TYPES = {
+    "audio": InputMediaAudio,
+    "document": InputMediaDocument,
+    "photo": InputMediaPhoto,
+    "video": InputMediaVideo,
+}
+
+
+class PostLockManager:
+    """
+    按稿件串行化投票与状态检查，空闲的锁会被回收以限制内存占用
+    """
+
+    def __init__(self, max_locks: int = 1024, idle_timeout: float = 300):
+        self.max_locks = max_locks
+        self.idle_timeout = idle_timeout
+        self._locks: dict[int, list] = {}  # post_id -> [锁, 持有/等待数, 最后使用时间]
+        self.contended = 0
+        self.evictions = 0
+
+    @asynccontextmanager
+    async def acquire(self, post_id: int):
+        entry = self._locks.get(post_id)
+        if entry is None:
+            entry = self._locks[post_id] = [asyncio.Lock(), 0, 0.0]
+        if entry[0].locked():
+            self.contended += 1
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            entry[2] = time.monotonic()
+            if len(self._locks) > self.max_locks:
+                self.evict()
+
+    def evict(self) -> None:
+        """
+        回收无人持有且空闲超时的锁，超出上限时回收所有空闲的锁
+        """
+        now = time.monotonic()
+        overflow = len(self._locks) > self.max_locks
+        for post_id, entry in list(self._locks.items()):
+            if entry[1] == 0 and (overflow or now - entry[2] >= self.idle_timeout):
+                del self._locks[post_id]
+                self.evictions += 1
+
+    def stats(self) -> dict:
+        return {
+            "locks": len(self._locks),
+            "contended": self.contended,
+            "evictions": self.evictions,
+        }
+
+
+POST_LOCKS = PostLockManager()
+
+
+class StatusEditQueue:
+    """
+    审核群中稿件状态消息的编辑，在稿件锁之外发送
+    编辑在锁内按提交顺序登记，版本号单调递增；每个稿件同时只有一个发送任务，
+    发送期间登记的编辑只保留版本最新的一个，中间版本不再发送
+    """
+
+    def __init__(self):
+        self._pending: dict[int, tuple[int, Callable[[], Awaitable[None]]]] = {}  # post_id -> (版本, 编辑)
+        self._tasks: dict[int, asyncio.Task] = {}
+        self.sent = 0
+        self.coalesced = 0
+        self.failures = 0
+
+    def submit(self, post_id: int, version: int, edit: Callable[[], Awaitable[None]]) -> None:
+        current = self._pending.get(post_id)
+        if current is not None:
+            self.coalesced += 1
+            if current[0] > version:
+                return
+        self._pending[post_id] = (version, edit)
+        if post_id not in self._tasks:
+            self._tasks[post_id] = asyncio.create_task(self._run(post_id))
+
+    async def _run(self, post_id: int) -> None:
+        try:
+            while (item := self._pending.pop(post_id, None)) is not None:
+                try:
+                    # 任务继承了处理器的上下文，使用自己的 UnitOfWork，不与处理器共享读会话
+                    async with UnitOfWork("status_edit") as unit:
+                        await item[1]()
+                    UNIT_OF_WORK_STATS.record(unit)
+                    self.sent += 1
+                except Exception as e:
+                    self.failures += 1
+                    bot_logger.error(f"Error editing status message of post {post_id}: {e}")
+        finally:
+            self._tasks.pop(post_id, None)
+
+    async def stop(self) -> None:
+        """
+        等待尚未发送的编辑，在 post_stop 中调用(此时 bot 仍可用)
+        """
+        while self._tasks:
+            await asyncio.gather(*self._tasks.values(), return_exceptions=True)
+
+    def stats(self) -> dict:
+        return {
+            "sending": len(self._tasks),
+            "sent": self.sent,
+            "coalesced": self.coalesced,
+            "failures": self.failures,
+        }
+
+
+STATUS_EDITS = StatusEditQueue()
+
+
+class MediaItem(NamedTuple):
+    media_type: str
+    media_id: str
+    post_id: int
+    unique_id: str = ""
+
+
+class MediaGroupStore:
+    """
+    相册缓存，按空闲时间和数量淘汰，防止未确认的相册一直占用内存
+    """
+
+    def __init__(self, max_groups: int, ttl: float):
+        self.max_groups = max_groups
+        self.ttl = ttl
+        self._groups: OrderedDict[str, list] = OrderedDict()  # media_group_id -> [最后更新时间, 条目, 字节数]
+        self.live_bytes = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _sizeof(item: MediaItem) -> int:
+        # media_type 是共享的常量字符串，不计入
+        return sys.getsizeof(item) + sys.getsizeof(item.media_id) + sys.getsizeof(item.unique_id)
+
+    def add(self, media_group_id: str, item: MediaItem) -> None:
+        now = time.monotonic()
+        group = self._groups.get(media_group_id)
+        if group is None:
+            self.evict(now)
+            group = self._groups[media_group_id] = [now, [], 0]
+        else:
+            group[0] = now
+            self._groups.move_to_end(media_group_id)
+        size = self._sizeof(item)
+        group[1].append(item)
+        group[2] += size
+        self.live_bytes += size
+
+    def get(self, media_group_id: str) -> list[MediaItem]:
+        group = self._groups.get(media_group_id)
+        if group is None or time.monotonic() - group[0] > self.ttl:
+            return []
+        return group[1]
+
+    def pop(self, media_group_id: str) -> None:
+        group = self._groups.pop(media_group_id, None)
+        if group is not None:
+            self.live_bytes -= group[2]
+
+    def clear(self) -> None:
+        self._groups.clear()
+        self.live_bytes = 0
+
+    def evict(self, now: float | None = None) -> None:
+        """
+        淘汰过期的相册，超出数量上限时从最久未更新的开始淘汰
+        """
+        now = time.monotonic() if now is None else now
+        while self._groups:
+            media_group_id, group = next(iter(self._groups.items()))
+            if now - group[0] <= self.ttl and len(self._groups) < self.max_groups:
+                break
+            self.pop(media_group_id)
+            self.evictions += 1
+
+    def stats(self) -> dict:
+        return {
+            "groups": len(self._groups),
+            "live_bytes": self.live_bytes,
+            "evictions": self.evictions,
+        }
+
+
+MEDIA_GROUPS = MediaGroupStore(Config_submit.MEDIA_GROUP_MAX, Config_submit.MEDIA_GROUP_TTL)
+
+
+def get_media_group(media_group_id: str) -> list[MediaItem]:
+    return MEDIA_GROUPS.get(media_group_id)
+
+
+def clear_media_group(media_group_id: str):
+    MEDIA_GROUPS.pop(media_group_id)
+
+
+def clear_all_media_groups():
+    MEDIA_GROUPS.clear()
+
+
+def generate_review_keyboard(post_id: str, ) -> InlineKeyboardMarkup:
+    return InlineKeyboardMarkup(
+        [
+            [
+                InlineKeyboardButton(
+                    "🟢 通过",
+                    callback_data=encode_callback(CallbackAction.VOTE, post_id, VoteOption.APPROVE),
+                ),
+                InlineKeyboardButton(
+                    "🟡 以 NSFW 通过",
+                    callback_data=encode_callback(CallbackAction.VOTE, post_id, VoteOption.APPROVE_NSFW),
+                ),
+            ],
+            [
+                InlineKeyboardButton(
+                    "🔴 拒绝",
+                    callback_data=encode_callback(CallbackAction.VOTE, post_id, VoteOption.REJECT),
+                ),
+                InlineKeyboardButton(
+                    "🔴 以重复投稿拒绝",
+                    callback_data=encode_callback(CallbackAction.VOTE, post_id, VoteOption.REJECT_DUPLICATE),
+                ),
+            ],
+            [
+                InlineKeyboardButton(
+                    "❔ 查询我的投票",
+                    callback_data=encode_callback(CallbackAction.VOTE_QUERY, post_id),
+                ),
+                InlineKeyboardButton(
+                    "↩️ 撤回我的投票",
+                    callback_data=encode_callback(CallbackAction.VOTE_REVOKE, post_id),
+                ),
+            ],
+            [
+                InlineKeyboardButton(
+                    "📝 添加备注",
+                    switch_inline_query_current_chat=f"v3.0.append_{post_id}# ",
+                ),
+                InlineKeyboardButton(
+                    "⬅️ 删除备注",
+                    switch_inline_query_current_chat=f"v3.0.removeAppend_{post_id}",
+                ),
+            ],
+            [
+                InlineKeyboardButton(
+                    "💬 回复投稿人",
+                    switch_inline_query_current_chat=f"v3.0.reply_{post_id}# ",
+                ),
+            ],
+        ]
+    )
+
+
+def generate_reject_keyboard(post_id: str, ) -> InlineKeyboardMarkup:
+    keyboard = []
+    reason = ReviewConfig.REJECTION_REASON
+    for i in range(0, len(reason), 2):
+        row = [InlineKeyboardButton(reason[i], callback_data=encode_callback(CallbackAction.REASON, post_id, i))]
+        if i + 1 < len(reason):
+            row.append(InlineKeyboardButton(reason[i + 1],
+                                            callback_data=encode_callback(CallbackAction.REASON, post_id, i + 1)))
+        keyboard.append(row)
+    keyboard.append(
+        [
+            InlineKeyboardButton(
+                "自定义理由",
+                switch_inline_query_current_chat=f"customReason_{post_id}# ",
+            ),
+            InlineKeyboardButton("忽略此投稿[待开发]",
+                                 callback_data=encode_callback(CallbackAction.REASON, post_id, None)),
+        ]
+    )
+    keyboard.append(
+        [
+            InlineKeyboardButton(
+                "💬 回复投稿人",
+                switch_inline_query_current_chat=f"reply_{post_id}# ",
+            )
+        ]
+    )
+    return InlineKeyboardMarkup(keyboard)
+
+
+async def notify_submitter(post_data: PostModel, bot: Bot, msg: str) -> None:
+    post_msg_id = post_data.publish_msg_id
+    if post_data.status == PostStatus.APPROVED.value:
+        message_text = msg
+        chat_id = str(ReviewConfig.PUBLISH_CHANNEL)
+        if chat_id.startswith("-100"):
+            chat_id = chat_id[4:]
+            url = f"https://t.me/c/{chat_id}/{post_msg_id}"
+            keyboard = InlineKeyboardMarkup(
+                [[InlineKeyboardButton("在频道中查看", url=url),
+                  InlineKeyboardButton("查看评论区", url=f"{url}?thread={post_msg_id}" )]]
+            )
+        else:
+            url = f"https://t.me/{chat_id}/{post_msg_id}"
+            keyboard = InlineKeyboardMarkup(
+                [[InlineKeyboardButton("在频道中查看", url=url),
+                  InlineKeyboardButton("查看评论区", url=url + "?comment=1")]]
+            )
+    elif post_data.status == PostStatus.REJECTED.value:
+        if not ReviewConfig.RETRACT_NOTIFY:
+            return
+        message_text = msg
+        chat_id = str(ReviewConfig.REJECTED_CHANNEL)
+        if chat_id.startswith("-100"):
+            chat_id = chat_id[4:]
+            url = f"https://t.me/c/{chat_id}/{post_msg_id}"
+        else:
+            url = f"https://t.me/{chat_id}/{post_msg_id}"
+        keyboard = InlineKeyboardMarkup(
+            [[InlineKeyboardButton("在拒稿频道中查看", url=url)]]
+        )
+    else:
+        message_text = "来自审核的回复消息：\n\n" + msg
+        keyboard = None
+    await bot.send_message(
+        chat_id=post_data.submitter_id,
+        text=message_text,
+        reply_markup=keyboard,
+        parse_mode="HTML",
+        reply_to_message_id=post_data.submitter_msg_id,
+        rate_limit_args=Priority.LOW,
+    )
+
+
+POST_STATUS_TEXT = {
+    PostStatus.PENDING.value: "待审",
+    PostStatus.APPROVED.value: "已通过",
+    PostStatus.REJECTED.value: "已拒绝",
+    PostStatus.NEED_REASON.value: "待选理由",
+}
+
+
+async def format_duplicates(fingerprints: set[str], text: str | None = None,
+                            exclude_post_id: int | None = None) -> str:
+    """
+    生成疑似重复与相似投稿的提示，都没有时返回空字符串
+    """
+    limit = Config_submit.DUPLICATE_MAX_MATCHES
+    matches = await PostOperation.find_duplicates(fingerprints, exclude_post_id, limit)
+    match_ids = {match_id for match_id, _ in matches}
+    similar = [(post_id, score) for post_id, score in
+               await NEAR_DUPLICATES.query(text, Config_submit.NEAR_DUPLICATE_THRESHOLD, exclude_post_id, limit)
+               if post_id not in match_ids]
+    # 已归档的重复稿件与相似稿件的状态一次批量取出
+    lookup = [post_id for post_id, status in matches if status is None] + [post_id for post_id, _ in similar]
+    posts = await POST_ARCHIVE.get_posts(lookup) if lookup else {}
+    lines = []
+    if matches:
+        parts = []
+        for post_id, status in matches:
+            if status is None:
+                # 已归档
+                status = posts[post_id].status if post_id in posts else None
+            parts.append(f"{post_id}({POST_STATUS_TEXT.get(status, '未知')})")
+        lines.append("⚠️ 疑似重复投稿：" + "，".join(parts))
+    if similar:
+        parts = []
+        for post_id, score in similar:
+            status = posts[post_id].status if post_id in posts else None
+            parts.append(f"{post_id}({POST_STATUS_TEXT.get(status, '未知')}，相似度 {score:.0%})")
+        lines.append("⚠️ 相似投稿：" + "，".join(parts))
+    return "".join(line + "\n" for line in lines)
+
+
+def check_post_status(post_data: PostModel, context: ContextTypes.DEFAULT_TYPE, reopen: bool = False) -> int:
+    """
+    稿件状态已由投票事务根据票数更新，在稿件锁内调用，只登记审核群消息的编辑并唤醒发布任务，不等待发送
+    """
+    if post_data.status != PostStatus.PENDING.value:
+        REVIEW_QUEUE.close_post(post_data.id)
+    elif not reopen:
+        return PostStatus.PENDING.value  # 仍在审核中
+    STATUS_EDITS.submit(post_data.id, post_data.version,
+                        lambda: edit_post_status(post_data, context.bot, reopen))
+    if post_data.status in (PostStatus.APPROVED.value, PostStatus.REJECTED.value):
+        # 发布与通知由 outbox 任务在后台完成，任务已与状态变更一同写入
+        OUTBOX_WORKER.wake()
+    return post_data.status
+
+
+async def edit_post_status(post_data: PostModel, bot: Bot, reopen: bool = False) -> None:
+    """
+    生成审核群中的状态消息并编辑，日志在发送时读取，包含 post_data 之后的投票
+    """
+    async with get_post_db(readonly=True) as session:
+        result = await session.execute(
+            select(PostLogModel).filter_by(post_id=post_data.id)
+            .order_by(PostLogModel.operate_time.asc(), PostLogModel.id.asc()))
+        logs = result.scalars().all()
+    if not logs and not reopen:
+        return
+    last_reviewer_id = logs[-1].reviewer_id if logs else None
+    reason = None
+    if post_data.status == PostStatus.REJECTED.value:
+        system_logs = [log for log in logs if log.operate_type == "system"]
+        if system_logs:
+            reason = system_logs[-1].msg
+            last_reviewer_id = system_logs[-1].reviewer_id
+    # 生成消息以及tag
+    vote_icons = {
+        VoteType.APPROVE.value: "🟢",
+        VoteType.REJECT.value: "🔴",
+        VoteType.APPROVE_NSFW.value: "🔞"
+    }
+    vote_types = {
+        VoteType.APPROVE.value: "以 SFW 通过",
+        VoteType.REJECT.value: "拒绝",
+        VoteType.APPROVE_NSFW.value: "以 NSFW 通过"
+    }
+    tag = [f"#USER_{post_data.submitter_id}", f"#SUBMITTER_{post_data.submitter_id}"]
+    msg_parts = []
+    # 一次性取出所有参与投票的审核员
+    reviewers = await UserOperation.get_reviewers(
+        log.reviewer_id for log in logs if log.operate_type != "system")
+    for log in logs:
+        if log.operate_type == "system":
+            continue
+        vote_info = log.vote
+        tag.append(f"#USER_{log.reviewer_id}")
+        tag.append(f"#REVIEWER_{log.reviewer_id}")
+        reviewer_info = reviewers.get(log.reviewer_id)
+        fullname = reviewer_info.fullname if reviewer_info else log.reviewer_id
+        username = reviewer_info.username if reviewer_info else None
+        icon = vote_icons.get(vote_info, "")
+        vote_type = vote_types.get(vote_info, "")
+        msg_parts.append(
+            f"- {icon} 由 {fullname} (@{username} {log.reviewer_id}) {vote_type}")
+    msg_info = "\n".join(msg_parts) + "\n"
+    if post_data.status == PostStatus.REJECTED.value:
+        msg_info += f"-❗️拒绝人：{last_reviewer_id}，理由：{reason}\n"
+
+    # 处理编辑消息，统计数据由 outbox 的 count 任务更新
+    async with get_users_db(readonly=True) as session:
+        submitter = await session.execute(
+            select(SubmitterModel).filter_by(user_id=post_data.submitter_id))
+        submitter = submitter.scalar_one_or_none()
+    if not submitter:
+        # 投稿者资料尚未写入
+        submitter = SubmitterModel(user_id=post_data.submitter_id)
+    keyboard = None
+    if post_data.status == PostStatus.APPROVED.value:
+        msg = (f"✅ 已通过稿件。\n"
+               f"投稿人：{submitter.fullname} (@{submitter.username} {submitter.user_id})\n"
+               f"审稿人：\n{msg_info}\n")
+        tag.append(f"#APPROVED")
+    elif post_data.status == PostStatus.REJECTED.value:
+        msg = (f"❌ 已拒绝稿件。\n"
+               f"投稿人：{submitter.fullname} (@{submitter.username} {submitter.user_id})\n"
+               f"审稿人：\n{msg_info}\n"
+               f"当前状态：已拒绝\n")
+    elif post_data.status == PostStatus.NEED_REASON.value:
+        msg = (f"❌ 已拒绝稿件。\n"
+               f"投稿人：{submitter.fullname} (@{submitter.username} {submitter.user_id})\n"
+               f"审稿人：\n{msg_info}\n"
+               f"当前状态：待选择理由\n")
+        keyboard = generate_reject_keyboard(str(post_data.id))
+    else:
+        # 撤回投票后重新开放审核
+        msg = f"❔ 待审稿件\n投稿人： {submitter.fullname} (@{submitter.username}, {submitter.user_id})\n\n"
+        msg += await format_duplicates(await PostOperation.get_fingerprints(post_data.id), post_data.text,
+                                       post_data.id)
+        tag.append("#PENDING")
+        keyboard = generate_review_keyboard(str(post_data.id))
+    msg += " ".join(tag)
+    await bot.edit_message_text(msg, ReviewConfig.REVIEWER_GROUP, post_data.operate_msg_id,
+                                parse_mode="HTML", reply_markup=keyboard, rate_limit_args=Priority.HIGH)
+
+
+async def get_reject_reason(post_id: int) -> str | None:
+    async with get_post_db(readonly=True) as session:
+        result = await session.execute(
+            select(PostLogModel.msg).filter_by(post_id=post_id, operate_type="system")
+            .order_by(PostLogModel.operate_time.desc(), PostLogModel.id.desc()).limit(1))
+        return result.scalar_one_or_none()
+
+
+async def publish_post(bot: Bot, post_id: int) -> Operation | None:
+    """
+    outbox 任务：将已通过/已拒绝的稿件发送到频道，已记录发布消息 id 时不再重复发送
+    返回的写操作与任务完成状态一起提交，记录发布消息 id 并写入通知任务
+    """
+    async with get_post_db(readonly=True) as session:
+        result = await session.execute(select(PostModel).filter_by(id=post_id))
+        post_data = result.scalar_one_or_none()
+    if not post_data:
+        return None
+    pub_msg_id = None
+    if post_data.publish_msg_id is None:
+        if post_data.status == PostStatus.APPROVED.value:
+            chat_id = ReviewConfig.PUBLISH_CHANNEL
+        elif post_data.status == PostStatus.REJECTED.value:
+            chat_id = ReviewConfig.REJECTED_CHANNEL
+        else:
+            return None
+        is_nsfw = post_data.nsfw_count > 0
+        send_text = post_data.text
+        # 审核评论处理
+        comments = await PostOperation.get_comments(post_id)
+        if comments:
+            comment = "\n\n".join([f"<b>审核注:</b> {c}" for c in comments])
+            send_text += f"\n{comment}"
+        media_list = json.loads(post_data.attachment)
+        if media_list:
+            media = []
+            for media_item in media_list:
+                media_type = media_item["media_type"]
+                if media_type in ["photo", "video"]:
+                    media.append(MEDIA_GROUP_TYPES[media_type](
+                        media=media_item["media_id"],
+                        has_spoiler=is_nsfw
+                    ))
+                else:
+                    media.append(MEDIA_GROUP_TYPES[media_type](
+                        media=media_item["media_id"]
+                    ))
+
+            if is_nsfw:
+                inline_keyboard = InlineKeyboardMarkup(
+                    [[InlineKeyboardButton("跳到下一条", url=f"https://t.me/")]]
+                )
+                skip_msg = await bot.send_message(
+                    chat_id=chat_id,
+                    text="⚠️ #NSFW 提前预警",
+                    reply_markup=inline_keyboard,
+                )
+            msg = await bot.send_media_group(chat_id=chat_id, media=media, caption=send_text, parse_mode="HTML")
+            pub_msg_id = msg[0].id
+            if is_nsfw:
+                pub_chat_id = str(chat_id)
+                if pub_chat_id.startswith("-100"):
+                    pub_chat_id = pub_chat_id[4:]
+                    url = f"https://t.me/c/{pub_chat_id}/{pub_msg_id}"
+                else:
+                    url = f"https://t.me/{pub_chat_id}/{pub_msg_id}"
+                inline_keyboard = InlineKeyboardMarkup(
+                    [[InlineKeyboardButton("跳到下一条", url=url)]]
+                )
+                await skip_msg.edit_text(
+                    text="⚠️ #NSFW 提前预警", reply_markup=inline_keyboard
+                )
+        else:
+            msg = await bot.send_message(
+                chat_id=chat_id,
+                text=send_text,
+                parse_mode="HTML"
+            )
+            pub_msg_id = msg.id
+
+    async def complete(session):
+        if pub_msg_id is not None:
+            await session.execute(update(PostModel).where(PostModel.id == post_id)
+                                  .values(publish_msg_id=pub_msg_id, finish_at=int(time.time())))
+        await PostOperation.enqueue_outbox(session, "notify", post_id)
+
+    return complete
+
+
+async def notify_post_result(bot: Bot, post_id: int) -> None:
+    """
+    outbox 任务：通知投稿者审核结果
+    """
+    async with get_post_db(readonly=True) as session:
+        result = await session.execute(select(PostModel).filter_by(id=post_id))
+        post_data = result.scalar_one_or_none()
+    if not post_data:
+        return
+    if post_data.status == PostStatus.APPROVED.value:
+        await notify_submitter(post_data, bot, "您的投稿已通过审核！")
+    elif post_data.status == PostStatus.REJECTED.value:
+        reason = await get_reject_reason(post_id)
+        if isinstance(reason, str) and reason != "":
+            await notify_submitter(post_data, bot, "您的投稿被拒绝。\n拒绝原因: <b>" + reason + "</b>")
+
+
+async def count_post_result(bot: Bot, post_id: int) -> None:
+    """
+    outbox 任务：稿件完成后更新投稿者与审核者的统计，所有变化合并提交
+    """
+    async with get_post_db(readonly=True) as session:
+        result = await session.execute(select(PostModel).filter_by(id=post_id))
+        post_data = result.scalar_one_or_none()
+        if not post_data or post_data.status not in (PostStatus.APPROVED.value, PostStatus.REJECTED.value):
+            return
+        result = await session.execute(
+            select(PostLogModel.reviewer_id, PostLogModel.vote).filter_by(post_id=post_id, operate_type="reviewer"))
+        votes = result.all()
+    approved = post_data.status == PostStatus.APPROVED.value
+    # 上次提交失败时变化已放回缓冲，重试只需要再次提交
+    if USER_COUNTERS.stage(("count", post_id)):
+        USER_COUNTERS.add(SubmitterModel, post_data.submitter_id,
+                          approved_count=int(approved), rejected_count=int(not approved))
+        for reviewer_id, vote in votes:
+            if vote == VoteType.REJECT.value:
+                USER_COUNTERS.add(ReviewerModel, reviewer_id, reject_count=1, reject_but_approved_count=int(approved))
+            else:
+                USER_COUNTERS.add(ReviewerModel, reviewer_id, approve_count=1,
+                                  approve_but_rejected_count=int(not approved))
+    await USER_COUNTERS.commit()
+
+
+OUTBOX_WORKER.register("publish", publish_post)
+OUTBOX_WORKER.register("notify", notify_post_result)
+OUTBOX_WORKER.register("count", count_post_result)
@@ -0,0 +1,12 @@
+"""
+导入 src.database 时会在 Config.DATABASES_DIR 中建库，测试前先指向临时目录，也不写 bot.log
+"""
+import tempfile
+from pathlib import Path
+
+from src.config import Config, DatabaseConfig
+
+_TEMP_DIR = Path(tempfile.mkdtemp(prefix="review-next-tests-"))
+Config.LOGGING = False
+Config.DATABASES_DIR = _TEMP_DIR / "database"
+DatabaseConfig.BACKUP_DIR = _TEMP_DIR / "backup"
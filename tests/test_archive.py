@@ -0,0 +1,47 @@
+import asyncio
+import time
+
+from sqlalchemy import select
+
+from src.database.archive import POST_ARCHIVE, ArchiveSessionFactory
+from src.database.posts import PostModel, PostLogModel, PostStatus, POSTS_WRITER, PostsSessionFactory, VoteType
+
+DAY = 86400
+
+
+async def add_post(post_id: int, status: PostStatus, finished_days_ago: int | None) -> None:
+    now = int(time.time())
+    finish_at = None if finished_days_ago is None else now - finished_days_ago * DAY
+
+    async def operation(session):
+        session.add(PostModel(id=post_id, submitter_id=1, text=f"post {post_id}", status=status.value,
+                              created_at=now - 100 * DAY, finish_at=finish_at))
+        session.add(PostLogModel(post_id=post_id, reviewer_id=2, vote=VoteType.APPROVE.value,
+                                 operate_type="reviewer", operate_time=now - 100 * DAY))
+
+    await POSTS_WRITER.submit(operation)
+
+
+async def post_ids(session_factory, ids: list[int]) -> list[int]:
+    async with session_factory() as session:
+        result = await session.execute(select(PostModel.id).where(PostModel.id.in_(ids)).order_by(PostModel.id))
+        return list(result.scalars().all())
+
+
+def test_archive_moves_old_finished_posts():
+    async def main():
+        await add_post(1001, PostStatus.APPROVED, 40)
+        await add_post(1002, PostStatus.REJECTED, 31)
+        await add_post(1003, PostStatus.APPROVED, 5)
+        await add_post(1004, PostStatus.PENDING, None)
+        ids = [1001, 1002, 1003, 1004]
+        assert await POST_ARCHIVE.run(30, batch_size=1) == 2
+        assert await post_ids(PostsSessionFactory, ids) == [1003, 1004]
+        assert await post_ids(ArchiveSessionFactory, ids) == [1001, 1002]
+        # 查询时热库中没有的稿件从归档库中取出
+        assert (await POST_ARCHIVE.get_post(1001)).text == "post 1001"
+        assert [log.reviewer_id for log in await POST_ARCHIVE.get_logs(1002)] == [2]
+        # 再次运行时没有新的稿件可归档
+        assert await POST_ARCHIVE.run(30, batch_size=1) == 0
+
+    asyncio.run(main())
@@ -0,0 +1,104 @@
+import gzip
+import sqlite3
+
+import pytest
+
+from src.config import Config, DatabaseConfig
+from src.database.backup import BackupError, DatabaseBackup
+
+
+@pytest.fixture
+def dirs(tmp_path, monkeypatch):
+    database_dir, backup_dir = tmp_path / "database", tmp_path / "backup"
+    database_dir.mkdir()
+    monkeypatch.setattr(Config, "DATABASES_DIR", database_dir)
+    monkeypatch.setattr(DatabaseConfig, "BACKUP_DIR", backup_dir)
+    monkeypatch.setattr(DatabaseConfig, "BACKUP_COMPRESS", True)
+    connection = sqlite3.connect(database_dir / "posts.db")
+    connection.execute("CREATE TABLE posts (id INTEGER PRIMARY KEY, text TEXT)")
+    connection.executemany("INSERT INTO posts (text) VALUES (?)", [(f"post {i}",) for i in range(100)])
+    connection.commit()
+    connection.close()
+    return database_dir, backup_dir
+
+
+def count_posts(database_dir) -> int:
+    connection = sqlite3.connect(database_dir / "posts.db")
+    try:
+        return connection.execute("SELECT COUNT(*) FROM posts").fetchone()[0]
+    finally:
+        connection.close()
+
+
+def delete_posts(database_dir) -> None:
+    connection = sqlite3.connect(database_dir / "posts.db")
+    connection.execute("DELETE FROM posts")
+    connection.commit()
+    connection.close()
+
+
+@pytest.mark.parametrize("compress", [True, False])
+def test_backup_and_restore(dirs, monkeypatch, compress):
+    database_dir, backup_dir = dirs
+    monkeypatch.setattr(DatabaseConfig, "BACKUP_COMPRESS", compress)
+    path = DatabaseBackup()._backup_one("posts", "20260101-000000")
+    assert path.name == "posts-20260101-000000.db" + (".gz" if compress else "")
+    assert sorted(p.name for p in backup_dir.iterdir()) == [path.name, path.name + ".sha256"]
+    delete_posts(database_dir)
+    assert DatabaseBackup.restore(path) == database_dir / "posts.db"
+    assert count_posts(database_dir) == 100
+
+
+def test_restore_rejects_checksum_mismatch(dirs):
+    database_dir, _ = dirs
+    path = DatabaseBackup()._backup_one("posts", "20260101-000000")
+    checksum_path = path.with_name(path.name + ".sha256")
+    checksum_path.write_text("0" * 64 + "  posts.db\n")
+    delete_posts(database_dir)
+    with pytest.raises(BackupError, match="Checksum mismatch"):
+        DatabaseBackup.restore(path)
+    # 校验不通过时不改动现有数据库，也不留下临时文件
+    assert count_posts(database_dir) == 0
+    assert not (database_dir / "posts.db.restore").exists()
+
+
+def test_restore_rejects_corrupted_backup(dirs):
+    path = DatabaseBackup()._backup_one("posts", "20260101-000000")
+    data = bytearray(gzip.decompress(path.read_bytes()))
+    data[-100] ^= 0xFF
+    path.write_bytes(gzip.compress(bytes(data)))
+    with pytest.raises(BackupError, match="Checksum mismatch"):
+        DatabaseBackup.restore(path)
+
+
+def test_restore_rejects_unknown_or_unverified_files(dirs):
+    _, backup_dir = dirs
+    path = DatabaseBackup()._backup_one("posts", "20260101-000000")
+    with pytest.raises(BackupError, match="Unrecognized"):
+        DatabaseBackup.restore(path.with_name("posts.db"))
+    path.with_name(path.name + ".sha256").unlink()
+    with pytest.raises(BackupError, match="Checksum file not found"):
+        DatabaseBackup.restore(path)
+
+
+def test_failed_backup_leaves_no_files(dirs, monkeypatch):
+    _, backup_dir = dirs
+
+    def fail(*args):
+        raise sqlite3.OperationalError("disk I/O error")
+
+    backup = DatabaseBackup()
+    monkeypatch.setattr(backup, "_copy", fail)
+    with pytest.raises(sqlite3.OperationalError):
+        backup._backup_one("posts", "20260101-000000")
+    assert list(backup_dir.iterdir()) == []
+
+
+def test_rotate_keeps_newest(dirs):
+    backup = DatabaseBackup()
+    stamps = ["20260101-000000", "20260102-000000", "20260103-000000"]
+    for stamp in stamps:
+        backup._backup_one("posts", stamp)
+    assert backup.rotate("posts", 2) == 1
+    assert [p.name for p in backup.list_backups("posts")] == [f"posts-{s}.db.gz" for s in reversed(stamps[1:])]
+    assert not (DatabaseConfig.BACKUP_DIR / f"posts-{stamps[0]}.db.gz.sha256").exists()
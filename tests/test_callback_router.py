@@ -0,0 +1,113 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from telegram import CallbackQuery, Update, User
+
+from src.bot.callback.router import ARGUMENTS, CallbackAction, CallbackRouter, VoteOption, decode_callback, \
+    encode_callback
+
+SAMPLE_ARGUMENTS = {
+    CallbackAction.SUBMIT: [(True,), (False,)],
+    CallbackAction.CANCEL: [()],
+    CallbackAction.VOTE: [(1, option) for option in VoteOption] + [(17300000001234, VoteOption.APPROVE)],
+    CallbackAction.VOTE_QUERY: [(42,)],
+    CallbackAction.VOTE_REVOKE: [(42,)],
+    CallbackAction.REASON: [(42, 0), (42, 5), (42, None)],
+    CallbackAction.PRIVATE_VOTE: [(42, option) for option in VoteOption],
+    CallbackAction.PRIVATE_REASON: [(42, 3), (42, None)],
+}
+
+
+def test_samples_cover_every_action():
+    assert set(SAMPLE_ARGUMENTS) == set(CallbackAction)
+
+
+@pytest.mark.parametrize("action, args", [(action, args) for action, samples in SAMPLE_ARGUMENTS.items()
+                                          for args in samples])
+def test_round_trip(action, args):
+    data = encode_callback(action, *args)
+    assert len(data.encode()) <= 64
+    names = [name for name, _ in ARGUMENTS[action]]
+    assert decode_callback(data) == (action, dict(zip(names, args)))
+
+
+@pytest.mark.parametrize("data, expected", [
+    ("v3.0.submitConfirm", (CallbackAction.SUBMIT, {"real_name": False})),
+    ("v3.0.submitConfirm_real_name", (CallbackAction.SUBMIT, {"real_name": True})),
+    ("v3.0.cancel", (CallbackAction.CANCEL, {})),
+    ("v3.0.approve_123", (CallbackAction.VOTE, {"post_id": 123, "option": VoteOption.APPROVE})),
+    ("v3.0.approve_123_NSFW", (CallbackAction.VOTE, {"post_id": 123, "option": VoteOption.APPROVE_NSFW})),
+    ("v3.0.reject_123", (CallbackAction.VOTE, {"post_id": 123, "option": VoteOption.REJECT})),
+    ("v3.0.rejectDuplicate_123", (CallbackAction.VOTE, {"post_id": 123, "option": VoteOption.REJECT_DUPLICATE})),
+    ("v3.0.voteQuery_123", (CallbackAction.VOTE_QUERY, {"post_id": 123})),
+    ("v3.0.voteRevoke_123", (CallbackAction.VOTE_REVOKE, {"post_id": 123})),
+    ("reason_123_2", (CallbackAction.REASON, {"post_id": 123, "reason_index": 2})),
+    ("reason_123_skip", (CallbackAction.REASON, {"post_id": 123, "reason_index": None})),
+    ("private#approve_123", (CallbackAction.PRIVATE_VOTE, {"post_id": 123, "option": VoteOption.APPROVE})),
+    ("private#approve_NSFW_123",
+     (CallbackAction.PRIVATE_VOTE, {"post_id": 123, "option": VoteOption.APPROVE_NSFW})),
+    ("private#reject_123", (CallbackAction.PRIVATE_VOTE, {"post_id": 123, "option": VoteOption.REJECT})),
+    ("private#rejectDuplicate_123",
+     (CallbackAction.PRIVATE_VOTE, {"post_id": 123, "option": VoteOption.REJECT_DUPLICATE})),
+    ("pri#reason_123_1", (CallbackAction.PRIVATE_REASON, {"post_id": 123, "reason_index": 1})),
+    ("pri#reason_123_skip", (CallbackAction.PRIVATE_REASON, {"post_id": 123, "reason_index": None})),
+])
+def test_legacy_formats(data, expected):
+    assert decode_callback(data) == expected
+
+
+@pytest.mark.parametrize("data", [
+    "", "next_post", "cancel", "4", "4v", "4v:", "4v:12", "4v:12:z", "4v:12:a:1", "4v:-1:a", "4v: 12:a",
+    "4v:１２:a", "4s:2", "4x:1", "4zz:1", "v3.0.approve_", "v3.0.approve_12_SFW", "v3.0.cancel_1",
+    "v3.0.submitConfirm_x", "reason_12_", "reason_x_1",
+])
+def test_invalid_data(data):
+    assert decode_callback(data) is None
+
+
+def test_encode_checks_arguments():
+    with pytest.raises(ValueError):
+        encode_callback(CallbackAction.VOTE, 1)
+    with pytest.raises(ValueError):
+        encode_callback(CallbackAction.VOTE_QUERY, 10 ** 70)
+
+
+def callback_update(data: str) -> Update:
+    return Update(1, callback_query=CallbackQuery("1", User(1, "reviewer", False), "chat", data=data))
+
+
+@pytest.fixture
+def router():
+    router = CallbackRouter()
+    calls = []
+
+    async def vote(update, context, post_id, option):
+        calls.append((post_id, option))
+
+    router.add(CallbackAction.VOTE, vote)
+    router.calls = calls
+    return router
+
+
+def test_router_dispatches_keyword_arguments(router):
+    update = callback_update(encode_callback(CallbackAction.VOTE, 7, VoteOption.REJECT))
+    asyncio.run(router.dispatch(update, SimpleNamespace()))
+    assert router.calls == [(7, VoteOption.REJECT)]
+    assert router.stats() == {"VOTE": 1, "unmatched": 0}
+
+
+def test_router_counts_only_its_own_data_as_unmatched(router):
+    # 留给 ConversationHandler 等其他 handler 的按钮
+    for data in ("next_post", "cancel", "something_else"):
+        assert router.check_update(callback_update(data)) is None
+    assert router.unmatched == 0
+    # 无法解码或没有注册处理函数
+    for data in ("4v:12:z", "v3.0.approve_x", encode_callback(CallbackAction.VOTE_QUERY, 1)):
+        assert router.check_update(callback_update(data)) is None
+    assert router.unmatched == 3
+
+
+def test_router_rejects_duplicate_routes(router):
+    with pytest.raises(ValueError):
+        router.add(CallbackAction.VOTE, router.calls.append)
@@ -0,0 +1,161 @@
+import asyncio
+
+import pytest
+from sqlalchemy import create_engine, insert, select
+
+from src.database import users
+from src.database.users import Base, CounterBuffer, ReviewerModel, ReviewerRegistry, SubmitterModel, \
+    SubmitterProfileCache
+
+
+@pytest.fixture
+def engine():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    yield engine
+    engine.dispose()
+
+
+def execute(engine, buffer: CounterBuffer) -> None:
+    with engine.begin() as connection:
+        for stmt, params in CounterBuffer.build_statements(buffer._pending):
+            connection.execute(stmt, params)
+
+
+def counts(engine, model, columns) -> dict[int, tuple]:
+    with engine.connect() as connection:
+        rows = connection.execute(select(model.user_id, *(getattr(model, c) for c in columns)))
+        return {row[0]: tuple(row[1:]) for row in rows}
+
+
+def test_deltas_are_merged_per_user():
+    buffer = CounterBuffer()
+    buffer.add(SubmitterModel, 1, submission_count=1)
+    buffer.add(SubmitterModel, 1, submission_count=1, approved_count=1)
+    buffer.add(SubmitterModel, 2, rejected_count=1)
+    statements = CounterBuffer.build_statements(buffer._pending)
+    # 每张表只有一条语句
+    assert len(statements) == 1
+    assert buffer._pending[SubmitterModel][1] == {"submission_count": 2, "approved_count": 1, "rejected_count": 0}
+
+
+def test_unknown_column_is_rejected():
+    with pytest.raises(ValueError):
+        CounterBuffer().add(SubmitterModel, 1, approve_count=1)
+
+
+def test_submitters_are_upserted(engine):
+    with engine.begin() as connection:
+        connection.execute(insert(SubmitterModel).values(user_id=1, username="old", submission_count=5,
+                                                         approved_count=2, rejected_count=0))
+    buffer = CounterBuffer()
+    buffer.add(SubmitterModel, 1, submission_count=1, rejected_count=1)
+    buffer.add(SubmitterModel, 2, submission_count=1)
+    execute(engine, buffer)
+    columns = ("submission_count", "approved_count", "rejected_count")
+    assert counts(engine, SubmitterModel, columns) == {1: (6, 2, 1), 2: (1, 0, 0)}
+    with engine.connect() as connection:
+        # 计数语句不覆盖资料列
+        assert connection.execute(select(SubmitterModel.username).filter_by(user_id=1)).scalar() == "old"
+
+
+def test_reviewers_are_only_updated(engine):
+    with engine.begin() as connection:
+        connection.execute(insert(ReviewerModel).values(user_id=1, approve_count=3, reject_count=1,
+                                                        approve_but_rejected_count=0,
+                                                        reject_but_approved_count=0))
+    buffer = CounterBuffer()
+    buffer.add(ReviewerModel, 1, approve_count=1, approve_but_rejected_count=1)
+    # 已移除的审核者不会被重新建档
+    buffer.add(ReviewerModel, 2, reject_count=1)
+    execute(engine, buffer)
+    columns = CounterBuffer.COUNTER_COLUMNS[ReviewerModel]
+    assert counts(engine, ReviewerModel, columns) == {1: (4, 1, 1, 0)}
+
+
+def test_failed_commit_keeps_deltas(monkeypatch):
+    async def fail(operation):
+        raise RuntimeError("database is locked")
+
+    monkeypatch.setattr(users.USERS_WRITER, "submit", fail)
+    buffer = CounterBuffer()
+    assert buffer.stage(("count", 1))
+    buffer.add(SubmitterModel, 1, approved_count=1)
+    with pytest.raises(RuntimeError):
+        asyncio.run(buffer.commit())
+    # 变化加到失败之后新累积的变化上，重试时不会再次累积
+    buffer.add(SubmitterModel, 1, submission_count=1)
+    assert buffer._pending[SubmitterModel][1] == {"submission_count": 1, "approved_count": 1, "rejected_count": 0}
+    assert not buffer.stage(("count", 1))
+    assert buffer.stats()["failures"] == 1
+
+
+def test_successful_commit_clears_sources(monkeypatch):
+    submitted = []
+
+    async def submit(operation):
+        submitted.append(operation)
+
+    monkeypatch.setattr(users.USERS_WRITER, "submit", submit)
+    buffer = CounterBuffer()
+    assert buffer.stage(("count", 1))
+    buffer.add(SubmitterModel, 1, approved_count=1)
+    asyncio.run(buffer.commit())
+    assert len(submitted) == 1
+    assert buffer.stats()["pending"] == 0
+    assert buffer.stage(("count", 1))
+
+
+def test_commit_keeps_reviewer_registry(monkeypatch):
+    async def submit(operation):
+        pass
+
+    monkeypatch.setattr(users.USERS_WRITER, "submit", submit)
+    registry = ReviewerRegistry()
+    registry._reviewers = {1: ReviewerModel(user_id=1)}
+    monkeypatch.setattr(users, "REVIEWER_REGISTRY", registry)
+    buffer = CounterBuffer()
+    buffer.add(ReviewerModel, 1, approve_count=1)
+    asyncio.run(buffer.commit())
+    # 名单只关心成员，计数变化不会让缓存失效
+    assert asyncio.run(registry.is_reviewer(1))
+    assert registry.stats()["misses"] == 0
+
+
+def test_profiles_are_written_with_counts():
+    profiles = SubmitterProfileCache(10)
+    profiles.touch(4001, "new_submitter", "New Submitter")
+    buffer = CounterBuffer()
+    buffer.add(SubmitterModel, 4001, submission_count=1)
+
+    async def main():
+        await buffer.commit(profiles=profiles)
+        async with users.UsersReadSessionFactory() as session:
+            return await session.get(SubmitterModel, 4001)
+
+    submitter = asyncio.run(main())
+    assert (submitter.username, submitter.fullname, submitter.submission_count) == \
+           ("new_submitter", "New Submitter", 1)
+    assert profiles.stats()["dirty"] == 0
+
+
+def test_failed_commit_keeps_profiles(monkeypatch):
+    operations = []
+
+    async def fail(operation):
+        operations.append(operation)
+        raise RuntimeError("database is locked")
+
+    monkeypatch.setattr(users.USERS_WRITER, "submit", fail)
+    profiles = SubmitterProfileCache(10)
+    profiles.touch(1, "name", "Full Name")
+    buffer = CounterBuffer()
+    buffer.add(SubmitterModel, 1, submission_count=1)
+    with pytest.raises(RuntimeError):
+        asyncio.run(buffer.commit(profiles=profiles))
+    # 资料与计数是同一个写操作
+    assert len(operations) == 1
+    assert profiles.get(1) == ("name", "Full Name") and profiles.stats()["dirty"] == 1
+    with pytest.raises(RuntimeError):
+        asyncio.run(profiles.flush())
+    assert profiles.stats()["dirty"] == 1
@@ -0,0 +1,50 @@
+import asyncio
+import gc
+
+from src.bot.debounce import Debouncer
+
+
+def test_fires_once_after_quiet_period():
+    fired = []
+
+    async def callback(key, payload):
+        fired.append((key, payload))
+
+    async def main():
+        debouncer = Debouncer(0.02, callback)
+        for i in range(3):
+            debouncer.touch("album", i)
+            await asyncio.sleep(0.005)
+        debouncer.touch("other", 0)
+        await asyncio.sleep(0.06)
+        # 已触发的 key 不会再次触发
+        debouncer.touch("album", 9)
+        await asyncio.sleep(0.04)
+        return debouncer.stats()
+
+    stats = asyncio.run(main())
+    assert sorted(fired) == [("album", 2), ("other", 0)]
+    assert stats == {"pending": 0, "firing": 0, "fired": 2}
+
+
+def test_stop_waits_for_running_callbacks():
+    finished = []
+
+    async def callback(key, payload):
+        # 回调执行期间强制回收，任务仍由 Debouncer 持有
+        gc.collect()
+        await asyncio.sleep(0.02)
+        finished.append(key)
+
+    async def main():
+        debouncer = Debouncer(0.01, callback)
+        debouncer.touch("album")
+        await asyncio.sleep(0.015)
+        assert debouncer.stats()["firing"] == 1
+        debouncer.touch("later")
+        await debouncer.stop()
+        return debouncer.stats()
+
+    stats = asyncio.run(main())
+    assert finished == ["album"]
+    assert stats == {"pending": 0, "firing": 0, "fired": 1}
@@ -0,0 +1,35 @@
+import pytest
+
+from src.config import ReviewConfig
+from src.database.posts import PostModel, PostOperation, PostStatus
+
+
+@pytest.fixture(autouse=True)
+def thresholds(monkeypatch):
+    monkeypatch.setattr(ReviewConfig, "APPROVE_NUMBER_REQUIRED", 2)
+    monkeypatch.setattr(ReviewConfig, "REJECT_NUMBER_REQUIRED", 2)
+
+
+def post(approve=0, nsfw=0, reject=0) -> PostModel:
+    return PostModel(id=1, submitter_id=1, approve_count=approve, nsfw_count=nsfw, reject_count=reject)
+
+
+@pytest.mark.parametrize("approve, nsfw, reject, expected", [
+    (0, 0, 0, PostStatus.PENDING),
+    (1, 0, 1, PostStatus.PENDING),
+    (2, 0, 0, PostStatus.APPROVED),
+    (0, 2, 0, PostStatus.APPROVED),
+    # SFW 与 NSFW 通过票合计
+    (1, 1, 0, PostStatus.APPROVED),
+    (0, 0, 2, PostStatus.NEED_REASON),
+    # 通过与拒绝同时达到人数时以通过为准
+    (2, 0, 2, PostStatus.APPROVED),
+])
+def test_decide_status(approve, nsfw, reject, expected):
+    assert PostOperation.decide_status(post(approve, nsfw, reject)) == expected.value
+
+
+def test_decide_status_follows_config(monkeypatch):
+    monkeypatch.setattr(ReviewConfig, "APPROVE_NUMBER_REQUIRED", 3)
+    assert PostOperation.decide_status(post(approve=2)) == PostStatus.PENDING.value
+    assert PostOperation.decide_status(post(approve=3)) == PostStatus.APPROVED.value
@@ -0,0 +1,28 @@
+import asyncio
+
+from src import utils
+from src.database.posts import PostModel, PostOperation, PostStatus
+
+
+def test_format_duplicates_looks_up_statuses_once(monkeypatch):
+    lookups = []
+
+    async def find_duplicates(fingerprints, exclude_post_id=None, limit=5):
+        return [(5, PostStatus.PENDING.value), (3, None)]
+
+    async def query(post_text, threshold, exclude_post_id=None, limit=5):
+        return [(5, 0.9), (4, 0.8), (2, 0.7)]
+
+    async def get_posts(post_ids):
+        lookups.append(sorted(post_ids))
+        return {3: PostModel(id=3, status=PostStatus.REJECTED.value),
+                4: PostModel(id=4, status=PostStatus.APPROVED.value)}
+
+    monkeypatch.setattr(PostOperation, "find_duplicates", find_duplicates)
+    monkeypatch.setattr(utils.NEAR_DUPLICATES, "query", query)
+    monkeypatch.setattr(utils.POST_ARCHIVE, "get_posts", get_posts)
+    text = asyncio.run(utils.format_duplicates({"t:hash"}, "text"))
+    # 已在重复中的稿件不再作为相似稿件列出，归档与相似稿件的状态一次取出
+    assert text == ("⚠️ 疑似重复投稿：5(待审)，3(已拒绝)\n"
+                    "⚠️ 相似投稿：4(已通过，相似度 80%)，2(未知，相似度 70%)\n")
+    assert lookups == [[2, 3, 4]]
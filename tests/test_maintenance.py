@@ -0,0 +1,50 @@
+import asyncio
+import sqlite3
+
+import pytest
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from src.config import Config
+from src.database import convert_auto_vacuum
+from src.scheduler import clean
+
+
+@pytest.fixture
+def legacy(tmp_path, monkeypatch):
+    monkeypatch.setattr(Config, "DATABASES_DIR", tmp_path)
+    path = tmp_path / "legacy.db"
+    connection = sqlite3.connect(path)
+    connection.execute("CREATE TABLE posts (id INTEGER PRIMARY KEY, text TEXT)")
+    connection.executemany("INSERT INTO posts (text) VALUES (?)", [("x" * 500,) for _ in range(200)])
+    connection.execute("DELETE FROM posts")
+    connection.commit()
+    connection.close()
+    return path
+
+
+def auto_vacuum(path) -> int:
+    connection = sqlite3.connect(path)
+    try:
+        return connection.execute("PRAGMA auto_vacuum").fetchone()[0]
+    finally:
+        connection.close()
+
+
+def test_optimize_does_not_vacuum_legacy_databases(legacy, monkeypatch):
+    async def main():
+        engine = create_async_engine(f"sqlite+aiosqlite:///{legacy}")
+        monkeypatch.setattr(clean, "ENGINES", {"legacy": engine})
+        try:
+            return await clean.optimize_database()
+        finally:
+            await engine.dispose()
+
+    # 定时任务只做增量清理，旧库的转换留给停机后的命令
+    assert asyncio.run(main()) == {"legacy": "not incremental"}
+    assert auto_vacuum(legacy) == 0
+
+
+def test_convert_auto_vacuum(legacy):
+    assert convert_auto_vacuum("legacy")
+    assert auto_vacuum(legacy) == 2
+    assert not convert_auto_vacuum("legacy")
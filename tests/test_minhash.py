@@ -0,0 +1,25 @@
+import hashlib
+import struct
+
+from src.dedup.minhash import NUM_PERM, from_bytes, shingles, signature, similarity, to_bytes
+
+
+def test_signature_is_stored_as_little_endian_uint32():
+    sig = signature(shingles("今天晚饭吃咖喱饭"))
+    data = to_bytes(sig)
+    assert len(data) == NUM_PERM * 4
+    assert list(struct.unpack(f"<{NUM_PERM}I", data)) == list(sig)
+    assert from_bytes(data) == sig
+
+
+def test_signature_values_are_platform_independent():
+    item = "咖喱饭".encode()
+    # 单个元素的签名就是 SHAKE-128 输出按小端切分的结果
+    expected = struct.unpack(f"<{NUM_PERM}I", hashlib.shake_128(item).digest(NUM_PERM * 4))
+    assert list(signature({item})) == list(expected)
+
+
+def test_similarity_of_near_duplicates():
+    text = "今天晚饭吃什么好呢，想吃咖喱饭但是又想吃拉面，真是难以选择的问题"
+    assert similarity(signature(shingles(text)), signature(shingles(text + "啊"))) > 0.7
+    assert similarity(signature(shingles(text)), signature(set())) == 0.0
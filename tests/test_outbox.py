@@ -0,0 +1,118 @@
+import asyncio
+import time
+
+from sqlalchemy import select, update
+
+from src.bot.outbox import OutboxWorker
+from src.database.posts import OutboxModel, OutboxStatus, PostModel, PostOperation, PostStatus, POSTS_WRITER, \
+    PostsSessionFactory
+from src.scheduler.clean import prune_outbox
+
+DAY = 86400
+
+
+async def add_post(post_id: int, action: str, created_at: int | None = None) -> None:
+    async def operation(session):
+        session.add(PostModel(id=post_id, submitter_id=1, text=f"post {post_id}",
+                              status=PostStatus.APPROVED.value, created_at=int(time.time())))
+        await PostOperation.enqueue_outbox(session, action, post_id)
+        if created_at is not None:
+            await session.execute(update(OutboxModel).where(OutboxModel.post_id == post_id)
+                                  .values(created_at=created_at))
+
+    await POSTS_WRITER.submit(operation)
+
+
+async def outbox(post_id: int) -> dict[str, int]:
+    async with PostsSessionFactory() as session:
+        result = await session.execute(select(OutboxModel.action, OutboxModel.status).filter_by(post_id=post_id))
+        return dict(result.all())
+
+
+async def get_entry(post_id: int, action: str) -> OutboxModel:
+    async with PostsSessionFactory() as session:
+        return await session.scalar(select(OutboxModel).filter_by(post_id=post_id, action=action))
+
+
+async def publish_msg_id(post_id: int) -> int | None:
+    async with PostsSessionFactory() as session:
+        return await session.scalar(select(PostModel.publish_msg_id).filter_by(id=post_id))
+
+
+def publisher(sent: list):
+    async def publish(bot, post_id):
+        sent.append(post_id)
+        msg_id = 100 + len(sent)
+
+        async def complete(session):
+            await session.execute(update(PostModel).where(PostModel.id == post_id).values(publish_msg_id=msg_id))
+            await PostOperation.enqueue_outbox(session, "notify", post_id)
+
+        return complete
+
+    return publish
+
+
+def test_completion_is_written_with_done():
+    sent = []
+    worker = OutboxWorker()
+    worker.register("publish", publisher(sent))
+
+    async def main():
+        await add_post(3001, "publish")
+        assert await worker.drain() == 1
+        # 发布消息 id、完成状态与后续通知任务一起写入
+        assert await publish_msg_id(3001) == 101
+        assert await outbox(3001) == {"publish": OutboxStatus.DONE.value, "notify": OutboxStatus.PENDING.value}
+
+    asyncio.run(main())
+    assert sent == [3001]
+    assert worker.stats()["done"] == 1
+
+
+def test_failed_write_is_retried_without_resending(monkeypatch):
+    sent = []
+    worker = OutboxWorker()
+    worker.register("publish", publisher(sent))
+
+    async def main():
+        await add_post(3002, "publish")
+        submit = POSTS_WRITER.submit
+
+        async def failing_submit(operation):
+            raise RuntimeError("disk I/O error")
+
+        monkeypatch.setattr(POSTS_WRITER, "submit", failing_submit)
+        try:
+            await worker._execute(await get_entry(3002, "publish"))
+        except RuntimeError:
+            pass
+        monkeypatch.setattr(POSTS_WRITER, "submit", submit)
+        assert await publish_msg_id(3002) is None
+        assert worker.stats()["unwritten"] == 1
+        # 重试只补写上次的结果，不再发送
+        await worker._execute(await get_entry(3002, "publish"))
+        assert await publish_msg_id(3002) == 101
+        assert (await outbox(3002))["publish"] == OutboxStatus.DONE.value
+
+    asyncio.run(main())
+    assert sent == [3002]
+    assert worker.stats()["unwritten"] == 0
+
+
+def test_prune_removes_old_done_tasks():
+    async def main():
+        old = int(time.time()) - 30 * DAY
+        await add_post(3003, "count", old)
+        await add_post(3004, "count", old)
+        await add_post(3005, "count")
+        await POSTS_WRITER.submit(lambda session: session.execute(
+            update(OutboxModel).where(OutboxModel.post_id.in_([3003, 3005]))
+            .values(status=OutboxStatus.DONE.value)))
+        assert await prune_outbox() == 1
+        # 未完成的任务和新完成的任务保留
+        assert await outbox(3003) == {}
+        assert await outbox(3004) == {"count": OutboxStatus.PENDING.value}
+        assert await outbox(3005) == {"count": OutboxStatus.DONE.value}
+
+    asyncio.run(main())
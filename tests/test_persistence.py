@@ -0,0 +1,35 @@
+import asyncio
+
+from src.bot.persistence import SQLitePersistence
+
+
+def test_user_data_round_trip():
+    async def main():
+        persistence = SQLitePersistence()
+        await persistence.update_user_data(3001, {"review_private_post_id": 12, "cbq": ["a", "b"]})
+        await persistence.update_user_data(3001, {"review_private_post_id": 12, "cbq": ["a", "b"]})
+        assert persistence.stats()["unchanged"] == 1
+        # 只写入变化的键，删除已移除的键，无法序列化的值不保存
+        await persistence.update_user_data(3001, {"review_private_post_id": 13, "handler": object()})
+        stats = persistence.stats()
+        assert (stats["upserts"], stats["deletes"], stats["skipped"]) == (3, 1, 1)
+
+        loaded = await SQLitePersistence().get_user_data()
+        assert loaded[3001] == {"review_private_post_id": 13}
+
+        await persistence.drop_user_data(3001)
+        assert 3001 not in await SQLitePersistence().get_user_data()
+
+    asyncio.run(main())
+
+
+def test_conversation_state_round_trip():
+    async def main():
+        persistence = SQLitePersistence()
+        await persistence.update_conversation("private_review", (3002, 3002), 1)
+        await persistence.update_conversation("private_review", (3003, 3003), 1)
+        await persistence.update_conversation("private_review", (3003, 3003), None)
+        assert await SQLitePersistence().get_conversations("private_review") == {(3002, 3002): 1}
+        assert await SQLitePersistence().get_conversations("other") == {}
+
+    asyncio.run(main())
@@ -0,0 +1,116 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.exc import StaleDataError
+
+from src import utils
+from src.database.posts import PostBase, PostModel, PostStatus
+from src.utils import PostLockManager, StatusEditQueue, check_post_status
+
+
+def test_lock_serializes_same_post():
+    locks = PostLockManager()
+    events = []
+
+    async def hold(post_id, name):
+        async with locks.acquire(post_id):
+            events.append(f"{name}+")
+            await asyncio.sleep(0.01)
+            events.append(f"{name}-")
+
+    async def main():
+        await asyncio.gather(hold(1, "a"), hold(1, "b"), hold(2, "c"))
+
+    asyncio.run(main())
+    # 同一稿件串行，不同稿件互不等待
+    assert events.index("a-") < events.index("b+")
+    assert events.index("c+") < events.index("a-")
+    assert locks.stats()["contended"] == 1
+
+
+def test_idle_locks_are_evicted():
+    locks = PostLockManager(max_locks=2, idle_timeout=300)
+
+    async def main():
+        for post_id in range(5):
+            async with locks.acquire(post_id):
+                pass
+
+    asyncio.run(main())
+    assert locks.stats()["locks"] <= 2
+    assert locks.stats()["evictions"] >= 3
+
+
+def test_stale_version_raises():
+    engine = create_engine("sqlite://")
+    PostBase.metadata.create_all(engine)
+    with Session(engine) as session:
+        session.add(PostModel(id=1, submitter_id=1))
+        session.commit()
+    with Session(engine) as first, Session(engine) as second:
+        stale = first.get(PostModel, 1)
+        current = second.get(PostModel, 1)
+        current.status = PostStatus.APPROVED.value
+        second.commit()
+        # 另一个事务已经改变状态，按旧版本号的更新被拒绝
+        stale.status = PostStatus.NEED_REASON.value
+        with pytest.raises(StaleDataError):
+            first.commit()
+    engine.dispose()
+
+
+def test_status_edits_are_coalesced():
+    queue = StatusEditQueue()
+    sent = []
+    release = asyncio.Event()
+
+    def edit(post_id, version):
+        async def send():
+            await release.wait()
+            sent.append((post_id, version))
+
+        return send
+
+    async def main():
+        queue.submit(1, 1, edit(1, 1))
+        await asyncio.sleep(0)
+        # 第一个编辑发送期间登记的编辑只发送最新的版本
+        for version in (2, 3, 4):
+            queue.submit(1, version, edit(1, version))
+        queue.submit(2, 1, edit(2, 1))
+        release.set()
+        await queue.stop()
+
+    asyncio.run(main())
+    assert [version for post_id, version in sent if post_id == 1] == [1, 4]
+    assert [version for post_id, version in sent if post_id == 2] == [1]
+    assert queue.stats() == {"sending": 0, "sent": 3, "coalesced": 2, "failures": 0}
+
+
+def test_check_post_status_does_not_wait_for_the_edit(monkeypatch):
+    edits = []
+    release = asyncio.Event()
+
+    async def edit_post_status(post_data, bot, reopen=False):
+        await release.wait()
+        edits.append((post_data.id, post_data.status))
+
+    monkeypatch.setattr(utils, "edit_post_status", edit_post_status)
+    monkeypatch.setattr(utils, "STATUS_EDITS", StatusEditQueue())
+    context = SimpleNamespace(bot=None)
+
+    async def main():
+        pending = PostModel(id=1, status=PostStatus.PENDING.value, version=1)
+        assert check_post_status(pending, context) == PostStatus.PENDING.value
+        need_reason = PostModel(id=1, status=PostStatus.NEED_REASON.value, version=2)
+        # 调用者在锁内得到状态，不等待编辑发送
+        assert check_post_status(need_reason, context) == PostStatus.NEED_REASON.value
+        assert edits == []
+        release.set()
+        await utils.STATUS_EDITS.stop()
+
+    asyncio.run(main())
+    assert edits == [(1, PostStatus.NEED_REASON.value)]
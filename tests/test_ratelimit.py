@@ -0,0 +1,95 @@
+import asyncio
+
+import pytest
+from telegram.error import RetryAfter
+
+from src.bot.ratelimit import Priority, PriorityRateLimiter, TokenBucket
+
+
+def test_token_bucket():
+    bucket = TokenBucket(rate=2, capacity=2)
+    now = bucket.updated
+    assert bucket.wait_time(now) == 0
+    bucket.consume()
+    bucket.consume()
+    assert bucket.wait_time(now) == pytest.approx(0.5)
+    assert bucket.wait_time(now + 0.5) == 0
+    assert not bucket.idle(now + 0.5)
+    assert bucket.idle(now + 1)
+
+
+def run(coro_factory, **kwargs):
+    async def main():
+        limiter = PriorityRateLimiter(**kwargs)
+        await limiter.initialize()
+        try:
+            return await coro_factory(limiter)
+        finally:
+            await limiter.shutdown()
+
+    return asyncio.run(main())
+
+
+def send(limiter, order, chat_id, name, priority=Priority.NORMAL):
+    async def callback():
+        order.append(name)
+        return name
+
+    return limiter.process_request(callback, (), {}, "sendMessage", {"chat_id": chat_id}, priority)
+
+
+def test_priority_within_chat_and_chats_do_not_block_each_other():
+    order = []
+
+    async def main(limiter):
+        await asyncio.gather(
+            send(limiter, order, 1, "low", Priority.LOW),
+            send(limiter, order, 1, "normal"),
+            send(limiter, order, 1, "high", Priority.HIGH),
+            send(limiter, order, 2, "other", Priority.LOW),
+        )
+        return limiter.stats()
+
+    stats = run(main, global_rate=1000, private_rate=50)
+    # 会话 1 每次只有一个令牌，按优先级放行；会话 2 不需要等待会话 1
+    assert [name for name in order if name != "other"] == ["high", "normal", "low"]
+    assert order.index("other") < order.index("low")
+    assert stats["granted"] == {"HIGH": 1, "NORMAL": 1, "LOW": 2}
+    assert stats["queued"] == {"HIGH": 0, "NORMAL": 0, "LOW": 0}
+
+
+def test_cancelled_requests_are_skipped():
+    order = []
+
+    async def main(limiter):
+        first = asyncio.ensure_future(send(limiter, order, 1, "first"))
+        await first
+        cancelled = asyncio.ensure_future(send(limiter, order, 1, "cancelled", Priority.HIGH))
+        kept = asyncio.ensure_future(send(limiter, order, 1, "kept", Priority.LOW))
+        await asyncio.sleep(0)
+        cancelled.cancel()
+        await kept
+        return limiter.stats()
+
+    stats = run(main, global_rate=1000, private_rate=50)
+    assert order == ["first", "kept"]
+    assert stats["queued"]["HIGH"] == 0
+
+
+def test_retry_after_pauses_and_retries():
+    calls = []
+
+    async def main(limiter):
+        async def callback():
+            calls.append(len(calls))
+            if len(calls) == 1:
+                raise RetryAfter(0)
+            return True
+
+        result = await limiter.process_request(callback, (), {}, "sendMessage", {"chat_id": -100}, Priority.HIGH)
+        return result, limiter.stats()
+
+    result, stats = run(main, global_rate=1000, group_rate=100)
+    assert result is True
+    assert calls == [0, 1]
+    assert stats["retries"] == 1
@@ -0,0 +1,41 @@
+import asyncio
+
+import pytest
+
+from src.database.posts import PostOperation, ReviewQueue
+
+
+@pytest.fixture
+def queue(monkeypatch):
+    pending = list(range(1, 11))
+
+    async def get_unvoted_post_ids(reviewer_id, after_id=0, limit=100):
+        return [post_id for post_id in pending if post_id > after_id][:limit]
+
+    monkeypatch.setattr(PostOperation, "get_unvoted_post_ids", get_unvoted_post_ids)
+    return ReviewQueue()
+
+
+def test_pop_skips_finished_posts(queue):
+    assert asyncio.run(queue.pop(1)) == 1
+    queue.close_post(2)
+    queue.discard(1, 3)
+    assert asyncio.run(queue.pop(1)) == 4
+    queue.restore(1, 3)
+    queue.add_post(11)
+    assert [asyncio.run(queue.pop(1)) for _ in range(8)] == [5, 6, 7, 8, 9, 10, 3, 11]
+    assert asyncio.run(queue.pop(1)) is None
+
+
+def test_finished_posts_are_trimmed(queue):
+    asyncio.run(queue.pop(1))
+    # 不再私聊审核的审核员，队列随稿件结束而缩短
+    for post_id in range(2, 9):
+        queue.close_post(post_id)
+    assert queue.stats()["queued"] == 2
+    assert queue.stats()["entries"] <= 4
+    for post_id in range(12, 112):
+        queue.add_post(post_id)
+        queue.close_post(post_id)
+    assert queue.stats()["entries"] <= 2 * queue.stats()["queued"]
+    assert [asyncio.run(queue.pop(1)) for _ in range(3)] == [9, 10, None]
@@ -0,0 +1,41 @@
+import asyncio
+import time
+
+from src.database.archive import POST_ARCHIVE
+from src.database.posts import PostCommentModel, PostModel, PostOperation, PostStatus, POSTS_WRITER, \
+    build_match_query
+
+
+def test_build_match_query():
+    assert build_match_query("猫猫 今天的猫猫") == '"今天的猫猫"'
+    assert build_match_query('say "hello"') == '"say" """hello"""'
+    assert build_match_query("猫 狗") is None
+
+
+async def add_post(post_id: int, text: str, status: PostStatus = PostStatus.PENDING, finish_at: int | None = None,
+                   comment: str | None = None) -> None:
+    async def operation(session):
+        session.add(PostModel(id=post_id, submitter_id=1, text=text, status=status.value,
+                              created_at=int(time.time()), finish_at=finish_at))
+        await session.flush()
+        if comment:
+            session.add(PostCommentModel(post_id=post_id, user_id=2, comment=comment))
+
+    await POSTS_WRITER.submit(operation)
+
+
+def test_search_text_and_comments():
+    async def main():
+        await add_post(2001, "今天的晚饭是咖喱饭")
+        await add_post(2002, "明天的早饭", comment="推荐咖喱饭")
+        await add_post(2003, "晚饭吃什么", status=PostStatus.APPROVED, finish_at=int(time.time()) - 100 * 86400)
+        assert await POST_ARCHIVE.run(30, batch_size=10) >= 1
+
+        assert sorted(row[0] for row in await PostOperation.search("咖喱饭")) == [2001, 2002]
+        # 多个词都必须出现
+        assert [row[0] for row in await PostOperation.search("咖喱饭 今天的")] == [2001]
+        # 已归档的稿件仍可搜索，状态为 None
+        assert [row[:2] for row in await PostOperation.search("晚饭吃什么")] == [(2003, None)]
+        assert await PostOperation.search("饭") == []
+
+    asyncio.run(main())